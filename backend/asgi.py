@@ -0,0 +1,238 @@
+# asgi.py
+"""ASGI serving mode.
+
+    uvicorn asgi:app --port 5001 --workers 4     (or: python asgi.py)
+
+The read-heavy endpoints in ASYNC_ROUTES run as coroutines on one event loop
+per worker, against an aiomysql pool, so thousands of idle or slow
+connections cost a socket each rather than a thread and a pooled pymysql
+connection each. They reuse the blueprints' queries and response shaping
+and answer byte-for-byte like the Flask handlers. The admin statistics
+read from a replica the way @read_only picks one (same lag guard, same
+stickiness for recent writers), each replica through an aiomysql pool of
+its own.
+
+Every other route goes to the unchanged Flask app, which a2wsgi runs on a
+thread pool of ASGI_WSGI_THREADS. CPU-bound work stays off the loop: bcrypt
+already runs on the passwords.py pool behind those threads, and a venue
+catalog reload is handed to the default executor.
+
+Needs `pip install uvicorn aiomysql a2wsgi` on top of the base requirements.
+"""
+from urllib.parse import parse_qsl
+from dotenv import load_dotenv
+import asyncio
+import logging
+import time
+import os
+
+import aiomysql
+from a2wsgi import WSGIMiddleware
+from flask.json.provider import DefaultJSONProvider
+
+from database import Config, get_replica_set, recent_writers
+from main import create_app, configure_logging, warm_up, CORS_ORIGIN
+from payments import payment_workers
+from maintenance import maintenance
+from routes.middleware import verify_token, AuthError
+from routes.user import user_bookings_query, PROFILE_QUERY, shape_profile
+from routes.admin import STATISTICS_QUERIES, shape_statistics
+from serializers import compile_row_serializer, dumps
+from venue_cache import venue_catalog
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+ASYNC_DB_POOL_SIZE = int(os.getenv('ASYNC_DB_POOL_SIZE', 20))
+ASGI_WSGI_THREADS = int(os.getenv('ASGI_WSGI_THREADS', 16))
+
+class Request:
+    __slots__ = ('method', 'path', 'headers', 'args')
+
+    def __init__(self, scope):
+        self.method = scope['method']
+        self.path = scope['path']
+        self.headers = {name.decode('latin-1'): value.decode('latin-1') for name, value in scope['headers']}
+        # First value wins, like request.args.get()
+        self.args = {}
+        for name, value in parse_qsl(scope['query_string'].decode('latin-1'), keep_blank_values=True):
+            self.args.setdefault(name, value)
+
+def json_response(obj, status=200, headers=()):
+    # Same output as jsonify() through serializers.FastJSONProvider
+    body = dumps(obj, DefaultJSONProvider.default, sort_keys=True) + b'\n'
+    return status, body, [('Content-Type', 'application/json')] + list(headers)
+
+def requires_token(admin=False):
+    """Async counterpart of token_required / admin_required: handler(request, user_id)."""
+    def wrap(handler):
+        async def decorated(request):
+            try:
+                user = verify_token(request.headers.get('authorization'))
+            except AuthError as e:
+                return json_response({'error': e.message}, e.status)
+            if admin and user.role != 'admin':
+                return json_response({'error': 'Admin access required'}, 403)
+            return await handler(request, user.id)
+        return decorated
+    return wrap
+
+_pool = None
+# Replica name -> aiomysql pool, for the replicas of database.get_replica_set()
+_replica_pools = {}
+
+async def fetch(query, params=None, cursor_class=aiomysql.DictCursor, pool=None):
+    """Run one query on the async pool, or on `pool`. Returns (rows, cursor.description)."""
+    async with (pool or _pool).acquire() as conn:
+        async with conn.cursor(cursor_class) as cursor:
+            await cursor.execute(query, params)
+            return await cursor.fetchall(), cursor.description
+
+def pick_replica(user_id):
+    """The replica @read_only would read from for this user, or None for the primary. Blocking."""
+    replicas = get_replica_set()
+    if replicas is None or recent_writers.wrote_recently(user_id):
+        return None
+    replica = next(replicas.fresh_replicas(), None)
+    replicas.count_read(replica is not None)
+    return replica
+
+async def fetch_all_read_only(queries, user_id):
+    """Run independent read-only queries concurrently, on a fresh replica when there is one."""
+    replica = await asyncio.get_running_loop().run_in_executor(None, pick_replica, user_id)
+    if replica is not None:
+        try:
+            return await asyncio.gather(*(fetch(query, pool=_replica_pools[replica.name]) for query in queries))
+        except aiomysql.OperationalError as e:
+            get_replica_set().mark_unavailable(replica, e)
+    return await asyncio.gather(*(fetch(query) for query in queries))
+
+@requires_token()
+async def get_venues(request, user_id):
+    try:
+        # A catalog reload queries MySQL through the blocking pool; keep it off the loop
+        catalog = venue_catalog.peek() or await asyncio.get_running_loop().run_in_executor(None, venue_catalog.get)
+        body, etag = catalog
+        headers = [('ETag', f'"{etag}"'), ('Cache-Control', 'no-cache')]
+        if_none_match = request.headers.get('if-none-match', '')
+        if if_none_match == '*' or f'"{etag}"' in if_none_match:
+            return 304, b'', headers
+        return 200, body, [('Content-Type', 'application/json')] + headers
+    except Exception as e:
+        logger.error("Error fetching venues: %s", str(e))
+        return json_response({'error': str(e)}, 500)
+
+@requires_token()
+async def get_profile(request, user_id):
+    try:
+        rows, _ = await fetch(PROFILE_QUERY, (user_id,))
+        if not rows:
+            logger.warning("User not found: user_id=%s", user_id)
+            return json_response({'error': 'User not found'}, 404)
+        return json_response(shape_profile(rows[0]))
+    except Exception as e:
+        logger.error("Error fetching profile: %s", str(e))
+        return json_response({'error': str(e)}, 500)
+
+@requires_token()
+async def get_user_bookings(request, user_id):
+    try:
+        query, params = user_bookings_query(user_id, request.args)
+        rows, description = await fetch(query, params, aiomysql.Cursor)
+        serialize = compile_row_serializer(description)
+        bookings = [serialize(row) for row in rows]
+        return json_response({'bookings': bookings, 'total_bookings': len(bookings)})
+    except Exception as e:
+        logger.error("Error fetching bookings: %s", str(e))
+        return json_response({'error': str(e)}, 500)
+
+@requires_token(admin=True)
+async def get_booking_statistics(request, user_id):
+    try:
+        # Independent aggregates: run them on three connections at once
+        (totals, _), (venue_rows, _), (trend_rows, _) = await fetch_all_read_only(STATISTICS_QUERIES, user_id)
+        return json_response(shape_statistics(totals[0], venue_rows, trend_rows))
+    except Exception as e:
+        logger.error(f"Unexpected error in get_booking_statistics: {str(e)}")
+        return json_response({'error': f'Internal server error: {str(e)}'}, 500)
+
+ASYNC_ROUTES = {
+    ('GET', '/api/venues'): get_venues,
+    ('GET', '/api/profile'): get_profile,
+    ('GET', '/api/bookings'): get_user_bookings,
+    ('GET', '/api/bookings/statistics'): get_booking_statistics,
+}
+
+class AsyncApp:
+    """ASYNC_ROUTES on the event loop, everything else through the WSGI app."""
+
+    def __init__(self, wsgi_app, routes=ASYNC_ROUTES):
+        self.flask_app = wsgi_app
+        self.wsgi = WSGIMiddleware(wsgi_app, workers=ASGI_WSGI_THREADS)
+        self.routes = routes
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        handler = self.routes.get((scope.get('method'), scope.get('path'))) if scope['type'] == 'http' else None
+        if handler is None:
+            return await self.wsgi(scope, receive, send)
+
+        started = time.perf_counter()
+        request = Request(scope)
+        status, body, headers = await handler(request)
+        origin = request.headers.get('origin')
+        if origin == CORS_ORIGIN:
+            headers += [('Access-Control-Allow-Origin', origin), ('Access-Control-Expose-Headers', 'Server-Timing')]
+        headers += [('Vary', 'Origin'), ('Content-Length', str(len(body))),
+                    ('Server-Timing', f'app;dur={(time.perf_counter() - started) * 1000:.2f}')]
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def lifespan(self, receive, send):
+        global _pool
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                configure_logging()
+                try:
+                    _pool = await aiomysql.create_pool(
+                        host=Config.MYSQL_HOST, user=Config.MYSQL_USER, password=Config.MYSQL_PASSWORD,
+                        db=Config.MYSQL_DB, minsize=1, maxsize=ASYNC_DB_POOL_SIZE,
+                        pool_recycle=Config.DB_POOL_MAX_LIFETIME, autocommit=True
+                    )
+                    replicas = get_replica_set()
+                    for replica in replicas.replicas if replicas else ():
+                        _replica_pools[replica.name] = await aiomysql.create_pool(
+                            host=replica.dsn['host'], port=replica.dsn['port'], user=replica.dsn['user'],
+                            password=replica.dsn['password'], db=replica.dsn['db'], minsize=0,
+                            maxsize=ASYNC_DB_POOL_SIZE, pool_recycle=Config.DB_POOL_MAX_LIFETIME, autocommit=True
+                        )
+                    await asyncio.get_running_loop().run_in_executor(None, warm_up, self.flask_app)
+                    payment_workers.start()
+                    maintenance.start()
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                payment_workers.stop(timeout=5)
+                maintenance.stop(timeout=5)
+                for pool in [_pool, *_replica_pools.values()]:
+                    if pool is not None:
+                        pool.close()
+                        await pool.wait_closed()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+app = AsyncApp(create_app())
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run('asgi:app', host=os.getenv('HOST', '127.0.0.1'), port=int(os.getenv('PORT', 5001)),
+                workers=int(os.getenv('ASGI_WORKERS', 1)))
@@ -0,0 +1,213 @@
+# availability.py
+from bisect import bisect_right
+from datetime import date, datetime, time as dt_time, timedelta
+import threading
+import time
+import os
+import logging
+
+from database import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+AVAILABILITY_INDEX_TTL = float(os.getenv('AVAILABILITY_INDEX_TTL', 30))
+
+def to_seconds(value):
+    """Convert a TIME value (seconds, timedelta, datetime.time or 'HH:MM[:SS]' string) to seconds since midnight."""
+    if isinstance(value, int):
+        return value
+    if isinstance(value, timedelta):
+        return int(value.total_seconds())
+    if isinstance(value, dt_time):
+        return value.hour * 3600 + value.minute * 60 + value.second
+    parts = [int(p) for p in str(value).split(':')]
+    parts += [0] * (3 - len(parts))
+    return parts[0] * 3600 + parts[1] * 60 + parts[2]
+
+def seconds_to_str(seconds):
+    """Convert seconds since midnight to an HH:MM string."""
+    return f"{seconds // 3600:02d}:{(seconds % 3600) // 60:02d}"
+
+def to_date_key(value):
+    """Normalize a DATE value (date, datetime or 'YYYY-MM-DD' string) to an ISO string."""
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)
+
+def free_intervals(booked, day_start=0, day_end=86400, min_length=0):
+    """Sweep (start, end) booked intervals in seconds and return the free gaps of a day.
+
+    Booked intervals may overlap or touch; gaps shorter than `min_length`
+    seconds are dropped.
+    """
+    free = []
+    cursor = day_start
+    for start, end in sorted(booked):
+        if start > cursor and start - cursor >= min_length:
+            free.append((cursor, min(start, day_end)))
+        cursor = max(cursor, end)
+        if cursor >= day_end:
+            break
+    if day_end > cursor and day_end - cursor >= min_length:
+        free.append((cursor, day_end))
+    return free
+
+class _DaySlots:
+    """Non-overlapping booked intervals of one venue on one day, sorted by start."""
+    __slots__ = ('starts', 'ends', 'ids', 'loaded_at')
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+        self.ids = []
+        self.loaded_at = time.monotonic()
+
+    def find_overlap(self, start, end):
+        # Intervals never overlap each other, so the only candidates are the
+        # last interval starting before `end` and nothing else to its left
+        i = bisect_right(self.starts, start)
+        if i and self.ends[i - 1] > start:
+            return i - 1
+        if i < len(self.starts) and self.starts[i] < end:
+            return i
+        return None
+
+    def add(self, booking_id, start, end):
+        if booking_id in self.ids:
+            return
+        i = bisect_right(self.starts, start)
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+        self.ids.insert(i, booking_id)
+
+    def remove(self, booking_id):
+        try:
+            i = self.ids.index(booking_id)
+        except ValueError:
+            return False
+        del self.starts[i], self.ends[i], self.ids[i]
+        return True
+
+class AvailabilityIndex:
+    """In-process interval index of active bookings per (venue_id, booking_date).
+
+    The database stays authoritative: the index only rejects requests that
+    certainly overlap a booking it knows about. Days that have not been
+    loaded, or were loaded more than `ttl` seconds ago, report themselves as
+    stale so callers fall back to the database (and reload the day) instead
+    of trusting data another worker may have changed.
+    """
+
+    def __init__(self, ttl=AVAILABILITY_INDEX_TTL):
+        self.ttl = ttl
+        self._days = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, venue_id, booking_date):
+        # Request payloads may carry the venue id as a string, rows carry an int
+        return str(venue_id), to_date_key(booking_date)
+
+    def is_fresh(self, venue_id, booking_date):
+        day = self._days.get(self._key(venue_id, booking_date))
+        return day is not None and time.monotonic() - day.loaded_at <= self.ttl
+
+    def find_overlap(self, venue_id, booking_date, start_time, end_time):
+        """Return (start, end, booking_id) of a known overlapping booking, or None.
+
+        Stale or unloaded days never report an overlap.
+        """
+        start, end = to_seconds(start_time), to_seconds(end_time)
+        with self._lock:
+            day = self._days.get(self._key(venue_id, booking_date))
+            if day is None or time.monotonic() - day.loaded_at > self.ttl:
+                self.misses += 1
+                return None
+            i = day.find_overlap(start, end)
+            if i is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return day.starts[i], day.ends[i], day.ids[i]
+
+    def add(self, booking_id, venue_id, booking_date, start_time, end_time):
+        key = self._key(venue_id, booking_date)
+        with self._lock:
+            day = self._days.get(key)
+            if day is None:
+                # Only days that were fully loaded may answer queries
+                return
+            day.add(booking_id, to_seconds(start_time), to_seconds(end_time))
+
+    def remove(self, booking_id, venue_id, booking_date):
+        with self._lock:
+            day = self._days.get(self._key(venue_id, booking_date))
+            if day is not None:
+                day.remove(booking_id)
+
+    def invalidate(self, venue_id, booking_date):
+        with self._lock:
+            self._days.pop(self._key(venue_id, booking_date), None)
+
+    def invalidate_venue(self, venue_id):
+        """Drop every loaded day of a venue."""
+        venue_key = str(venue_id)
+        with self._lock:
+            for key in [k for k in self._days if k[0] == venue_key]:
+                del self._days[key]
+
+    def load_day(self, cursor, venue_id, booking_date):
+        """(Re)load one day from the database using the caller's cursor."""
+        cursor.execute(
+            '''
+            SELECT id, start_time, end_time FROM bookings
+            WHERE venue_id = %s AND booking_date = %s AND status != 'cancelled'
+            ORDER BY start_time
+            ''',
+            (venue_id, booking_date)
+        )
+        day = _DaySlots()
+        for row in cursor.fetchall():
+            day.add(row['id'], to_seconds(row['start_time']), to_seconds(row['end_time']))
+        with self._lock:
+            self._days[self._key(venue_id, booking_date)] = day
+
+    def warm(self, cursor=None):
+        """Load every active booking from today onwards and drop past days."""
+        if cursor is None:
+            with get_db_connection() as conn, conn.cursor() as cursor:
+                return self.warm(cursor)
+
+        cursor.execute(
+            '''
+            SELECT id, venue_id, booking_date, start_time, end_time FROM bookings
+            WHERE booking_date >= CURDATE() AND status != 'cancelled'
+            ORDER BY venue_id, booking_date, start_time
+            '''
+        )
+        days = {}
+        for row in cursor.fetchall():
+            key = self._key(row['venue_id'], row['booking_date'])
+            day = days.get(key)
+            if day is None:
+                day = days[key] = _DaySlots()
+            day.add(row['id'], to_seconds(row['start_time']), to_seconds(row['end_time']))
+        with self._lock:
+            self._days = days
+        logger.info("Availability index warmed: %s venue-days", len(days))
+        return len(days)
+
+    def prune(self, before=None):
+        cutoff = to_date_key(before or date.today())
+        with self._lock:
+            for key in [k for k in self._days if k[1] < cutoff]:
+                del self._days[key]
+
+    def clear(self):
+        with self._lock:
+            self._days.clear()
+
+availability_index = AvailabilityIndex()
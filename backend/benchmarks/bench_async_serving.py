@@ -0,0 +1,249 @@
+"""Read-heavy endpoints at high connection counts: threaded WSGI vs. the ASGI mode.
+
+Usage (from backend/):
+    python benchmarks/bench_async_serving.py [--connections 1000] [--duration 20]
+
+Recreates and seeds a scratch database (--database, defaults to MYSQL_DB +
+'_serving'), then for each mode starts the app in a subprocess:
+
+    sync   the Flask app on a threaded werkzeug server (a thread per connection)
+    async  asgi.py under uvicorn (one event loop, aiomysql pool)
+
+and holds --connections keep-alive connections open against it from one
+asyncio client, each looping over GET /api/venues, /api/profile,
+/api/bookings and (as an admin) /api/bookings/statistics for --duration
+seconds. The report gives throughput, latency percentiles, status counts
+and connection failures per mode. Raise the open file limit (ulimit -n)
+above twice --connections first.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import socket
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PASSWORD = 'serving-password'
+BCRYPT_ROUNDS = 4
+
+# (path, weight, as_admin)
+MIX = [
+    ('/api/venues', 40, False),
+    ('/api/profile', 20, False),
+    ('/api/bookings', 30, False),
+    ('/api/bookings/statistics', 10, True),
+]
+
+def serve(mode, port):
+    """Run one server in this process (the benchmark starts itself with --serve)."""
+    if mode == 'sync':
+        from werkzeug.serving import make_server
+        from main import create_app
+        make_server('127.0.0.1', port, create_app(), threaded=True).serve_forever()
+    else:
+        import uvicorn
+        uvicorn.run('asgi:app', host='127.0.0.1', port=port, log_level='warning', backlog=4096)
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+class Connection:
+    """Minimal keep-alive HTTP/1.1 client connection on asyncio streams."""
+
+    def __init__(self, port):
+        self.port = port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, token=None, body=None):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection('127.0.0.1', self.port)
+        payload = json.dumps(body).encode() if body is not None else b''
+        head = [f'{method} {path} HTTP/1.1', 'Host: 127.0.0.1', f'Content-Length: {len(payload)}']
+        if payload:
+            head.append('Content-Type: application/json')
+        if token:
+            head.append(f'Authorization: Bearer {token}')
+        self.writer.write(('\r\n'.join(head) + '\r\n\r\n').encode() + payload)
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError('connection closed by server')
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        if headers.get('transfer-encoding') == 'chunked':
+            data = b''
+            while True:
+                size = int((await self.reader.readline()).strip(), 16)
+                data += await self.reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        else:
+            data = await self.reader.readexactly(int(headers.get('content-length', 0)))
+        if headers.get('connection', '').lower() == 'close':
+            self.close()
+        return status, data
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+async def login(port, email):
+    conn = Connection(port)
+    try:
+        status, data = await conn.request('POST', '/api/login', body={'email': email, 'password': PASSWORD})
+    finally:
+        conn.close()
+    if status != 200:
+        raise SystemExit(f'Login failed for {email}: {status} {data[:200]!r}')
+    return json.loads(data)['token']
+
+async def load(port, connections, duration, tokens, admin_token, seed):
+    latencies = defaultdict(list)
+    statuses = defaultdict(lambda: defaultdict(int))
+    failures = defaultdict(int)
+    deadline = time.monotonic() + duration
+
+    async def client(index):
+        rng = random.Random(seed + index)
+        conn = Connection(port)
+        token = tokens[index % len(tokens)]
+        while time.monotonic() < deadline:
+            path, _, as_admin = rng.choices(MIX, weights=[weight for _, weight, _ in MIX])[0]
+            started = time.perf_counter()
+            try:
+                status, _ = await asyncio.wait_for(
+                    conn.request('GET', path, admin_token if as_admin else token), timeout=30
+                )
+            except (OSError, ConnectionError, ValueError, IndexError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+                failures[path] += 1
+                conn.close()
+                await asyncio.sleep(0.05)
+                continue
+            latencies[path].append(time.perf_counter() - started)
+            statuses[path][status] += 1
+        conn.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(i) for i in range(connections)))
+    return latencies, statuses, failures, time.perf_counter() - started
+
+def report(latencies, statuses, failures, elapsed):
+    from load_test import percentile
+    endpoints = {}
+    for path, _, _ in MIX:
+        values = latencies[path]
+        endpoints[path] = {
+            'requests': len(values),
+            'throughput_rps': len(values) / elapsed,
+            'latency_p50_ms': (percentile(values, 50) or 0) * 1000,
+            'latency_p99_ms': (percentile(values, 99) or 0) * 1000,
+            'status_counts': {str(s): n for s, n in sorted(statuses[path].items())},
+            'connection_failures': failures[path],
+        }
+    everything = [value for values in latencies.values() for value in values]
+    ok = sum(n for counts in statuses.values() for s, n in counts.items() if s < 400)
+    return {
+        'elapsed_s': elapsed,
+        'requests': len(everything),
+        'ok_rps': ok / elapsed,
+        'latency_p50_ms': (percentile(everything, 50) or 0) * 1000,
+        'latency_p99_ms': (percentile(everything, 99) or 0) * 1000,
+        'errors': len(everything) - ok + sum(failures.values()),
+        'endpoints': endpoints,
+    }
+
+def wait_until_up(port, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f'Server exited with {process.returncode}')
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1) as s:
+                s.sendall(b'GET / HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n\r\n')
+                if s.recv(64).startswith(b'HTTP/1.1 200'):
+                    return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise SystemExit('Server did not come up')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--serve', choices=['sync', 'async'], help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--connections', type=int, default=1000)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--venues', type=int, default=40)
+    parser.add_argument('--bookings', type=int, default=50000)
+    parser.add_argument('--modes', default='sync,async')
+    parser.add_argument('--database', default=os.getenv('MYSQL_DB', 'event_booking') + '_serving')
+    parser.add_argument('--keep', action='store_true', help='keep the scratch database afterwards')
+    parser.add_argument('--output', help='also write the JSON report to this file')
+    args = parser.parse_args()
+
+    # Configure this process and the servers before anything reads the environment
+    os.environ['MYSQL_DB'] = args.database
+    os.environ['BCRYPT_ROUNDS'] = str(BCRYPT_ROUNDS)
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    os.environ.setdefault('PAYMENT_WORKERS', '0')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    os.environ.setdefault('LOGIN_IP_LIMIT', '1000000000')
+    os.environ.setdefault('ACCESS_TOKEN_SECONDS', '86400')
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    if args.serve:
+        return serve(args.serve, args.port)
+
+    from seeding import recreate_database, seed, drop_database, user_email
+    conn = recreate_database(args.database)
+    try:
+        # user0 is the admin
+        seed(conn, args.users + 1, args.venues, args.bookings, PASSWORD, bcrypt_rounds=BCRYPT_ROUNDS, admins=1)
+        conn.close()
+
+        results = {'connections': args.connections, 'duration_s': args.duration,
+                   'dataset': {'users': args.users, 'venues': args.venues, 'bookings': args.bookings}}
+        for mode in args.modes.split(','):
+            port = free_port()
+            process = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', mode, '--port', str(port)])
+            try:
+                wait_until_up(port, process)
+
+                async def run():
+                    admin_token = await login(port, user_email(0))
+                    tokens = [await login(port, user_email(i)) for i in range(1, args.users + 1)]
+                    return await load(port, args.connections, args.duration, tokens, admin_token, seed=1)
+
+                results[mode] = report(*asyncio.run(run()))
+            finally:
+                process.terminate()
+                process.wait()
+
+        output = json.dumps(results, indent=2)
+        print(output)
+        if args.output:
+            with open(args.output, 'w') as f:
+                f.write(output + '\n')
+    finally:
+        if not args.keep:
+            drop_database(args.database)
+
+if __name__ == '__main__':
+    main()
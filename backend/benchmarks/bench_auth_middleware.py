@@ -0,0 +1,126 @@
+"""Authorization overhead per request: token_required with and without a DB check.
+
+Usage (from backend/):
+    python benchmarks/bench_auth_middleware.py [--requests 20000] [--repeat 3] [--db]
+
+Times GET requests through the Flask test client against a route that does
+nothing, in these setups:
+
+    no_auth           the route without any decorator (the baseline)
+    cached            @token_required, one token for every request (token cache hit)
+    uncached          @token_required, a new token per request (signature check and decode)
+    db_check          cached, plus the per-request `SELECT role FROM users` a
+                      revocation check in the database would need (--db only;
+                      uses the MYSQL_* database)
+
+and verify_token() on its own, outside Flask. overhead_us is the time per
+request above no_auth. Also reports the size of an access token next to the
+24-hour token login used to issue.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('SECRET_KEY', 'benchmark')
+
+from flask import Flask, jsonify
+import jwt
+
+from database import Config, get_db_connection
+from routes.middleware import token_required, verify_token
+from tokens import issue_access_token
+
+def create_bench_app():
+    app = Flask(__name__)
+
+    @app.route('/open')
+    def open_route():
+        return jsonify({})
+
+    @app.route('/protected')
+    @token_required
+    def protected(user_id):
+        return jsonify({})
+
+    @app.route('/checked')
+    @token_required
+    def checked(user_id):
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute('SELECT role FROM users WHERE id = %s', (user_id,))
+            cursor.fetchone()
+        return jsonify({})
+
+    return app
+
+def time_requests(client, path, tokens, repeat):
+    """Best time per request in seconds over `repeat` passes, one request per token."""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for token in tokens:
+            response = client.get(path, headers={'Authorization': f'Bearer {token}'} if token else None)
+            if response.status_code != 200:
+                raise SystemExit(f'GET {path} answered {response.status_code}')
+        elapsed = (time.perf_counter() - started) / len(tokens)
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def time_verify(tokens, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for token in tokens:
+            verify_token(f'Bearer {token}')
+        elapsed = (time.perf_counter() - started) / len(tokens)
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--db', action='store_true', help='also time a per-request users lookup')
+    args = parser.parse_args()
+
+    client = create_bench_app().test_client()
+    one_token = issue_access_token(1, 'user')
+    same = [one_token] * args.requests
+
+    def fresh_tokens(offset):
+        # Distinct user ids make distinct tokens, so none is in the token cache yet
+        return [issue_access_token(offset + i, 'user') for i in range(args.requests)]
+
+    # Warm up Flask's routing and the token cache
+    time_requests(client, '/protected', same[:100], 1)
+
+    no_auth = time_requests(client, '/open', [None] * args.requests, args.repeat)
+    setups = {
+        'no_auth': no_auth,
+        'cached': time_requests(client, '/protected', same, args.repeat),
+        'uncached': min(time_requests(client, '/protected', fresh_tokens(1_000_000 * (run + 1)), 1)
+                        for run in range(args.repeat)),
+    }
+    if args.db:
+        setups['db_check'] = time_requests(client, '/checked', same, args.repeat)
+
+    now = int(time.time())
+    legacy_token = jwt.encode({'user_id': 1, 'email': 'user0@example.com', 'role': 'user',
+                               'iat': now, 'exp': now + 24 * 3600}, Config.SECRET_KEY, algorithm='HS256')
+    results = {
+        'requests': args.requests,
+        'per_request_us': {name: seconds * 1e6 for name, seconds in setups.items()},
+        'overhead_us': {name: (seconds - no_auth) * 1e6 for name, seconds in setups.items() if name != 'no_auth'},
+        'verify_token_us': {
+            'cached': time_verify(same, args.repeat) * 1e6,
+            'uncached': min(time_verify(fresh_tokens(10_000_000 * (run + 1)), 1) for run in range(args.repeat)) * 1e6,
+        },
+        'token_bytes': {'access': len(one_token), 'legacy_24h': len(legacy_token)},
+    }
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
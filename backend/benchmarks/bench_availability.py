@@ -0,0 +1,115 @@
+"""Compare the in-process availability index with the SQL overlap check.
+
+Usage (from backend/):
+    python benchmarks/bench_availability.py [--bookings 12000] [--queries 20000] [--sql]
+
+The index half runs anywhere. With --sql the same day is seeded into the
+configured MySQL database inside a transaction that is rolled back at the
+end, and check_time_slot_overlap is timed against it.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('SECRET_KEY', 'benchmark')
+
+from availability import AvailabilityIndex, _DaySlots
+
+VENUE_ID = 1
+BOOKING_DATE = (date.today() + timedelta(days=3650)).isoformat()
+
+def build_slots(count):
+    # Fixed-width bookings separated by a gap so the day holds `count` of them
+    step = 86400 // count
+    length = max(1, step * 2 // 3)
+    return [(i * step, i * step + length) for i in range(count)]
+
+def make_queries(count):
+    queries = []
+    for _ in range(count):
+        start = random.randrange(0, 86400 - 60)
+        queries.append((start, start + random.randrange(1, 60)))
+    return queries
+
+def bench_index(slots, queries):
+    index = AvailabilityIndex(ttl=3600)
+    day = _DaySlots()
+    for booking_id, (start, end) in enumerate(slots, 1):
+        day.add(booking_id, start, end)
+    index._days[index._key(VENUE_ID, BOOKING_DATE)] = day
+
+    conflicts = 0
+    started = time.perf_counter()
+    for start, end in queries:
+        if index.find_overlap(VENUE_ID, BOOKING_DATE, start, end):
+            conflicts += 1
+    elapsed = time.perf_counter() - started
+    return {'queries': len(queries), 'conflicts': conflicts,
+            'total_s': elapsed, 'per_query_us': elapsed / len(queries) * 1e6}
+
+def bench_sql(slots, queries):
+    from database import get_db_connection
+    from routes.user import check_time_slot_overlap
+
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        conn.begin()
+        try:
+            cursor.execute(
+                'INSERT INTO users (name, email, password, role) VALUES (%s, %s, %s, %s)',
+                ('bench', f'bench-{uuid.uuid4().hex}@example.com', 'x', 'user')
+            )
+            user_id = cursor.lastrowid
+            cursor.execute(
+                'INSERT INTO venues (name, location, capacity, price) VALUES (%s, %s, %s, %s)',
+                (f'bench-{uuid.uuid4().hex}', 'bench', 10, 1)
+            )
+            venue_id = cursor.lastrowid
+            cursor.executemany(
+                'INSERT INTO bookings (user_id, venue_id, booking_date, start_time, end_time, status) '
+                'VALUES (%s, %s, %s, %s, %s, %s)',
+                [(user_id, venue_id, BOOKING_DATE, timedelta(seconds=s), timedelta(seconds=e), 'confirmed')
+                 for s, e in slots]
+            )
+
+            conflicts = 0
+            started = time.perf_counter()
+            for start, end in queries:
+                is_valid, _ = check_time_slot_overlap(
+                    cursor, venue_id, BOOKING_DATE,
+                    str(timedelta(seconds=start)), str(timedelta(seconds=end))
+                )
+                if not is_valid:
+                    conflicts += 1
+            elapsed = time.perf_counter() - started
+        finally:
+            conn.rollback()
+    return {'queries': len(queries), 'conflicts': conflicts,
+            'total_s': elapsed, 'per_query_us': elapsed / len(queries) * 1e6}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bookings', type=int, default=12000)
+    parser.add_argument('--queries', type=int, default=20000)
+    parser.add_argument('--sql-queries', type=int, default=2000)
+    parser.add_argument('--sql', action='store_true', help='also time the SQL path')
+    args = parser.parse_args()
+
+    random.seed(42)
+    slots = build_slots(args.bookings)
+    results = {
+        'bookings_per_day': len(slots),
+        'index': bench_index(slots, make_queries(args.queries)),
+    }
+    if args.sql:
+        results['sql'] = bench_sql(slots, make_queries(args.sql_queries))
+        results['speedup'] = results['sql']['per_query_us'] / results['index']['per_query_us']
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+"""Statements and lock hold time per booking: legacy write path vs. the state machine.
+
+Usage (from backend/):
+    python benchmarks/bench_booking_writes.py [--bookings 200] [--rtt-ms 0.5] [--payment-ms 20] [--sql]
+
+By default statements go to a stand-in cursor that sleeps --rtt-ms per
+round-trip. With --sql they run against the configured MySQL database in
+transactions that are rolled back. Lock hold time is measured from the
+first write statement to commit/rollback, which is when InnoDB releases
+the row locks the writes took.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bookings import record_booking
+
+WRITE_PREFIXES = ('INSERT', 'UPDATE', 'DELETE')
+
+class SleepingCursor:
+    """Stand-in for a database cursor that only costs a network round-trip."""
+
+    def __init__(self, rtt):
+        self.rtt = rtt
+        self.lastrowid = 0
+        self.rowcount = 1
+        self._last = None
+
+    def execute(self, query, params=None):
+        time.sleep(self.rtt)
+        self._last = query.lstrip().upper()
+        if self._last.startswith('INSERT'):
+            self.lastrowid += 1
+
+    def fetchone(self):
+        if 'EXISTS' in self._last:
+            return {'price': 100, 'user_exists': 1}
+        if 'PRICE' in self._last:
+            return {'id': 1, 'price': 100}
+        if 'FROM USERS' in self._last:
+            return {'id': 1}
+        return None
+
+class SleepingConnection:
+    def __init__(self, rtt):
+        self.rtt = rtt
+
+    def begin(self):
+        time.sleep(self.rtt)
+
+    def commit(self):
+        time.sleep(self.rtt)
+
+    def rollback(self):
+        time.sleep(self.rtt)
+
+class Recorder:
+    """Counts round-trips and times the span between the first write and the end of the transaction."""
+
+    def __init__(self, conn, cursor):
+        self.conn = conn
+        self.cursor = cursor
+        self.statements = 0
+        self.first_write = None
+        self.lock_hold = 0.0
+
+    @property
+    def lastrowid(self):
+        return self.cursor.lastrowid
+
+    def execute(self, query, params=None):
+        self.statements += 1
+        if self.first_write is None and query.lstrip().upper().startswith(WRITE_PREFIXES):
+            self.first_write = time.perf_counter()
+        return self.cursor.execute(query, params)
+
+    def fetchone(self):
+        return self.cursor.fetchone()
+
+    def end(self, commit):
+        self.statements += 1
+        (self.conn.commit if commit else self.conn.rollback)()
+        if self.first_write is not None:
+            self.lock_hold = time.perf_counter() - self.first_write
+
+def pay(payment_delay, success):
+    time.sleep(payment_delay)
+    return success, 'success' if success else 'failed'
+
+def legacy_flow(rec, slot, payment_delay, success, commit):
+    """The pre-state-machine sequence: write pending rows, pay, then fix them up."""
+    rec.execute('SELECT start_time, end_time FROM bookings WHERE venue_id = %s AND booking_date = %s '
+                "AND status != 'cancelled' AND (%s < end_time AND %s > start_time)",
+                (slot['venue_id'], slot['booking_date'], slot['start_time'], slot['end_time']))
+    rec.fetchone()
+    rec.execute('SELECT id, price FROM venues WHERE id = %s', (slot['venue_id'],))
+    venue = rec.fetchone()
+    rec.execute('SELECT id FROM users WHERE id = %s', (slot['user_id'],))
+    rec.fetchone()
+    rec.execute('INSERT INTO bookings (user_id, venue_id, booking_date, start_time, end_time, status) '
+                'VALUES (%s, %s, %s, %s, %s, %s)',
+                (slot['user_id'], slot['venue_id'], slot['booking_date'], slot['start_time'], slot['end_time'], 'pending'))
+    booking_id = rec.lastrowid
+    rec.execute('INSERT INTO payments (booking_id, amount, status) VALUES (%s, %s, %s)',
+                (booking_id, venue['price'], 'pending'))
+    payment_success, payment_status = pay(payment_delay, success)
+    rec.execute('UPDATE payments SET status = %s WHERE booking_id = %s', (payment_status, booking_id))
+    if not payment_success:
+        rec.execute('DELETE FROM bookings WHERE id = %s', (booking_id,))
+    else:
+        rec.execute('UPDATE bookings SET status = %s WHERE id = %s', ('confirmed', booking_id))
+    rec.end(commit)
+
+def state_machine_flow(rec, slot, payment_delay, success, commit):
+    """The current create_booking sequence."""
+    rec.execute('SELECT start_time, end_time FROM bookings WHERE venue_id = %s AND booking_date = %s '
+                "AND status != 'cancelled' AND (%s < end_time AND %s > start_time)",
+                (slot['venue_id'], slot['booking_date'], slot['start_time'], slot['end_time']))
+    rec.fetchone()
+    rec.execute('SELECT (SELECT price FROM venues WHERE id = %s) AS price, '
+                'EXISTS(SELECT 1 FROM users WHERE id = %s) AS user_exists',
+                (slot['venue_id'], slot['user_id']))
+    lookup = rec.fetchone()
+    _, payment_status = pay(payment_delay, success)
+    booking_id, _ = record_booking(rec, slot['user_id'], slot['venue_id'], slot['booking_date'],
+                                   slot['start_time'], slot['end_time'], lookup['price'], payment_status)
+    rec.end(commit and booking_id is not None)
+
+def run(flow, make_transaction, slots, payment_delay, success, commit):
+    statements = lock_hold = 0.0
+    for slot in slots:
+        conn, cursor = make_transaction()
+        rec = Recorder(conn, cursor)
+        flow(rec, slot, payment_delay, success, commit)
+        statements += rec.statements
+        lock_hold += rec.lock_hold
+    return {'statements_per_booking': statements / len(slots),
+            'lock_hold_ms_per_booking': lock_hold / len(slots) * 1000}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bookings', type=int, default=200)
+    parser.add_argument('--rtt-ms', type=float, default=0.5)
+    parser.add_argument('--payment-ms', type=float, default=20)
+    parser.add_argument('--sql', action='store_true', help='run against the configured MySQL database')
+    args = parser.parse_args()
+
+    booking_date = (date.today() + timedelta(days=3650)).isoformat()
+    slots = [{'user_id': 1, 'venue_id': 1, 'booking_date': booking_date,
+              'start_time': str(timedelta(minutes=i)), 'end_time': str(timedelta(minutes=i + 1))}
+             for i in range(args.bookings)]
+    payment_delay = args.payment_ms / 1000
+
+    if args.sql:
+        os.environ.setdefault('SECRET_KEY', 'benchmark')
+        from database import connect
+
+        conn = connect()
+        cursor = conn.cursor()
+        cursor.execute('INSERT INTO users (name, email, password, role) VALUES (%s, %s, %s, %s)',
+                       ('bench', f'bench-{uuid.uuid4().hex}@example.com', 'x', 'user'))
+        user_id = cursor.lastrowid
+        cursor.execute('INSERT INTO venues (name, location, capacity, price) VALUES (%s, %s, %s, %s)',
+                       (f'bench-{uuid.uuid4().hex}', 'bench', 10, 100))
+        venue_id = cursor.lastrowid
+        conn.commit()
+        for slot in slots:
+            slot.update(user_id=user_id, venue_id=venue_id)
+
+        def make_transaction():
+            conn.begin()
+            return conn, cursor
+        commit = False
+    else:
+        def make_transaction():
+            return SleepingConnection(args.rtt_ms / 1000), SleepingCursor(args.rtt_ms / 1000)
+        commit = True
+
+    results = {'bookings': len(slots), 'rtt_ms': None if args.sql else args.rtt_ms, 'payment_ms': args.payment_ms}
+    for outcome, success in (('payment_success', True), ('payment_failure', False)):
+        results[outcome] = {
+            'legacy': run(legacy_flow, make_transaction, slots, payment_delay, success, commit),
+            'state_machine': run(state_machine_flow, make_transaction, slots, payment_delay, success, commit),
+        }
+
+    if args.sql:
+        cursor.execute('DELETE FROM venues WHERE id = %s', (venue_id,))
+        cursor.execute('DELETE FROM users WHERE id = %s', (user_id,))
+        conn.commit()
+        conn.close()
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""Cold start of the pre-fork server: time to the first 200 and latency of the first requests.
+
+Usage (from backend/):
+    python benchmarks/bench_cold_start.py [--workers 4] [--runs 5]
+
+Recreates and seeds a scratch database (--database, defaults to MYSQL_DB +
+'_cold_start'), then starts `gunicorn -c gunicorn.conf.py wsgi:app` --runs
+times each with WEB_PRELOAD=true (warm-up in the master before forking) and
+false (every worker loads and warms itself). For each start it measures,
+from the moment the process is spawned:
+
+    first_200_ms      until GET /api/bookings first answers 200
+    first_requests    latency of the next 4 x --workers requests, each on a
+                      fresh connection so they spread over the workers
+
+and reports the median over the runs. Needs `pip install gunicorn`.
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+SECRET_KEY = 'benchmark'
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def get(port, path, token, timeout=10):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    try:
+        conn.request('GET', path, headers={'Authorization': f'Bearer {token}'})
+        response = conn.getresponse()
+        response.read()
+        return response.status
+    finally:
+        conn.close()
+
+def cold_start(port, env, token, workers, timeout=120):
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+        cwd=BACKEND, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while True:
+            if process.poll() is not None:
+                raise SystemExit(f'gunicorn exited with {process.returncode}')
+            if time.perf_counter() - started > timeout:
+                raise SystemExit('Server did not answer 200 in time')
+            try:
+                if get(port, '/api/bookings', token, timeout=timeout) == 200:
+                    break
+            except OSError:
+                time.sleep(0.01)
+        first_200 = time.perf_counter() - started
+
+        latencies = []
+        for _ in range(4 * workers):
+            sent = time.perf_counter()
+            status = get(port, '/api/bookings', token)
+            if status != 200:
+                raise SystemExit(f'GET /api/bookings answered {status}')
+            latencies.append(time.perf_counter() - sent)
+        return first_200, latencies
+    finally:
+        process.terminate()
+        process.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--venues', type=int, default=40)
+    parser.add_argument('--bookings', type=int, default=50000)
+    parser.add_argument('--database', default=os.getenv('MYSQL_DB', 'event_booking') + '_cold_start')
+    parser.add_argument('--keep', action='store_true', help='keep the scratch database afterwards')
+    parser.add_argument('--output', help='also write the JSON report to this file')
+    args = parser.parse_args()
+
+    os.environ['MYSQL_DB'] = args.database
+    os.environ['SECRET_KEY'] = SECRET_KEY
+    # One token serves every run; the servers inherit the lifetime
+    os.environ['ACCESS_TOKEN_SECONDS'] = '3600'
+    from seeding import recreate_database, seed, drop_database
+    from tokens import issue_access_token
+
+    conn = recreate_database(args.database)
+    try:
+        seed(conn, 10, args.venues, args.bookings, 'cold-start-password', admins=1)
+        conn.close()
+        # user1 (id 2) is a regular user with seeded bookings
+        token = issue_access_token(2, 'user')
+
+        results = {'workers': args.workers, 'threads': args.threads, 'runs': args.runs}
+        for preload in ('true', 'false'):
+            first_200s, first_requests = [], []
+            for _ in range(args.runs):
+                port = free_port()
+                env = dict(os.environ, WEB_PRELOAD=preload, WEB_WORKERS=str(args.workers),
+                           WEB_THREADS=str(args.threads), WEB_BIND=f'127.0.0.1:{port}',
+                           PAYMENT_WORKERS='0', LOG_LEVEL='WARNING')
+                first_200, latencies = cold_start(port, env, token, args.workers)
+                first_200s.append(first_200)
+                first_requests.append(latencies)
+            flat = [latency for run in first_requests for latency in run]
+            results[f'preload_{preload}'] = {
+                'first_200_ms': statistics.median(first_200s) * 1000,
+                'first_requests_p50_ms': statistics.median(flat) * 1000,
+                'first_requests_max_ms': max(flat) * 1000,
+            }
+
+        output = json.dumps(results, indent=2)
+        print(output)
+        if args.output:
+            with open(args.output, 'w') as f:
+                f.write(output + '\n')
+    finally:
+        if not args.keep:
+            drop_database(args.database)
+
+if __name__ == '__main__':
+    main()
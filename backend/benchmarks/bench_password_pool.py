@@ -0,0 +1,68 @@
+"""Login (bcrypt verify) throughput against password pool size.
+
+Usage (from backend/):
+    python benchmarks/bench_password_pool.py [--rounds 10] [--logins 64] [--clients 32] [--pools 1,2,4,8]
+
+Every client thread stands in for a request thread calling
+password_hasher.verify() the way auth.login does.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bcrypt
+from passwords import PasswordHasher
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+def run(pool_size, rounds, logins, clients, hashed):
+    hasher = PasswordHasher(workers=pool_size, rounds=rounds, queue_limit=logins, timeout=600)
+    latencies = []
+
+    def login(_):
+        started = time.perf_counter()
+        assert hasher.verify('correct horse battery staple', hashed)
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as request_threads:
+        list(request_threads.map(login, range(logins)))
+    elapsed = time.perf_counter() - started
+    stats = hasher.stats()
+    hasher.shutdown()
+    return {
+        'pool_size': pool_size,
+        'logins_per_s': logins / elapsed,
+        'latency_p50_ms': percentile(latencies, 50) * 1000,
+        'latency_p95_ms': percentile(latencies, 95) * 1000,
+        'queue_wait_avg_ms': stats['wait_time_avg'] * 1000,
+        'bcrypt_time_avg_ms': stats['run_time_avg'] * 1000,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=10)
+    parser.add_argument('--logins', type=int, default=64)
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--pools', default='1,2,4,8')
+    args = parser.parse_args()
+
+    hashed = bcrypt.hashpw(b'correct horse battery staple', bcrypt.gensalt(args.rounds)).decode('utf-8')
+    results = {
+        'rounds': args.rounds,
+        'logins': args.logins,
+        'clients': args.clients,
+        'cpu_count': os.cpu_count(),
+        'runs': [run(int(size), args.rounds, args.logins, args.clients, hashed) for size in args.pools.split(',')],
+    }
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
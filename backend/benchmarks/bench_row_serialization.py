@@ -0,0 +1,116 @@
+"""Booking list shaping + JSON encoding: per-row Python post-processing vs. SQL-formatted tuples.
+
+Usage (from backend/):
+    python benchmarks/bench_row_serialization.py [--rows 100000] [--repeat 3]
+
+"legacy" rebuilds DictCursor rows (date, timedelta, datetime and Decimal
+values) the way the handlers used to, then encodes with the standard
+library like jsonify() did. "compiled" starts from tuples already
+formatted by TIME_FORMAT/DATE_FORMAT, shapes them with
+compile_row_serializer() and encodes with serializers.dumps(), which uses
+orjson when it is installed ("compiled_stdlib" forces the fallback). The
+SQL formatting itself runs in MySQL and is not part of these timings.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask.json.provider import DefaultJSONProvider
+import serializers
+from serializers import compile_row_serializer, timedelta_to_str
+
+COLUMNS = [
+    'id', 'user_id', 'venue_id', 'booking_date', 'start_time', 'end_time', 'time_slot', 'status', 'is_cancelled',
+    'created_at', 'venue_name', 'location', 'price', 'payment_status', 'payment_amount', 'payment_created_at',
+    'is_refunded',
+]
+
+def legacy_rows(n):
+    created = datetime(2026, 1, 1, 9, 30)
+    return [{
+        'id': i, 'user_id': i % 500, 'venue_id': i % 40,
+        'booking_date': date(2026, 1, 1) + timedelta(days=i % 365),
+        'start_time': timedelta(hours=9 + i % 10), 'end_time': timedelta(hours=10 + i % 10),
+        'status': 'confirmed', 'created_at': created + timedelta(minutes=i),
+        'venue_name': f'Venue {i % 40}', 'location': 'Block A', 'price': Decimal('1500.00'),
+        'payment_status': 'success', 'payment_amount': Decimal('1500.00'),
+        'payment_created_at': created + timedelta(minutes=i, seconds=2),
+    } for i in range(n)]
+
+def formatted_rows(n):
+    """The same rows as MySQL returns them with the serializers' SQL formatting."""
+    rows = []
+    for booking in legacy_rows(n):
+        start, end = timedelta_to_str(booking['start_time']), timedelta_to_str(booking['end_time'])
+        rows.append((
+            booking['id'], booking['user_id'], booking['venue_id'],
+            booking['booking_date'].strftime('%a, %d %b %Y 00:00:00 GMT'), start, end, f'{start}-{end}',
+            booking['status'], 0, booking['created_at'].isoformat(), booking['venue_name'], booking['location'],
+            booking['price'], booking['payment_status'], booking['payment_amount'],
+            booking['payment_created_at'].isoformat(), 0,
+        ))
+    return rows
+
+def enhance_legacy(booking):
+    # What get_all_bookings did per row before the serializer layer
+    enhanced_booking = dict(booking)
+    enhanced_booking['is_cancelled'] = booking['status'] == 'cancelled'
+    enhanced_booking['is_refunded'] = booking['payment_status'] == 'refunded' if booking['payment_status'] else False
+    enhanced_booking['start_time'] = timedelta_to_str(booking['start_time'])
+    enhanced_booking['end_time'] = timedelta_to_str(booking['end_time'])
+    enhanced_booking['time_slot'] = f"{timedelta_to_str(booking['start_time'])}-{timedelta_to_str(booking['end_time'])}" if booking['start_time'] and booking['end_time'] else None
+    if booking['created_at']:
+        enhanced_booking['created_at'] = booking['created_at'].isoformat()
+    if booking.get('payment_created_at'):
+        enhanced_booking['payment_created_at'] = booking['payment_created_at'].isoformat()
+    return enhanced_booking
+
+def run_legacy(rows):
+    started = time.perf_counter()
+    shaped = [enhance_legacy(row) for row in rows]
+    shaped_at = time.perf_counter()
+    body = json.dumps({'bookings': shaped}, default=DefaultJSONProvider.default, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    return shaped_at - started, time.perf_counter() - shaped_at, len(body)
+
+def run_compiled(rows):
+    started = time.perf_counter()
+    serialize = compile_row_serializer([(name,) for name in COLUMNS])
+    shaped = [serialize(row) for row in rows]
+    shaped_at = time.perf_counter()
+    body = serializers.dumps({'bookings': shaped}, DefaultJSONProvider.default, sort_keys=True)
+    return shaped_at - started, time.perf_counter() - shaped_at, len(body)
+
+def best(fn, rows, repeat):
+    runs = [fn(rows) for _ in range(repeat)]
+    shape, encode, size = min(runs, key=lambda r: r[0] + r[1])
+    return {'shape_ms': shape * 1000, 'encode_ms': encode * 1000, 'total_ms': (shape + encode) * 1000, 'bytes': size}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    legacy = legacy_rows(args.rows)
+    formatted = formatted_rows(args.rows)
+    results = {
+        'rows': args.rows,
+        'orjson': serializers.orjson is not None,
+        'legacy': best(run_legacy, legacy, args.repeat),
+        'compiled': best(run_compiled, formatted, args.repeat),
+    }
+    if serializers.orjson is not None:
+        orjson, serializers.orjson = serializers.orjson, None
+        results['compiled_stdlib'] = best(run_compiled, formatted, args.repeat)
+        serializers.orjson = orjson
+    results['speedup'] = results['legacy']['total_ms'] / results['compiled']['total_ms']
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""Many clients racing for one venue slot: direct bookings vs. slot holds.
+
+Usage (from backend/):
+    python benchmarks/bench_slot_contention.py [--clients 500] [--rounds 3]
+
+Recreates and seeds a scratch database (--database, defaults to MYSQL_DB +
+'_contention'), serves the app in-process and logs every client in. Each
+round then releases all clients at once on a fresh slot:
+
+    direct  every client POSTs /api/bookings for the slot
+    hold    every client POSTs /api/holds; the winner books with its hold_id
+
+The report gives, per mode, how many bookings were created (must be 1 per
+round), status counts, latency of the requests that lost and of the
+winning path, and the wall time until every client had its answer.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PASSWORD = 'contention-password'
+BCRYPT_ROUNDS = 4
+
+def race(clients, body, use_hold):
+    """Release every client at once on one slot. Returns per-request (label, status, latency) and wall time."""
+    barrier = threading.Barrier(len(clients) + 1)
+    results = []
+    lock = threading.Lock()
+
+    def run(client, user_id):
+        slot = dict(body, user_id=user_id)
+        outcome = []
+        barrier.wait()
+        started = time.perf_counter()
+        if use_hold:
+            status, data = client.request('POST', '/api/holds', {k: v for k, v in slot.items() if k != 'user_id'})
+            outcome.append(('POST /api/holds', status, time.perf_counter() - started))
+            if status == 201:
+                slot['hold_id'] = json.loads(data)['hold']['id']
+                booked = time.perf_counter()
+                status, _ = client.request('POST', '/api/bookings', slot)
+                outcome.append(('POST /api/bookings (hold)', status, time.perf_counter() - booked))
+        else:
+            status, _ = client.request('POST', '/api/bookings', slot)
+            outcome.append(('POST /api/bookings', status, time.perf_counter() - started))
+        with lock:
+            results.extend(outcome)
+
+    threads = [threading.Thread(target=run, args=(client, user_id)) for client, user_id in clients]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - started
+
+def summarize(rounds, percentile):
+    requests = defaultdict(list)
+    statuses = defaultdict(lambda: defaultdict(int))
+    created = []
+    for results, _ in rounds:
+        created.append(sum(1 for label, status, _ in results if label.startswith('POST /api/bookings') and status in (201, 202)))
+        for label, status, latency in results:
+            requests[(label, 'won' if status < 300 else 'lost')].append(latency)
+            statuses[label][status] += 1
+    walls = [wall for _, wall in rounds]
+    return {
+        'bookings_created_per_round': created,
+        'status_counts': {label: {str(s): n for s, n in sorted(counts.items())} for label, counts in statuses.items()},
+        'latency_ms': {
+            f'{label} [{result}]': {
+                'requests': len(latencies),
+                'p50': percentile(latencies, 50) * 1000,
+                'p99': percentile(latencies, 99) * 1000,
+                'max': max(latencies) * 1000,
+            } for (label, result), latencies in sorted(requests.items())
+        },
+        'wall_ms_avg': sum(walls) / len(walls) * 1000,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=500)
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--database', default=os.getenv('MYSQL_DB', 'event_booking') + '_contention')
+    parser.add_argument('--keep', action='store_true', help='keep the scratch database afterwards')
+    parser.add_argument('--output', help='also write the JSON report to this file')
+    args = parser.parse_args()
+
+    # Configure the in-process app before anything reads the environment
+    os.environ['MYSQL_DB'] = args.database
+    os.environ['BCRYPT_ROUNDS'] = str(BCRYPT_ROUNDS)
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    from seeding import recreate_database, seed, drop_database, user_email
+    from load_test import Client, percentile, serve_in_process
+
+    conn = recreate_database(args.database)
+    server = None
+    try:
+        # users[0] is the admin; clients are users 1..clients (ids 2..clients + 1)
+        seed(conn, args.clients + 1, 1, 0, PASSWORD, bcrypt_rounds=BCRYPT_ROUNDS, admins=1)
+        conn.close()
+        url, server = serve_in_process()
+
+        clients = []
+        for index in range(1, args.clients + 1):
+            client = Client(url)
+            status, data = client.request('POST', '/api/login', {'email': user_email(index), 'password': PASSWORD})
+            if status != 200:
+                raise SystemExit(f'Login failed for {user_email(index)}: {status} {data[:200]!r}')
+            client.token = json.loads(data)['token']
+            clients.append((client, index + 1))
+
+        results = {'clients': args.clients, 'rounds': args.rounds}
+        day = 30
+        for mode in ('direct', 'hold'):
+            rounds = []
+            for _ in range(args.rounds):
+                # A fresh day per round, so every race starts from an empty slot
+                body = {'venue_id': 1, 'booking_date': (date.today() + timedelta(days=day)).isoformat(),
+                        'start_time': '18:00', 'end_time': '20:00'}
+                day += 1
+                rounds.append(race(clients, body, mode == 'hold'))
+            results[mode] = summarize(rounds, percentile)
+
+        output = json.dumps(results, indent=2)
+        print(output)
+        if args.output:
+            with open(args.output, 'w') as f:
+                f.write(output + '\n')
+    finally:
+        if server:
+            server.shutdown()
+        if not args.keep:
+            drop_database(args.database)
+
+if __name__ == '__main__':
+    main()
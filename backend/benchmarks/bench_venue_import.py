@@ -0,0 +1,117 @@
+"""Venue onboarding: POST /api/admin/venues/bulk against one POST /api/venues per venue.
+
+Usage (from backend/):
+    python benchmarks/bench_venue_import.py [--venues 10000] [--single 1000] [--chunk-sizes 100,500,1000]
+
+Recreates a scratch database (--database, defaults to MYSQL_DB +
+'_venue_import') and drives the app in-process as an admin:
+
+    single            --single venues created with one request each, the way
+                      Venues.js onboards them (per-row rate, not --venues)
+    bulk_json_<n>     --venues new venues as one JSON array, upserted in
+                      chunks of n rows
+    bulk_json_update  the last JSON upload again, so every row updates
+    bulk_csv          --venues new venues as one CSV upload
+
+For each it reports wall time and rows/s seen by the client, and the
+rows_per_second the endpoint reported.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+def venues(campus, count):
+    return [{'name': f'Room {i}', 'location': f'Campus {campus}', 'capacity': 20 + i % 300,
+             'price': f'{50 + i % 450}.00'} for i in range(count)]
+
+def as_csv(rows):
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=['name', 'location', 'capacity', 'price'])
+    writer.writeheader()
+    writer.writerows(rows)
+    return out.getvalue().encode('utf-8')
+
+def timed(client, headers, path, body, content_type):
+    started = time.perf_counter()
+    response = client.post(path, data=body, content_type=content_type, headers=headers)
+    elapsed = time.perf_counter() - started
+    data = response.get_json()
+    if response.status_code != 200:
+        raise SystemExit(f'POST {path} answered {response.status_code}: {data.get("error") or data.get("errors")}')
+    return elapsed, data
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--venues', type=int, default=10000)
+    parser.add_argument('--single', type=int, default=1000)
+    parser.add_argument('--chunk-sizes', default='100,500,1000')
+    parser.add_argument('--database', default=os.getenv('MYSQL_DB', 'event_booking') + '_venue_import')
+    parser.add_argument('--keep', action='store_true', help='keep the scratch database afterwards')
+    parser.add_argument('--output', help='also write the JSON report to this file')
+    args = parser.parse_args()
+
+    # Point the app at the scratch database before anything reads the config
+    os.environ['MYSQL_DB'] = args.database
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    os.environ.setdefault('PAYMENT_WORKERS', '0')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    from seeding import recreate_database, drop_database, seed
+
+    try:
+        conn = recreate_database(args.database)
+        seed(conn, 1, 0, 0, 'venue-import-password', admins=1)
+        conn.close()
+
+        from main import create_app
+        from tokens import issue_access_token
+        import venue_import
+
+        client = create_app().test_client()
+        headers = {'Authorization': f'Bearer {issue_access_token(1, "admin")}'}
+        results = {'venues': args.venues}
+
+        started = time.perf_counter()
+        for row in venues('single', args.single):
+            response = client.post('/api/venues', json=row, headers=headers)
+            if response.status_code != 201:
+                raise SystemExit(f'POST /api/venues answered {response.status_code}')
+        elapsed = time.perf_counter() - started
+        results['single'] = {'rows': args.single, 'elapsed_ms': elapsed * 1000, 'rows_per_second': args.single / elapsed}
+
+        def report(elapsed, data):
+            return {'rows': data['rows'], 'created': data['created'], 'updated': data['updated'],
+                    'elapsed_ms': elapsed * 1000, 'rows_per_second': data['rows'] / elapsed,
+                    'server_rows_per_second': data['rows_per_second']}
+
+        body = None
+        for chunk_size in [int(size) for size in args.chunk_sizes.split(',')]:
+            venue_import.VENUE_IMPORT_CHUNK_SIZE = chunk_size
+            body = json.dumps(venues(f'json-{chunk_size}', args.venues)).encode('utf-8')
+            results[f'bulk_json_{chunk_size}'] = report(*timed(client, headers, '/api/admin/venues/bulk',
+                                                               body, 'application/json'))
+        results['bulk_json_update'] = report(*timed(client, headers, '/api/admin/venues/bulk', body, 'application/json'))
+        results['bulk_csv'] = report(*timed(client, headers, '/api/admin/venues/bulk',
+                                            as_csv(venues('csv', args.venues)), 'text/csv'))
+        results['speedup'] = results['bulk_csv']['rows_per_second'] / results['single']['rows_per_second']
+
+        output = json.dumps(results, indent=2)
+        print(output)
+        if args.output:
+            with open(args.output, 'w') as f:
+                f.write(output + '\n')
+    finally:
+        if not args.keep:
+            drop_database(args.database)
+
+if __name__ == '__main__':
+    main()
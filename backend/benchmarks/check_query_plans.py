@@ -0,0 +1,175 @@
+"""Fail if a route query falls back to a full table scan on a seeded dataset.
+
+Usage (from backend/):
+    python benchmarks/check_query_plans.py [--database event_booking_plans] [--bookings 20000] [--keep]
+
+Creates (and by default drops) a scratch database next to MYSQL_DB, builds
+it with migrate.py, seeds it, then drives every route in routes/*.py
+through the Flask test client while recording the SQL they run. Each
+recorded SELECT/UPDATE/DELETE is EXPLAINed; a plan row with type=ALL over
+at least --min-rows rows is reported and makes the script exit 1.
+"""
+import argparse
+import json
+import os
+import sys
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pymysql
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Routes that read a whole table on purpose
+FULL_SCAN_ALLOWED = {
+    'GET /api/users': 'lists every user',
+    'GET /api/revenue': 'all-time revenue total without filters',
+    'GET /api/admin/bookings/export': 'streams every booking',
+}
+
+PASSWORD = 'plans-check-password'
+
+def route_calls(ids):
+    """(label, method, path, body, token_role) for every route, in an order that keeps ids valid."""
+    future = (date.today() + timedelta(days=400)).isoformat()
+    today = date.today()
+    venue_id, user_id = ids['venue_id'], ids['user_id']
+    return [
+        ('POST /api/login', 'POST', '/api/login', {'email': 'user0@example.com', 'password': PASSWORD}, None),
+        ('POST /api/signup', 'POST', '/api/signup', {'name': 'New', 'email': 'new@example.com', 'password': PASSWORD}, None),
+        ('GET /api/venues', 'GET', '/api/venues', None, 'user'),
+        ('GET /api/venues/<id>/availability', 'GET',
+         f'/api/venues/{venue_id}/availability?from={today.isoformat()}&to={(today + timedelta(days=13)).isoformat()}', None, 'user'),
+        ('POST /api/bookings', 'POST', '/api/bookings',
+         {'user_id': user_id, 'venue_id': venue_id, 'booking_date': future, 'start_time': '10:00', 'end_time': '11:00'}, 'user'),
+        ('POST /api/holds', 'POST', '/api/holds',
+         {'venue_id': venue_id, 'booking_date': future, 'start_time': '14:00', 'end_time': '15:00'}, 'user'),
+        ('POST /api/bookings/batch', 'POST', '/api/bookings/batch',
+         {'user_id': user_id, 'mode': 'partial', 'bookings': [
+             {'venue_id': venue_id, 'booking_date': future, 'start_time': '12:00', 'end_time': '13:00'},
+             {'venue_id': venue_id + 1, 'booking_date': future, 'start_time': '12:00', 'end_time': '13:00'},
+         ]}, 'user'),
+        ('GET /api/profile', 'GET', '/api/profile', None, 'user'),
+        ('PUT /api/profile', 'PUT', '/api/profile', {'name': 'Renamed'}, 'user'),
+        ('GET /api/bookings', 'GET', '/api/bookings', None, 'user'),
+        ('GET /api/bookings', 'GET', '/api/bookings?status=confirmed&start_date=2000-01-01', None, 'user'),
+        ('GET /api/bookings/<id>/payment', 'GET', f'/api/bookings/{ids["user_booking_id"]}/payment', None, 'user'),
+        ('DELETE /api/bookings/<id>', 'DELETE', f'/api/bookings/{ids["user_booking_id"]}', None, 'user'),
+        ('GET /api/admin/venues', 'GET', '/api/admin/venues', None, 'admin'),
+        ('GET /api/admin/venues', 'GET', '/api/admin/venues?q=Venue%201&sort=upcoming_bookings&order=desc', None, 'admin'),
+        ('GET /api/venues/<id>', 'GET', f'/api/venues/{venue_id}', None, 'admin'),
+        ('PUT /api/venues/<id>', 'PUT', f'/api/venues/{venue_id}', {'capacity': 123}, 'admin'),
+        ('POST /api/venues', 'POST', '/api/venues', {'name': 'Plans', 'location': 'Check', 'capacity': 1, 'price': 1}, 'admin'),
+        ('DELETE /api/venues/<id>', 'DELETE', f'/api/venues/{ids["spare_venue_id"]}', None, 'admin'),
+        ('GET /api/revenue', 'GET', '/api/revenue', None, 'admin'),
+        ('GET /api/revenue?venue_id', 'GET', f'/api/revenue?venue_id={venue_id}&start_date={today.isoformat()}', None, 'admin'),
+        ('GET /api/bookings/all', 'GET', '/api/bookings/all?include_total=true', None, 'admin'),
+        ('GET /api/bookings/all', 'GET', f'/api/bookings/all?venue_id={venue_id}&status=confirmed', None, 'admin'),
+        ('GET /api/bookings/all', 'GET', f'/api/bookings/all?user_id={user_id}', None, 'admin'),
+        ('GET /api/admin/bookings/export', 'GET', '/api/admin/bookings/export?format=csv', None, 'admin'),
+        ('GET /api/bookings/statistics', 'GET', '/api/bookings/statistics', None, 'admin'),
+        ('DELETE /api/admin/bookings/<id>', 'DELETE', f'/api/admin/bookings/{ids["admin_booking_id"]}', None, 'admin'),
+        ('GET /api/users', 'GET', '/api/users', None, 'admin'),
+        ('PUT /api/users/<id>/role', 'PUT', f'/api/users/{ids["spare_user_id"]}/role', {'role': 'admin'}, 'admin'),
+        ('DELETE /api/users/<id>', 'DELETE', f'/api/users/{ids["spare_user_id"]}', None, 'admin'),
+    ]
+
+def pick_ids(conn, users, venues):
+    """Ids the route calls act on; the last venue and user are deleted along the way."""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT id FROM bookings WHERE user_id = 3 AND status != 'cancelled' LIMIT 1")
+        user_booking = cursor.fetchone()
+        cursor.execute("SELECT id FROM bookings WHERE status = 'confirmed' AND user_id != 3 LIMIT 1")
+        admin_booking = cursor.fetchone()
+    return {
+        'user_id': 3,
+        'venue_id': 1,
+        'spare_venue_id': venues,
+        'spare_user_id': users,
+        'user_booking_id': user_booking['id'] if user_booking else 0,
+        'admin_booking_id': admin_booking['id'],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', default=os.getenv('MYSQL_DB', 'event_booking') + '_plans')
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--venues', type=int, default=50)
+    parser.add_argument('--bookings', type=int, default=20000)
+    parser.add_argument('--min-rows', type=int, default=1000)
+    parser.add_argument('--keep', action='store_true', help='keep the scratch database')
+    args = parser.parse_args()
+
+    # Point the app at the scratch database before anything reads the config
+    os.environ['MYSQL_DB'] = args.database
+    os.environ.setdefault('SECRET_KEY', 'check-query-plans')
+    from seeding import recreate_database, drop_database, seed
+
+    try:
+        conn = recreate_database(args.database)
+        seed(conn, args.users, args.venues, args.bookings, PASSWORD)
+        ids = pick_ids(conn, args.users, args.venues)
+
+        from main import create_app
+        from tokens import issue_access_token
+
+        tokens = {'user': issue_access_token(ids['user_id'], 'user'), 'admin': issue_access_token(1, 'admin')}
+
+        # Record every statement the routes run
+        recorded = []
+        current = {'label': None}
+        original_execute = pymysql.cursors.Cursor.execute
+
+        def recording_execute(self, query, args=None):
+            if current['label']:
+                recorded.append((current['label'], self.mogrify(query, args)))
+            return original_execute(self, query, args)
+        pymysql.cursors.Cursor.execute = recording_execute
+
+        client = create_app().test_client()
+        for label, method, path, body, role in route_calls(ids):
+            current['label'] = label
+            headers = {'Authorization': f'Bearer {tokens[role]}'} if role else {}
+            response = client.open(path, method=method, json=body, headers=headers)
+            response.get_data()
+            current['label'] = None
+            if response.status_code >= 500:
+                print(f'{label}: HTTP {response.status_code} {response.get_data(as_text=True)[:200]}', file=sys.stderr)
+        pymysql.cursors.Cursor.execute = original_execute
+
+        problems = []
+        checked = 0
+        with conn.cursor() as cursor:
+            for label, statement in recorded:
+                if statement.lstrip().split(None, 1)[0].upper() not in ('SELECT', 'UPDATE', 'DELETE'):
+                    continue
+                if 'information_schema' in statement or label in FULL_SCAN_ALLOWED:
+                    continue
+                checked += 1
+                cursor.execute('EXPLAIN ' + statement)
+                for row in cursor.fetchall():
+                    if row['type'] == 'ALL' and (row['rows'] or 0) >= args.min_rows:
+                        problems.append({
+                            'route': label,
+                            'table': row['table'],
+                            'rows': row['rows'],
+                            'query': ' '.join(statement.split())[:300],
+                        })
+        conn.close()
+
+        print(json.dumps({
+            'database': args.database,
+            'routes': len(route_calls(ids)),
+            'statements_checked': checked,
+            'full_scans': problems,
+            'allowed': FULL_SCAN_ALLOWED,
+        }, indent=2, default=str))
+        return 1 if problems else 0
+    finally:
+        if not args.keep:
+            drop_database(args.database)
+
+if __name__ == '__main__':
+    sys.exit(main())
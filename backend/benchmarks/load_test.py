@@ -0,0 +1,310 @@
+"""End-to-end load test: seeded MySQL + a realistic traffic mix against the API.
+
+Usage (from backend/):
+    python benchmarks/load_test.py [--url http://localhost:5001] [--seed] [--database event_booking_load]
+                                   [--users 500] [--venues 40] [--bookings 50000]
+                                   [--clients 16] [--duration 30] [--hot-share 0.3] [--output results.json]
+
+Without --url the app is served in-process on a free port by a threaded
+werkzeug server. With --seed the scratch database (--database, defaults
+to MYSQL_DB + '_load') is recreated, migrated and filled first; an
+in-process server then runs against it. Against a remote --url, seed that
+server's database separately and pass --password for the seeded users.
+
+Each client logs in as its own user (or as an admin for a share of clients),
+then loops over a weighted mix of endpoints for --duration seconds. Booking
+requests aim at a handful of popular slots with probability --hot-share, so
+they contend with each other. The report is JSON with, per endpoint,
+p50/p95/p99 latency, throughput and error rates; 409 conflicts are counted
+as expected outcomes, not errors.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PASSWORD = 'load-test-password'
+
+# (endpoint, weight) for regular users and for admins
+USER_MIX = [
+    ('GET /api/venues', 25),
+    ('GET /api/venues/<id>/availability', 15),
+    ('POST /api/bookings', 20),
+    ('GET /api/bookings', 20),
+    ('GET /api/profile', 10),
+    ('POST /api/login', 5),
+]
+ADMIN_MIX = [
+    ('GET /api/bookings/all', 40),
+    ('GET /api/bookings/statistics', 20),
+    ('GET /api/admin/venues', 20),
+    ('GET /api/venues', 20),
+]
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else None
+
+class Client:
+    """One keep-alive HTTP connection, like a browser tab."""
+
+    def __init__(self, url, timeout=30):
+        parts = urlsplit(url)
+        connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self._connect = lambda: connection_class(parts.hostname, parts.port, timeout=timeout)
+        self.conn = self._connect()
+        self.token = None
+
+    def request(self, method, path, body=None):
+        headers = {'Content-Type': 'application/json'}
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        payload = json.dumps(body) if body is not None else None
+        try:
+            self.conn.request(method, path, body=payload, headers=headers)
+            response = self.conn.getresponse()
+            data = response.read()
+        except (http.client.HTTPException, OSError):
+            # Reconnect once; the server may have closed an idle keep-alive socket
+            self.conn.close()
+            self.conn = self._connect()
+            self.conn.request(method, path, body=payload, headers=headers)
+            response = self.conn.getresponse()
+            data = response.read()
+        return response.status, data
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.failures = defaultdict(int)
+
+    def record(self, endpoint, latency, status):
+        with self._lock:
+            self.latencies[endpoint].append(latency)
+            self.statuses[endpoint][status] += 1
+
+    def fail(self, endpoint, latency):
+        with self._lock:
+            self.latencies[endpoint].append(latency)
+            self.failures[endpoint] += 1
+
+    def report(self, elapsed):
+        endpoints = {}
+        for endpoint in sorted(self.latencies):
+            latencies = self.latencies[endpoint]
+            statuses = self.statuses[endpoint]
+            count = len(latencies)
+            errors = self.failures[endpoint] + sum(n for status, n in statuses.items() if status >= 500)
+            client_errors = sum(n for status, n in statuses.items() if 400 <= status < 500 and status != 409)
+            endpoints[endpoint] = {
+                'requests': count,
+                'throughput_rps': count / elapsed,
+                'latency_p50_ms': percentile(latencies, 50) * 1000,
+                'latency_p95_ms': percentile(latencies, 95) * 1000,
+                'latency_p99_ms': percentile(latencies, 99) * 1000,
+                'latency_max_ms': max(latencies) * 1000,
+                'error_rate': errors / count,
+                'client_error_rate': client_errors / count,
+                'conflict_rate': statuses.get(409, 0) / count,
+                'status_counts': {str(status): n for status, n in sorted(statuses.items())},
+                'connection_failures': self.failures[endpoint],
+            }
+        total = sum(len(v) for v in self.latencies.values())
+        all_latencies = [latency for values in self.latencies.values() for latency in values]
+        errors = sum(e['error_rate'] * e['requests'] for e in endpoints.values())
+        return {
+            'elapsed_s': elapsed,
+            'requests': total,
+            'throughput_rps': total / elapsed if elapsed else 0,
+            'latency_p50_ms': (percentile(all_latencies, 50) or 0) * 1000,
+            'latency_p95_ms': (percentile(all_latencies, 95) or 0) * 1000,
+            'latency_p99_ms': (percentile(all_latencies, 99) or 0) * 1000,
+            'error_rate': errors / total if total else 0,
+            'endpoints': endpoints,
+        }
+
+def pick(rng, mix):
+    return rng.choices([endpoint for endpoint, _ in mix], weights=[weight for _, weight in mix])[0]
+
+def run_client(url, index, args, deadline, recorder, hot_slots):
+    rng = random.Random(args.rng_seed + index)
+    client = Client(url)
+    is_admin = index < round(args.clients * args.admin_share)
+    # Seeded users: ids 1..admins are admins, the rest regular users
+    user_index = index % args.admins if is_admin else args.admins + index % (args.users - args.admins)
+    user_id = user_index + 1
+    credentials = {'email': f'user{user_index}@example.com', 'password': args.password}
+
+    def call(endpoint, method, path, body=None):
+        started = time.perf_counter()
+        try:
+            status, data = client.request(method, path, body)
+        except (http.client.HTTPException, OSError):
+            recorder.fail(endpoint, time.perf_counter() - started)
+            return None, None
+        recorder.record(endpoint, time.perf_counter() - started, status)
+        return status, data
+
+    status, data = call('POST /api/login', 'POST', '/api/login', credentials)
+    if status != 200:
+        return
+    client.token = json.loads(data)['token']
+
+    next_cursor = None
+    while time.monotonic() < deadline:
+        endpoint = pick(rng, ADMIN_MIX if is_admin else USER_MIX)
+        venue_id = rng.randrange(1, args.venues + 1)
+        if endpoint == 'POST /api/login':
+            call(endpoint, 'POST', '/api/login', credentials)
+        elif endpoint == 'GET /api/venues':
+            call(endpoint, 'GET', '/api/venues')
+        elif endpoint == 'GET /api/venues/<id>/availability':
+            start = date.today() + timedelta(days=rng.randrange(0, 30))
+            call(endpoint, 'GET', f'/api/venues/{venue_id}/availability?from={start}&to={start + timedelta(days=6)}')
+        elif endpoint == 'POST /api/bookings':
+            if rng.random() < args.hot_share:
+                venue_id, booking_date, hour = rng.choice(hot_slots)
+            else:
+                booking_date = date.today() + timedelta(days=rng.randrange(1, 180))
+                hour = rng.randrange(6, 22)
+            call(endpoint, 'POST', '/api/bookings', {
+                'user_id': user_id,
+                'venue_id': venue_id,
+                'booking_date': booking_date.isoformat(),
+                'start_time': f'{hour:02d}:00',
+                'end_time': f'{hour + 1:02d}:00',
+            })
+        elif endpoint == 'GET /api/bookings':
+            call(endpoint, 'GET', '/api/bookings')
+        elif endpoint == 'GET /api/profile':
+            call(endpoint, 'GET', '/api/profile')
+        elif endpoint == 'GET /api/bookings/all':
+            # Walk a few pages, then start over from the newest bookings
+            path = '/api/bookings/all?fields=venue,payment&limit=100'
+            if next_cursor and rng.random() < 0.7:
+                path += f'&cursor={next_cursor}'
+            status, data = call(endpoint, 'GET', path)
+            next_cursor = json.loads(data).get('next_cursor') if status == 200 else None
+        elif endpoint == 'GET /api/bookings/statistics':
+            call(endpoint, 'GET', '/api/bookings/statistics')
+        elif endpoint == 'GET /api/admin/venues':
+            call(endpoint, 'GET', f'/api/admin/venues?sort={rng.choice(["name", "upcoming_bookings"])}')
+
+def serve_in_process():
+    """Serve the app, its payment workers and maintenance loop from background threads. Returns (url, server)."""
+    from werkzeug.serving import make_server
+    # Every client logs in from 127.0.0.1; keep the per-address login limit out of the measurement
+    os.environ.setdefault('LOGIN_IP_LIMIT', '1000000000')
+    # Clients log in once; keep their access tokens valid for the whole run
+    os.environ.setdefault('ACCESS_TOKEN_SECONDS', '86400')
+    from main import create_app
+    from payments import payment_workers
+    from maintenance import maintenance
+    server = make_server('127.0.0.1', 0, create_app(), threaded=True)
+    # Bookings are accepted as pending; settle them as the real server would
+    payment_workers.start()
+    maintenance.start()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_port}', server
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='server to test; default: serve the app in-process')
+    parser.add_argument('--seed', action='store_true', help='recreate and seed --database first')
+    parser.add_argument('--database', default=os.getenv('MYSQL_DB', 'event_booking') + '_load')
+    parser.add_argument('--keep', action='store_true', help='keep the seeded database afterwards')
+    parser.add_argument('--password', default=PASSWORD, help='password of the seeded users')
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--admins', type=int, default=5)
+    parser.add_argument('--venues', type=int, default=40)
+    parser.add_argument('--bookings', type=int, default=50000)
+    parser.add_argument('--bcrypt-rounds', type=int, default=None, help='cost of the seeded hashes (default: BCRYPT_ROUNDS)')
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--admin-share', type=float, default=0.125)
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--hot-slots', type=int, default=5)
+    parser.add_argument('--hot-share', type=float, default=0.3)
+    parser.add_argument('--rng-seed', type=int, default=1)
+    parser.add_argument('--output', help='also write the JSON report to this file')
+    args = parser.parse_args()
+
+    if args.seed and args.url:
+        parser.error('--seed only seeds the local scratch database; seed a remote server separately')
+
+    server = None
+    seeded = False
+    try:
+        if args.seed:
+            # Point the in-process app at the scratch database before anything reads the config
+            os.environ['MYSQL_DB'] = args.database
+            from seeding import recreate_database, seed
+            from passwords import BCRYPT_ROUNDS
+            conn = recreate_database(args.database)
+            seeded = True
+            started = time.perf_counter()
+            seed(conn, args.users, args.venues, args.bookings, args.password,
+                 bcrypt_rounds=args.bcrypt_rounds or BCRYPT_ROUNDS, admins=args.admins)
+            conn.close()
+            print(f'Seeded {args.database} in {time.perf_counter() - started:.1f}s', file=sys.stderr)
+
+        url = args.url
+        if not url:
+            url, server = serve_in_process()
+
+        rng = random.Random(args.rng_seed)
+        hot_slots = [
+            (rng.randrange(1, args.venues + 1), date.today() + timedelta(days=rng.randrange(1, 14)), rng.randrange(8, 20))
+            for _ in range(args.hot_slots)
+        ]
+
+        recorder = Recorder()
+        deadline = time.monotonic() + args.duration
+        started = time.perf_counter()
+        threads = [
+            threading.Thread(target=run_client, args=(url, i, args, deadline, recorder, hot_slots))
+            for i in range(args.clients)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        results = {
+            'url': url if args.url else 'in-process',
+            'clients': args.clients,
+            'duration_s': args.duration,
+            'dataset': {'users': args.users, 'venues': args.venues, 'bookings': args.bookings, 'seeded': args.seed},
+            'hot_slots': [[venue_id, day.isoformat(), hour] for venue_id, day, hour in hot_slots],
+            'hot_share': args.hot_share,
+            **recorder.report(elapsed),
+        }
+        output = json.dumps(results, indent=2)
+        print(output)
+        if args.output:
+            with open(args.output, 'w') as f:
+                f.write(output + '\n')
+    finally:
+        if server:
+            server.shutdown()
+        if seeded and not args.keep:
+            from seeding import drop_database
+            drop_database(args.database)
+
+if __name__ == '__main__':
+    main()
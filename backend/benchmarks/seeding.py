@@ -0,0 +1,90 @@
+"""Scratch databases and synthetic data shared by the benchmark scripts.
+
+Import after pointing MYSQL_DB at the scratch database, since database.Config
+reads the environment once at import time.
+"""
+import random
+from datetime import date, datetime, timedelta
+
+import bcrypt
+import pymysql
+
+import database
+import migrate
+import rollups
+
+BOOKING_STATUS_MIX = ['confirmed'] * 8 + ['cancelled', 'pending']
+PAYMENT_FOR_STATUS = "CASE b.status WHEN 'confirmed' THEN 'success' WHEN 'pending' THEN 'pending' ELSE 'refunded' END"
+
+def _server():
+    return pymysql.connect(host=database.Config.MYSQL_HOST, user=database.Config.MYSQL_USER,
+                           password=database.Config.MYSQL_PASSWORD)
+
+def recreate_database(name):
+    """Drop and recreate `name`, then build the schema with migrate.py. Returns an open connection."""
+    server = _server()
+    try:
+        with server.cursor() as cursor:
+            cursor.execute(f'DROP DATABASE IF EXISTS `{name}`')
+            cursor.execute(f'CREATE DATABASE `{name}`')
+    finally:
+        server.close()
+    conn = database.connect()
+    migrate.migrate_up(conn)
+    return conn
+
+def drop_database(name):
+    server = _server()
+    try:
+        with server.cursor() as cursor:
+            cursor.execute(f'DROP DATABASE IF EXISTS `{name}`')
+    finally:
+        server.close()
+
+def user_email(index):
+    """Email of the index-th seeded user (ids are index + 1)."""
+    return f'user{index}@example.com'
+
+def seed(conn, users, venues, bookings, password, bcrypt_rounds=4, admins=2, seed=42, batch_size=5000):
+    """Insert users (the first `admins` are admins), venues, bookings with payments, and rebuild rollups.
+
+    Bookings are spread over +-180 days and created over the past year. All
+    users share one password hash, so seeding cost does not grow with
+    bcrypt_rounds.
+    """
+    rng = random.Random(seed)
+    hashed = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(bcrypt_rounds)).decode('utf-8')
+    with conn.cursor() as cursor:
+        cursor.executemany(
+            'INSERT INTO users (name, email, password, role) VALUES (%s, %s, %s, %s)',
+            [(f'User {i}', user_email(i), hashed, 'admin' if i < admins else 'user') for i in range(users)]
+        )
+        cursor.executemany(
+            'INSERT INTO venues (name, location, capacity, price) VALUES (%s, %s, %s, %s)',
+            [(f'Venue {i}', f'Block {i % 7}', 50 + i, 1000 + i) for i in range(venues)]
+        )
+        now = datetime.now()
+        for offset in range(0, bookings, batch_size):
+            rows = []
+            for _ in range(min(batch_size, bookings - offset)):
+                hour = rng.randrange(6, 22)
+                rows.append((
+                    rng.randrange(1, users + 1), rng.randrange(1, venues + 1),
+                    date.today() + timedelta(days=rng.randrange(-180, 180)),
+                    f'{hour:02d}:00', f'{hour + 1:02d}:00',
+                    rng.choice(BOOKING_STATUS_MIX),
+                    now - timedelta(minutes=rng.randrange(0, 365 * 24 * 60)),
+                ))
+            cursor.executemany(
+                'INSERT INTO bookings (user_id, venue_id, booking_date, start_time, end_time, status, created_at) '
+                'VALUES (%s, %s, %s, %s, %s, %s, %s)', rows
+            )
+        cursor.execute(
+            f'INSERT INTO payments (booking_id, amount, status) SELECT b.id, v.price, {PAYMENT_FOR_STATUS} '
+            'FROM bookings b JOIN venues v ON v.id = b.venue_id'
+        )
+        rollups.rebuild(cursor)
+        for table in ('users', 'venues', 'bookings', 'payments', 'booking_daily_stats'):
+            cursor.execute(f'ANALYZE TABLE {table}')
+            cursor.fetchall()
+    conn.commit()
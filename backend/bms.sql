@@ -1,3 +1,5 @@
+-- Snapshot of the schema built by `python migrate.py up` (see migrations/),
+-- which is the supported way to create and upgrade the database.
 CREATE DATABASE event_booking;
 USE event_booking;
 
@@ -27,12 +29,12 @@ CREATE TABLE bookings (
     user_id INT NOT NULL,
     venue_id INT NOT NULL,
     booking_date DATE NOT NULL,
-    time_slot VARCHAR(50) NOT NULL,
+    start_time TIME NOT NULL,
+    end_time TIME NOT NULL,
     status ENUM('confirmed', 'cancelled', 'pending') DEFAULT 'pending',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
-    FOREIGN KEY (venue_id) REFERENCES venues(id) ON DELETE CASCADE,
-    UNIQUE(venue_id, booking_date, time_slot)
+    FOREIGN KEY (venue_id) REFERENCES venues(id) ON DELETE CASCADE
 );
 
 -- Payments table
@@ -43,4 +45,182 @@ CREATE TABLE payments (
     status ENUM('success', 'failed', 'refunded', 'pending') DEFAULT 'pending',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (booking_id) REFERENCES bookings(id) ON DELETE CASCADE
-);
\ No newline at end of file
+);
+
+-- Per-venue, per-day booking statistics, keyed by the day bookings were created.
+-- Maintained incrementally by the application (see rollups.py).
+CREATE TABLE booking_daily_stats (
+    venue_id INT NOT NULL,
+    stat_date DATE NOT NULL,
+    bookings_confirmed INT NOT NULL DEFAULT 0,
+    bookings_pending INT NOT NULL DEFAULT 0,
+    bookings_cancelled INT NOT NULL DEFAULT 0,
+    payments_success INT NOT NULL DEFAULT 0,
+    payments_failed INT NOT NULL DEFAULT 0,
+    payments_refunded INT NOT NULL DEFAULT 0,
+    payments_pending INT NOT NULL DEFAULT 0,
+    amount_success DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    amount_failed DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    amount_refunded DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    amount_pending DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (venue_id, stat_date),
+    INDEX idx_booking_daily_stats_date (stat_date),
+    FOREIGN KEY (venue_id) REFERENCES venues(id) ON DELETE CASCADE
+);
+
+-- Version counters for in-process caches; workers poll these rows to stay coherent.
+-- Bumped by the application (see venue_cache.py).
+CREATE TABLE cache_versions (
+    name VARCHAR(64) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+);
+
+INSERT INTO cache_versions (name, version) VALUES ('venues', 1);
+
+-- Outbox of payments waiting for a gateway; drained by the payment workers (see payments.py).
+CREATE TABLE payment_intents (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    booking_id INT NOT NULL,
+    idempotency_key CHAR(36) NOT NULL,
+    amount DECIMAL(10, 2) NOT NULL,
+    status ENUM('queued', 'processing', 'succeeded', 'failed', 'expired') NOT NULL DEFAULT 'queued',
+    attempts INT NOT NULL DEFAULT 0,
+    next_attempt_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    expires_at DATETIME NOT NULL,
+    last_error VARCHAR(255) NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    UNIQUE KEY uq_payment_intents_booking (booking_id),
+    UNIQUE KEY uq_payment_intents_key (idempotency_key),
+    INDEX idx_payment_intents_due (status, next_attempt_at),
+    INDEX idx_payment_intents_expiry (status, expires_at),
+    FOREIGN KEY (booking_id) REFERENCES bookings(id) ON DELETE CASCADE
+);
+
+-- Charges that succeeded after their booking was cancelled or deleted, waiting to be refunded (see payments.py).
+-- No foreign key: the booking may be gone.
+CREATE TABLE payment_refunds (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    booking_id INT NOT NULL,
+    idempotency_key CHAR(36) NOT NULL,
+    amount DECIMAL(10, 2) NOT NULL,
+    reason VARCHAR(255) NOT NULL,
+    status ENUM('queued', 'processing', 'refunded', 'failed') NOT NULL DEFAULT 'queued',
+    attempts INT NOT NULL DEFAULT 0,
+    next_attempt_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    last_error VARCHAR(255) NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    UNIQUE KEY uq_payment_refunds_key (idempotency_key),
+    INDEX idx_payment_refunds_due (status, next_attempt_at)
+);
+
+-- One row per venue and day, locked by every booking and hold written for it (see holds.py).
+-- No foreign key: rows of past days are purged with expired holds.
+CREATE TABLE venue_day_locks (
+    venue_id INT NOT NULL,
+    booking_date DATE NOT NULL,
+    PRIMARY KEY (venue_id, booking_date),
+    INDEX idx_venue_day_locks_date (booking_date)
+);
+
+-- Short-lived slot holds; one slot_hold_units row per held minute makes claims atomic (see holds.py).
+CREATE TABLE slot_holds (
+    id CHAR(36) PRIMARY KEY,
+    user_id INT NOT NULL,
+    venue_id INT NOT NULL,
+    booking_date DATE NOT NULL,
+    start_time TIME NOT NULL,
+    end_time TIME NOT NULL,
+    expires_at DATETIME NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_slot_holds_venue_day (venue_id, booking_date, expires_at),
+    INDEX idx_slot_holds_expiry (expires_at),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (venue_id) REFERENCES venues(id) ON DELETE CASCADE
+);
+
+CREATE TABLE slot_hold_units (
+    venue_id INT NOT NULL,
+    booking_date DATE NOT NULL,
+    minute SMALLINT NOT NULL,
+    hold_id CHAR(36) NULL,
+    PRIMARY KEY (venue_id, booking_date, minute),
+    INDEX idx_slot_hold_units_hold (hold_id),
+    FOREIGN KEY (hold_id) REFERENCES slot_holds(id) ON DELETE CASCADE
+);
+
+CREATE TABLE idempotency_keys (
+    idempotency_key CHAR(64) PRIMARY KEY,
+    fingerprint CHAR(64) NOT NULL,
+    status_code SMALLINT NULL,
+    body MEDIUMBLOB NULL,
+    headers TEXT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    expires_at DATETIME NOT NULL,
+    INDEX idx_idempotency_keys_expiry (expires_at)
+);
+
+-- Login rate limiting when RATE_LIMIT_BACKEND=sql (see ratelimit.py); times are Unix seconds.
+CREATE TABLE rate_limit_counters (
+    counter_key CHAR(64) NOT NULL,
+    window_start INT UNSIGNED NOT NULL,
+    hits INT UNSIGNED NOT NULL,
+    PRIMARY KEY (counter_key, window_start),
+    INDEX idx_rate_limit_counters_window (window_start)
+);
+
+CREATE TABLE rate_limit_lockouts (
+    counter_key CHAR(64) PRIMARY KEY,
+    locked_until INT UNSIGNED NOT NULL,
+    level SMALLINT UNSIGNED NOT NULL,
+    updated_at INT UNSIGNED NOT NULL,
+    INDEX idx_rate_limit_lockouts_updated (updated_at)
+);
+
+-- Refresh tokens, stored as SHA-256 hashes; one family per login (see tokens.py).
+CREATE TABLE refresh_tokens (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    token_hash CHAR(64) NOT NULL,
+    family_id CHAR(32) NOT NULL,
+    user_id INT NOT NULL,
+    expires_at DATETIME NOT NULL,
+    rotated_at DATETIME NULL,
+    revoked_at DATETIME NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE INDEX idx_refresh_tokens_hash (token_hash),
+    INDEX idx_refresh_tokens_family (family_id),
+    INDEX idx_refresh_tokens_user (user_id),
+    INDEX idx_refresh_tokens_expiry (expires_at),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+CREATE TABLE schema_version (
+    version INT PRIMARY KEY,
+    name VARCHAR(255) NOT NULL,
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Indexes behind the hot route queries (migrations/0003_query_indexes.py)
+CREATE INDEX idx_bookings_overlap ON bookings (venue_id, booking_date, status, start_time, end_time);
+CREATE INDEX idx_bookings_user_created ON bookings (user_id, created_at);
+CREATE INDEX idx_bookings_created ON bookings (created_at);
+CREATE INDEX idx_bookings_venue_status_date ON bookings (venue_id, status, booking_date);
+CREATE INDEX idx_venues_name ON venues (name);
+CREATE INDEX idx_users_role ON users (role);
+
+-- Key of the bulk venue upsert, also used by the location prefix search (migrations/0009_venue_natural_key.py)
+CREATE UNIQUE INDEX idx_venues_location_name ON venues (location, name);
+
+INSERT INTO schema_version (version, name) VALUES
+    (1, 'initial_schema'),
+    (2, 'rollups_and_cache_versions'),
+    (3, 'query_indexes'),
+    (4, 'payment_intents'),
+    (5, 'slot_holds'),
+    (6, 'idempotency_keys'),
+    (7, 'rate_limits'),
+    (8, 'refresh_tokens'),
+    (9, 'venue_natural_key'),
+    (10, 'payment_refunds'),
+    (11, 'venue_day_locks');
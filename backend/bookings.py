@@ -0,0 +1,83 @@
+# bookings.py
+"""Booking/payment state machine.
+
+A booking is written once, in the state its payment outcome implies:
+
+    payment success -> booking confirmed, payment success
+    payment pending -> booking pending,   payment pending   (asynchronous providers)
+    payment failed  -> nothing is written
+
+Pending bookings hold their slot until settle_pending_booking() moves them
+to confirmed or cancelled. Every write keeps booking_daily_stats in step.
+"""
+from rollups import add_booking_stats, remove_booking_stats
+
+BOOKING_TRANSITIONS = {
+    'pending': {'confirmed', 'cancelled'},
+    'confirmed': {'cancelled'},
+    'cancelled': set(),
+}
+
+PAYMENT_OUTCOMES = {
+    'success': 'confirmed',
+    'pending': 'pending',
+    'failed': None,
+}
+
+class InvalidTransition(ValueError):
+    """Raised for a booking status change the state machine does not allow."""
+
+def booking_status_for_payment(payment_status):
+    """Booking status implied by a payment outcome, or None when nothing should be written."""
+    if payment_status not in PAYMENT_OUTCOMES:
+        raise ValueError(f'Unknown payment status: {payment_status}')
+    return PAYMENT_OUTCOMES[payment_status]
+
+def check_transition(current_status, new_status):
+    if new_status not in BOOKING_TRANSITIONS.get(current_status, ()):
+        raise InvalidTransition(f'Cannot move booking from {current_status} to {new_status}')
+
+def record_booking(cursor, user_id, venue_id, booking_date, start_time, end_time, amount, payment_status):
+    """Insert a booking and its payment in their final states.
+
+    Returns (booking_id, booking_status); booking_id is None when the payment
+    failed and nothing was written.
+    """
+    booking_status = booking_status_for_payment(payment_status)
+    if booking_status is None:
+        return None, None
+
+    cursor.execute(
+        'INSERT INTO bookings (user_id, venue_id, booking_date, start_time, end_time, status) VALUES (%s, %s, %s, %s, %s, %s)',
+        (user_id, venue_id, booking_date, start_time, end_time, booking_status)
+    )
+    booking_id = cursor.lastrowid
+    cursor.execute(
+        'INSERT INTO payments (booking_id, amount, status) VALUES (%s, %s, %s)',
+        (booking_id, amount, payment_status)
+    )
+    add_booking_stats(cursor, [booking_id])
+    return booking_id, booking_status
+
+def settle_pending_booking(cursor, booking_id, payment_status):
+    """Finalize a pending booking once its asynchronous payment resolves.
+
+    Returns the new booking status, or None if the booking was no longer pending.
+    """
+    new_status = booking_status_for_payment(payment_status) or 'cancelled'
+    check_transition('pending', new_status)
+
+    remove_booking_stats(cursor, [booking_id])
+    cursor.execute(
+        "UPDATE bookings SET status = %s WHERE id = %s AND status = 'pending'",
+        (new_status, booking_id)
+    )
+    if cursor.rowcount == 0:
+        add_booking_stats(cursor, [booking_id])
+        return None
+    cursor.execute(
+        "UPDATE payments SET status = %s WHERE booking_id = %s AND status = 'pending'",
+        (payment_status, booking_id)
+    )
+    add_booking_stats(cursor, [booking_id])
+    return new_status
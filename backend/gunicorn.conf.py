@@ -0,0 +1,70 @@
+# gunicorn.conf.py
+"""Pre-fork server settings: gunicorn -c gunicorn.conf.py wsgi:app (from backend/).
+
+With WEB_PRELOAD (the default) the master imports the app once and runs
+warm_up() before forking, so every worker starts with the availability
+index, venue catalog and compiled code already in memory. The master's
+database connections are closed before the fork; each worker then opens
+its own WEB_THREADS connections and starts its payment worker threads.
+
+Signals are gunicorn's: SIGHUP re-warms the master, starts new workers and
+drains the old ones; SIGTERM stops accepting and lets in-flight requests
+finish within WEB_GRACEFUL_TIMEOUT. A draining worker stops its payment
+threads after its last request, so a claimed intent is settled or its
+lease runs out as usual.
+"""
+from dotenv import load_dotenv
+import multiprocessing
+import os
+
+load_dotenv()
+
+bind = os.getenv('WEB_BIND', '0.0.0.0:5001')
+workers = int(os.getenv('WEB_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv('WEB_THREADS', 4))
+preload_app = os.getenv('WEB_PRELOAD', 'true').lower() == 'true'
+timeout = int(os.getenv('WEB_TIMEOUT', 30))
+graceful_timeout = int(os.getenv('WEB_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('WEB_KEEPALIVE', 5))
+# Recycle workers now and then; jitter keeps them from restarting together
+max_requests = int(os.getenv('WEB_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+
+def _warm_master(server):
+    from main import warm_up
+    from database import close_pools
+    warm_up(server.app.wsgi())
+    # Workers must not inherit the master's sockets
+    close_pools()
+
+def when_ready(server):
+    if server.cfg.preload_app:
+        _warm_master(server)
+
+def on_reload(server):
+    # SIGHUP: refresh the caches the replacement workers will inherit
+    if server.cfg.preload_app:
+        _warm_master(server)
+
+def post_worker_init(worker):
+    from main import warm_up
+    from payments import payment_workers
+    from maintenance import maintenance
+    if worker.cfg.preload_app:
+        from database import get_pool
+        try:
+            get_pool().prime(worker.cfg.threads)
+        except Exception as e:
+            worker.log.warning('Could not prime connection pool: %s', e)
+    else:
+        warm_up(worker.wsgi, pool_connections=worker.cfg.threads)
+    payment_workers.start()
+    maintenance.start()
+
+def worker_exit(server, worker):
+    from payments import payment_workers
+    from maintenance import maintenance
+    from database import close_pools
+    payment_workers.stop(timeout=worker.cfg.graceful_timeout)
+    maintenance.stop(timeout=worker.cfg.graceful_timeout)
+    close_pools()
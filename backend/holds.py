@@ -0,0 +1,243 @@
+# holds.py
+"""Short-lived slot holds.
+
+A hold reserves a venue's time range on one day for a few seconds, so a user
+can go through checkout without racing everybody else for the slot. Holds
+are stored in slot_holds and expanded into one slot_hold_units row per
+minute they cover. The primary key of slot_hold_units (venue_id,
+booking_date, minute) is what makes claims atomic across workers: a second
+claim on any minute of a held range fails its INSERT.
+
+Every writer of a venue's day (new holds, and bookings with or without a
+hold, batches included) first locks that day's venue_day_locks row with
+lock_venue_days(). Writers of one day are thereby serialized before any of
+them checks for overlaps, so bookings and holds can never overlap each
+other. A booking without a hold then only reads the live holds of the day
+(find_live_hold); it writes no unit rows. Waiters queue on one row lock
+instead of racing for per-minute rows, which is where InnoDB deadlocked;
+a deadlock or lock wait timeout that still happens is answered as a 409.
+
+Expired holds keep their units until somebody needs them; a conflicting
+claim deletes the expired holds of that venue and day and retries once.
+
+hold_index mirrors the holds taken through this worker. Like the
+availability index it only ever rejects: a request overlapping a live local
+hold is refused without touching the database.
+"""
+from dotenv import load_dotenv
+import threading
+import logging
+import time
+import os
+
+import pymysql
+
+from database import get_db_connection
+from availability import to_seconds, to_date_key
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+HOLD_SECONDS = int(os.getenv('HOLD_SECONDS', 60))
+HOLD_MAX_SECONDS = int(os.getenv('HOLD_MAX_SECONDS', 300))
+
+# ER_LOCK_DEADLOCK, ER_LOCK_WAIT_TIMEOUT
+LOCK_CONFLICT_ERRORS = (1213, 1205)
+
+class HoldError(Exception):
+    """A hold could not be taken or consumed; carries the HTTP status to answer with."""
+
+    def __init__(self, message, status=409):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+def unit_minutes(start_time, end_time):
+    """Minutes of the day touched by [start_time, end_time)."""
+    return range(to_seconds(start_time) // 60, -(-to_seconds(end_time) // 60))
+
+class SlotHoldIndex:
+    """Live holds taken through this worker, per (venue_id, booking_date)."""
+
+    def __init__(self):
+        self._days = {}
+        self._lock = threading.Lock()
+        self.rejections = 0
+
+    def _key(self, venue_id, booking_date):
+        return str(venue_id), to_date_key(booking_date)
+
+    def _live(self, key, now):
+        # Called with the lock held; drops expired holds as it goes
+        holds = [hold for hold in self._days.get(key, ()) if hold[3] > now]
+        if holds:
+            self._days[key] = holds
+        else:
+            self._days.pop(key, None)
+        return holds
+
+    def find_conflict(self, venue_id, booking_date, start_time, end_time, hold_id=None):
+        """Return (start, end) in seconds of a live hold overlapping the range, ignoring `hold_id`."""
+        start, end = to_seconds(start_time), to_seconds(end_time)
+        with self._lock:
+            for hold_start, hold_end, other_id, _ in self._live(self._key(venue_id, booking_date), time.monotonic()):
+                if other_id != hold_id and hold_start < end and hold_end > start:
+                    self.rejections += 1
+                    return hold_start, hold_end
+        return None
+
+    def claim(self, hold_id, venue_id, booking_date, start_time, end_time, ttl):
+        """Record a hold unless it overlaps a live one; returns the conflicting (start, end) or None."""
+        key = self._key(venue_id, booking_date)
+        start, end = to_seconds(start_time), to_seconds(end_time)
+        now = time.monotonic()
+        with self._lock:
+            holds = self._live(key, now)
+            for hold_start, hold_end, _, _ in holds:
+                if hold_start < end and hold_end > start:
+                    self.rejections += 1
+                    return hold_start, hold_end
+            self._days[key] = holds + [(start, end, hold_id, now + ttl)]
+        return None
+
+    def release(self, hold_id, venue_id, booking_date):
+        key = self._key(venue_id, booking_date)
+        with self._lock:
+            holds = [hold for hold in self._days.get(key, ()) if hold[2] != hold_id]
+            if holds:
+                self._days[key] = holds
+            else:
+                self._days.pop(key, None)
+
+hold_index = SlotHoldIndex()
+
+def lock_venue_days(cursor, days):
+    """Lock the (venue_id, booking_date) days a transaction is about to write, in a fixed order.
+
+    Call it first in the transaction: overlap checks made after it see every
+    booking and hold committed before. Raises HoldError (409) when MySQL
+    gives up on the lock with a deadlock or a lock wait timeout; the caller
+    rolls back.
+    """
+    days = sorted({(str(venue_id), to_date_key(booking_date)) for venue_id, booking_date in days})
+    try:
+        cursor.execute(
+            'INSERT INTO venue_day_locks (venue_id, booking_date) VALUES '
+            + ', '.join(['(%s, %s)'] * len(days))
+            + ' ON DUPLICATE KEY UPDATE venue_id = venue_id',
+            [value for day in days for value in day]
+        )
+    except pymysql.OperationalError as e:
+        if e.args[0] not in LOCK_CONFLICT_ERRORS:
+            raise
+        logger.warning("Venue day lock not granted: days=%s error=%s", days, e.args[0])
+        raise HoldError('This venue is being booked by someone else right now, please retry')
+
+def find_live_holds(cursor, days):
+    """Live holds on the given (venue_id, booking_date) days, for bookings made without a hold."""
+    days = list(days)
+    cursor.execute(
+        'SELECT id, venue_id, booking_date, start_time, end_time FROM slot_holds '
+        f"WHERE expires_at > NOW() AND ({' OR '.join(['(venue_id = %s AND booking_date = %s)'] * len(days))})",
+        [value for day in days for value in day]
+    )
+    return cursor.fetchall()
+
+def find_live_hold(cursor, venue_id, booking_date, start_time, end_time):
+    """The first live hold overlapping the range, or None."""
+    start, end = to_seconds(start_time), to_seconds(end_time)
+    for hold in find_live_holds(cursor, [(venue_id, booking_date)]):
+        if to_seconds(hold['start_time']) < end and to_seconds(hold['end_time']) > start:
+            return hold
+    return None
+
+def claim_units(cursor, venue_id, booking_date, start_time, end_time, hold_id):
+    """Insert the unit rows of a hold inside the caller's transaction. Returns False if any is taken."""
+    minutes = list(unit_minutes(start_time, end_time))
+    query = ('INSERT INTO slot_hold_units (venue_id, booking_date, minute, hold_id) VALUES '
+             + ', '.join(['(%s, %s, %s, %s)'] * len(minutes)))
+    params = [value for minute in minutes for value in (venue_id, booking_date, minute, hold_id)]
+    for retry in (False, True):
+        try:
+            cursor.execute(query, params)
+            return True
+        except pymysql.OperationalError as e:
+            # A deadlock rolls the whole transaction back; the caller has to give up too
+            if e.args[0] not in LOCK_CONFLICT_ERRORS:
+                raise
+            logger.warning("Hold units not granted: venue_id=%s booking_date=%s error=%s",
+                           venue_id, booking_date, e.args[0])
+            return False
+        except pymysql.IntegrityError:
+            # The failed INSERT is rolled back on its own; the transaction goes on
+            if retry:
+                return False
+            cursor.execute(
+                'DELETE FROM slot_holds WHERE venue_id = %s AND booking_date = %s AND expires_at <= NOW()',
+                (venue_id, booking_date)
+            )
+            if cursor.rowcount == 0:
+                return False
+    return False
+
+def create_hold(cursor, hold_id, user_id, venue_id, booking_date, start_time, end_time, ttl=HOLD_SECONDS):
+    """Write a hold inside the caller's transaction.
+
+    Raises HoldError when the range is held by someone else. Callers must
+    have locked the day with lock_venue_days() and check for overlapping
+    bookings after this returns.
+    """
+    try:
+        cursor.execute(
+            'INSERT INTO slot_holds (id, user_id, venue_id, booking_date, start_time, end_time, expires_at) '
+            'VALUES (%s, %s, %s, %s, %s, %s, NOW() + INTERVAL %s SECOND)',
+            (hold_id, user_id, venue_id, booking_date, start_time, end_time, ttl)
+        )
+    except pymysql.IntegrityError:
+        # Only the venue and user foreign keys can fail here
+        raise HoldError('Venue or user not found', 404)
+    if not claim_units(cursor, venue_id, booking_date, start_time, end_time, hold_id):
+        raise HoldError(f'Time slot {start_time}-{end_time} is currently held by another user')
+
+def consume_hold(cursor, hold_id, user_id, venue_id, booking_date, start_time, end_time):
+    """Check a hold matches the booking being made and delete it in the caller's transaction.
+
+    Raises HoldError when it does not exist, belongs to someone else, covers
+    a different slot or has expired.
+    """
+    cursor.execute(
+        'SELECT user_id, venue_id, booking_date, start_time, end_time, expires_at > NOW() AS live '
+        'FROM slot_holds WHERE id = %s FOR UPDATE',
+        (hold_id,)
+    )
+    hold = cursor.fetchone()
+    if not hold or str(hold['user_id']) != str(user_id):
+        raise HoldError('Hold not found', 404)
+    if (str(hold['venue_id']) != str(venue_id) or to_date_key(hold['booking_date']) != to_date_key(booking_date)
+            or to_seconds(hold['start_time']) != to_seconds(start_time)
+            or to_seconds(hold['end_time']) != to_seconds(end_time)):
+        raise HoldError('Hold does not cover this venue, date and time slot', 400)
+    if not hold['live']:
+        raise HoldError('Hold has expired', 410)
+    # Units go with it (ON DELETE CASCADE); the day lock keeps the range ours until commit
+    cursor.execute('DELETE FROM slot_holds WHERE id = %s', (hold_id,))
+
+def purge_expired_holds(limit=1000):
+    """Delete expired holds (and their units) nobody has needed since, and past days' locks. Returns how many."""
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute('DELETE FROM slot_holds WHERE expires_at <= NOW() LIMIT %s', (limit,))
+        purged = cursor.rowcount
+        cursor.execute('DELETE FROM venue_day_locks WHERE booking_date < CURDATE() LIMIT %s', (limit,))
+        purged += cursor.rowcount
+        conn.commit()
+        return purged
+
+def delete_hold(cursor, hold_id, user_id):
+    """Release a hold early. Returns its (venue_id, booking_date), or None if it is not the user's."""
+    cursor.execute('SELECT venue_id, booking_date FROM slot_holds WHERE id = %s AND user_id = %s', (hold_id, user_id))
+    hold = cursor.fetchone()
+    if hold:
+        cursor.execute('DELETE FROM slot_holds WHERE id = %s', (hold_id,))
+        return hold['venue_id'], hold['booking_date']
+    return None
@@ -0,0 +1,291 @@
+# idempotency.py
+"""Idempotency-Key support for retried POSTs.
+
+A client that may retry a request (a booking over flaky Wi-Fi, say) sends
+an Idempotency-Key header with a value unique to that operation. The first
+request with a key runs normally and its response (status, body, a few
+headers) is stored. Every later request with the same key and the same
+body gets that response back with `Idempotent-Replayed: true`, without
+running the handler again:
+
+    - from this worker's LRU cache when it is there, without any I/O;
+    - otherwise from the idempotency_keys table, one primary-key lookup.
+
+Keys are claimed with an INSERT on the table's primary key, so exactly one
+request per key runs the handler, across threads and workers. A duplicate
+that arrives while the first is still running waits for it (on an event
+in the same worker, by polling the row in another) for up to
+IDEMPOTENCY_WAIT_SECONDS, then answers 409 with Retry-After.
+
+Reusing a key with a different body is answered with 422. Responses with
+a 5xx status are not stored: the claim is dropped, so a retry runs the
+request again. Stored responses live for IDEMPOTENCY_TTL seconds; the
+maintenance loop (maintenance.py) purges expired rows.
+"""
+from collections import OrderedDict
+from functools import wraps
+from dotenv import load_dotenv
+import threading
+import hashlib
+import logging
+import json
+import time
+import os
+
+import pymysql
+from flask import Response, request, jsonify, make_response
+
+from database import get_db_connection
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_TTL = int(os.getenv('IDEMPOTENCY_TTL', 24 * 3600))
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv('IDEMPOTENCY_CACHE_SIZE', 10000))
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv('IDEMPOTENCY_WAIT_SECONDS', 10))
+# An unfinished claim older than this was left by a crashed worker and may be taken over
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv('IDEMPOTENCY_LOCK_SECONDS', 60))
+IDEMPOTENCY_POLL_INTERVAL = 0.05
+MAX_KEY_LENGTH = 255
+
+# Headers replayed along with the stored status and body
+STORED_HEADERS = ('Content-Type', 'Location')
+
+class StoredResponse:
+    __slots__ = ('fingerprint', 'status', 'body', 'headers', 'expires_at')
+
+    def __init__(self, fingerprint, status, body, headers, expires_at):
+        self.fingerprint = fingerprint
+        self.status = status
+        self.body = body
+        self.headers = headers
+        self.expires_at = expires_at
+
+    def to_response(self):
+        response = Response(self.body, status=self.status, headers=self.headers)
+        response.headers['Idempotent-Replayed'] = 'true'
+        return response
+
+class IdempotencyStore:
+    """Completed responses (LRU with TTL) and in-flight requests of this worker, per key."""
+
+    def __init__(self, max_size=IDEMPOTENCY_CACHE_SIZE, ttl=IDEMPOTENCY_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._done = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._stats = {'cache_hits': 0, 'db_hits': 0, 'waited': 0, 'executed': 0, 'conflicts': 0}
+
+    def get(self, key):
+        with self._lock:
+            stored = self._done.get(key)
+            if stored is None:
+                return None
+            if stored.expires_at <= time.time():
+                del self._done[key]
+                return None
+            self._done.move_to_end(key)
+            return stored
+
+    def put(self, key, stored):
+        with self._lock:
+            self._done[key] = stored
+            self._done.move_to_end(key)
+            while len(self._done) > self.max_size:
+                self._done.popitem(last=False)
+
+    def begin(self, key):
+        """Register this thread as running `key`. Returns None, or the Event of the thread already running it."""
+        with self._lock:
+            running = self._in_flight.get(key)
+            if running is not None:
+                return running
+            self._in_flight[key] = threading.Event()
+            return None
+
+    def finish(self, key):
+        with self._lock:
+            event = self._in_flight.pop(key, None)
+        if event is not None:
+            event.set()
+
+    def count(self, stat):
+        with self._lock:
+            self._stats[stat] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({'cached': len(self._done), 'in_flight': len(self._in_flight)})
+        return stats
+
+idempotency_store = IdempotencyStore()
+
+def request_fingerprint():
+    """Hash of what makes a retry the same request: method, path and JSON body."""
+    try:
+        body = json.dumps(request.get_json(silent=True), sort_keys=True, separators=(',', ':'), default=str)
+    except (TypeError, ValueError):
+        body = request.get_data(as_text=True)
+    return hashlib.sha256(f'{request.method} {request.path}\n{body}'.encode('utf-8')).hexdigest()
+
+def _claim(key, fingerprint):
+    """Insert the in-progress row for `key`. Returns None if claimed, else the existing row."""
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        for _ in range(2):
+            try:
+                cursor.execute(
+                    'INSERT INTO idempotency_keys (idempotency_key, fingerprint, expires_at) '
+                    'VALUES (%s, %s, NOW() + INTERVAL %s SECOND)',
+                    (key, fingerprint, IDEMPOTENCY_TTL)
+                )
+                conn.commit()
+                return None
+            except pymysql.IntegrityError:
+                conn.rollback()
+            row = _fetch(cursor, key)
+            if row is not None and not row['stale']:
+                return row
+            # Expired, abandoned or deleted in the meantime: take it over
+            cursor.execute(
+                'DELETE FROM idempotency_keys WHERE idempotency_key = %s AND (expires_at <= NOW() '
+                'OR (status_code IS NULL AND created_at <= NOW() - INTERVAL %s SECOND))',
+                (key, IDEMPOTENCY_LOCK_SECONDS)
+            )
+            conn.commit()
+        return _fetch(cursor, key)
+
+def _fetch(cursor, key):
+    cursor.execute(
+        'SELECT fingerprint, status_code, body, headers, UNIX_TIMESTAMP(expires_at) AS expires_at, '
+        '(expires_at <= NOW() OR (status_code IS NULL AND created_at <= NOW() - INTERVAL %s SECOND)) AS stale '
+        'FROM idempotency_keys WHERE idempotency_key = %s',
+        (IDEMPOTENCY_LOCK_SECONDS, key)
+    )
+    return cursor.fetchone()
+
+def _stored(row):
+    return StoredResponse(row['fingerprint'], row['status_code'], bytes(row['body']),
+                          json.loads(row['headers']), float(row['expires_at']))
+
+def _wait_for_row(key):
+    """Poll the row of a request running in another worker until it completes. Returns it, or None."""
+    deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        while time.monotonic() < deadline:
+            time.sleep(IDEMPOTENCY_POLL_INTERVAL)
+            row = _fetch(cursor, key)
+            conn.commit()
+            if row is None or row['status_code'] is not None:
+                return row
+    return None
+
+def _save(key, response):
+    headers = [(name, response.headers[name]) for name in STORED_HEADERS if name in response.headers]
+    body = response.get_data()
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(
+            'UPDATE idempotency_keys SET status_code = %s, body = %s, headers = %s WHERE idempotency_key = %s',
+            (response.status_code, body, json.dumps(headers), key)
+        )
+        conn.commit()
+    return headers, body
+
+def _release(key):
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute('DELETE FROM idempotency_keys WHERE idempotency_key = %s AND status_code IS NULL', (key,))
+        conn.commit()
+
+def _replay(stored, fingerprint):
+    if stored.fingerprint != fingerprint:
+        idempotency_store.count('conflicts')
+        return jsonify({'error': 'Idempotency-Key was already used for a different request'}), 422
+    return stored.to_response()
+
+def _in_progress():
+    response = jsonify({'error': 'A request with this Idempotency-Key is still in progress'})
+    response.headers['Retry-After'] = '1'
+    return response, 409
+
+def idempotent(f):
+    """Honour an Idempotency-Key header on a POST route (see the module docstring).
+
+    Keys are scoped to the route, so the same key may be used once per route.
+    """
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        client_key = request.headers.get('Idempotency-Key')
+        if client_key is None:
+            return f(*args, **kwargs)
+        if not client_key or len(client_key) > MAX_KEY_LENGTH:
+            return jsonify({'error': f'Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters'}), 400
+        key = hashlib.sha256(f'{request.endpoint}\n{client_key}'.encode('utf-8')).hexdigest()
+        fingerprint = request_fingerprint()
+
+        try:
+            stored = idempotency_store.get(key)
+            if stored is not None:
+                idempotency_store.count('cache_hits')
+                return _replay(stored, fingerprint)
+
+            running = idempotency_store.begin(key)
+            if running is not None:
+                # Same key already running in this worker: wait for its answer
+                idempotency_store.count('waited')
+                if not running.wait(IDEMPOTENCY_WAIT_SECONDS):
+                    return _in_progress()
+                stored = idempotency_store.get(key)
+                return _replay(stored, fingerprint) if stored else _in_progress()
+        except Exception as e:
+            logger.error("Idempotency cache error: %s", str(e))
+            return jsonify({'error': str(e)}), 500
+
+        try:
+            row = _claim(key, fingerprint)
+            if row is not None and row['status_code'] is None:
+                idempotency_store.count('waited')
+                row = _wait_for_row(key)
+                if row is None or row['status_code'] is None:
+                    return _in_progress()
+            if row is not None:
+                idempotency_store.count('db_hits')
+                stored = _stored(row)
+                idempotency_store.put(key, stored)
+                return _replay(stored, fingerprint)
+
+            idempotency_store.count('executed')
+            response = None
+            try:
+                response = f(*args, **kwargs)
+            finally:
+                response = _complete(key, fingerprint, response)
+            return response
+        except Exception as e:
+            logger.error("Idempotency store error: %s", str(e))
+            return jsonify({'error': str(e)}), 500
+        finally:
+            idempotency_store.finish(key)
+    return decorated
+
+def _complete(key, fingerprint, result):
+    """Store the handler's result under `key`, or drop the claim if it failed. Returns the response."""
+    if result is None:
+        _release(key)
+        return None
+    response = result if isinstance(result, Response) else make_response(result)
+    if response.status_code >= 500:
+        _release(key)
+        return response
+    headers, body = _save(key, response)
+    idempotency_store.put(key, StoredResponse(fingerprint, response.status_code, body, headers,
+                                              time.time() + IDEMPOTENCY_TTL))
+    return response
+
+def purge_expired_keys(limit=1000):
+    """Delete stored responses past their ttl. Returns how many."""
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute('DELETE FROM idempotency_keys WHERE expires_at <= NOW() LIMIT %s', (limit,))
+        conn.commit()
+        return cursor.rowcount
@@ -0,0 +1,341 @@
+# instrumentation.py
+"""Per-request timing, SQL metrics, Prometheus /metrics and an opt-in sampling profiler.
+
+init_app(app) wires everything in:
+
+- every statement run through database.TimedCursorMixin is timed and
+  counted per statement fingerprint, and added to the current request;
+- every response carries a Server-Timing header with DB time, query count,
+  JSON serialization time and total handler time;
+- GET /metrics renders the aggregated histograms in Prometheus text format;
+- requests picked by PROFILE_SAMPLE_RATE, or sent with `X-Profile: 1` when
+  PROFILE_HEADER_ENABLED is set, are sampled every PROFILE_INTERVAL_MS and,
+  when slower than PROFILE_SLOW_MS (always, for the header), written to
+  PROFILE_DIR as folded stacks for flamegraph.pl or speedscope.
+"""
+from collections import Counter
+from functools import lru_cache
+from datetime import datetime
+from flask import Response, g, has_request_context, request
+from dotenv import load_dotenv
+import threading
+import logging
+import random
+import time
+import sys
+import os
+import re
+
+from database import add_query_listener, pool_stats, replica_stats
+from idempotency import idempotency_store
+from passwords import password_hasher
+from payments import payment_workers
+from maintenance import maintenance
+from ratelimit import login_limiter
+from tokens import token_stats
+from routes.middleware import token_cache
+from serializers import FastJSONProvider
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+PROFILE_HEADER_ENABLED = os.getenv('PROFILE_HEADER_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+PROFILE_INTERVAL_MS = float(os.getenv('PROFILE_INTERVAL_MS', 5))
+PROFILE_SLOW_MS = float(os.getenv('PROFILE_SLOW_MS', 500))
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+
+# Fingerprints are label values; cap them so ad-hoc SQL cannot blow up /metrics
+MAX_FINGERPRINTS = 500
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 1000, 10000)
+
+class Histogram:
+    """Cumulative-bucket histogram with labels, rendered in Prometheus text format."""
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted((name, str(label)) for name, label in labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0, 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += 1
+            series[2] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = [(key, list(counts), count, total) for key, (counts, count, total) in self._series.items()]
+        for key, counts, count, total in sorted(series):
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{_labels(key, le=_number(bound))} {bucket_count}')
+            lines.append(f'{self.name}_bucket{_labels(key, le="+Inf")} {count}')
+            lines.append(f'{self.name}_sum{_labels(key)} {_number(total)}')
+            lines.append(f'{self.name}_count{_labels(key)} {count}')
+        return lines
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def _labels(key, **extra):
+    pairs = list(key) + list(extra.items())
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+REQUEST_DURATION = Histogram('http_request_duration_seconds', 'Time spent in request handlers.', LATENCY_BUCKETS)
+REQUEST_DB_TIME = Histogram('http_request_db_seconds', 'SQL time per request.', LATENCY_BUCKETS)
+REQUEST_QUERIES = Histogram('http_request_queries', 'SQL statements per request.', COUNT_BUCKETS)
+REQUEST_SERIALIZATION = Histogram('http_request_serialization_seconds', 'JSON serialization time per request.', LATENCY_BUCKETS)
+QUERY_DURATION = Histogram('db_query_duration_seconds', 'SQL statement latency by fingerprint.', LATENCY_BUCKETS)
+QUERY_ROWS = Histogram('db_query_rows', 'Rows returned or affected by fingerprint.', COUNT_BUCKETS)
+
+HISTOGRAMS = [REQUEST_DURATION, REQUEST_DB_TIME, REQUEST_QUERIES, REQUEST_SERIALIZATION, QUERY_DURATION, QUERY_ROWS]
+
+_fingerprints = set()
+_fingerprints_lock = threading.Lock()
+
+@lru_cache(maxsize=2048)
+def fingerprint(query):
+    """Normalize a statement template: placeholders and literals become ?, IN lists and VALUES rows collapse."""
+    text = ' '.join(query.split())
+    text = re.sub(r"'(?:[^'\\]|\\.)*'", '?', text)
+    text = re.sub(r'%s|\b\d+(?:\.\d+)?\b', '?', text)
+    text = re.sub(r'\?(?:\s*,\s*\?)+', '?+', text)
+    text = re.sub(r'\(\?\+?\)(?:\s*,\s*\(\?\+?\))+', '(...)+', text)
+    return text[:200]
+
+def _statement_label(query):
+    label = fingerprint(query)
+    with _fingerprints_lock:
+        if label not in _fingerprints:
+            if len(_fingerprints) >= MAX_FINGERPRINTS:
+                return 'other'
+            _fingerprints.add(label)
+    return label
+
+def on_query(query, elapsed, rows):
+    label = _statement_label(query if isinstance(query, str) else query.decode('utf-8', 'replace'))
+    QUERY_DURATION.observe(elapsed, statement=label)
+    if rows is not None:
+        QUERY_ROWS.observe(rows, statement=label)
+    if has_request_context():
+        timing = g.get('request_timing')
+        if timing is not None:
+            timing['db'] += elapsed
+            timing['queries'] += 1
+
+class TimedJSONProvider(FastJSONProvider):
+    """JSON provider that adds its encoding time to the current request."""
+
+    def dumps_bytes(self, obj, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().dumps_bytes(obj, **kwargs)
+        finally:
+            if has_request_context():
+                timing = g.get('request_timing')
+                if timing is not None:
+                    timing['serialization'] += time.perf_counter() - started
+
+class SamplingProfiler:
+    """Samples one thread's stack from a background thread into folded-stack counts."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if frames:
+                self.stacks[';'.join(reversed(frames))] += 1
+
+def dump_profile(stacks, endpoint, elapsed):
+    """Write folded stacks ("root;...;leaf count" per line). Returns the file path."""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    name = re.sub(r'[^A-Za-z0-9]+', '_', endpoint).strip('_') or 'root'
+    path = os.path.join(
+        PROFILE_DIR,
+        f'{datetime.now():%Y%m%dT%H%M%S%f}-{name}-{elapsed * 1000:.0f}ms.folded'
+    )
+    with open(path, 'w') as f:
+        for stack, count in stacks.most_common():
+            f.write(f'{stack} {count}\n')
+    return path
+
+def _should_profile():
+    if PROFILE_HEADER_ENABLED and request.headers.get('X-Profile') == '1':
+        return 'header'
+    if PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE:
+        return 'sampled'
+    return None
+
+def _endpoint():
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+def before_request():
+    g.request_timing = {'started': time.perf_counter(), 'db': 0.0, 'queries': 0, 'serialization': 0.0}
+    trigger = _should_profile()
+    if trigger:
+        g.request_profiler = (trigger, SamplingProfiler(threading.get_ident(), PROFILE_INTERVAL_MS / 1000).start())
+
+def after_request(response):
+    timing = g.pop('request_timing', None)
+    if timing is None:
+        return response
+    elapsed = time.perf_counter() - timing['started']
+    endpoint = _endpoint()
+
+    REQUEST_DURATION.observe(elapsed, method=request.method, endpoint=endpoint, status=response.status_code)
+    REQUEST_DB_TIME.observe(timing['db'], endpoint=endpoint)
+    REQUEST_QUERIES.observe(timing['queries'], endpoint=endpoint)
+    REQUEST_SERIALIZATION.observe(timing['serialization'], endpoint=endpoint)
+
+    response.headers.add(
+        'Server-Timing',
+        f'db;dur={timing["db"] * 1000:.2f};desc="{timing["queries"]} queries", '
+        f'ser;dur={timing["serialization"] * 1000:.2f}, '
+        f'app;dur={elapsed * 1000:.2f}'
+    )
+
+    profiling = g.pop('request_profiler', None)
+    if profiling:
+        trigger, profiler = profiling
+        stacks = profiler.stop()
+        if stacks and (trigger == 'header' or elapsed * 1000 >= PROFILE_SLOW_MS):
+            try:
+                path = dump_profile(stacks, f'{request.method} {endpoint}', elapsed)
+                logger.info("Profile for %s %s (%.0f ms) written to %s", request.method, endpoint, elapsed * 1000, path)
+            except OSError as e:
+                logger.error("Could not write profile: %s", str(e))
+    return response
+
+def teardown_request(exc):
+    # after_request is skipped when a handler raises; never leave a sampler running
+    profiling = g.pop('request_profiler', None)
+    if profiling:
+        profiling[1].stop()
+
+def render_metrics():
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines += histogram.render()
+    stats = pool_stats()
+    lines += ['# HELP db_pool_connections Connections in the database pool by state.', '# TYPE db_pool_connections gauge']
+    for state in ('size', 'idle', 'in_use'):
+        lines.append(f'db_pool_connections{_labels((), state=state)} {stats[state]}')
+    for counter in ('checkouts', 'timeouts', 'created', 'discarded'):
+        lines += [f'# TYPE db_pool_{counter}_total counter', f'db_pool_{counter}_total {stats[counter]}']
+    hashing = password_hasher.stats()
+    lines += ['# HELP password_pool_operations Bcrypt operations by state.', '# TYPE password_pool_operations gauge']
+    for state in ('in_flight', 'queue_depth'):
+        lines.append(f'password_pool_operations{_labels((), state=state)} {hashing[state]}')
+    lines += ['# TYPE password_pool_workers gauge', f'password_pool_workers {hashing["workers"]}']
+    for counter in ('completed', 'rejected', 'timeouts', 'rehashed'):
+        lines += [f'# TYPE password_pool_{counter}_total counter', f'password_pool_{counter}_total {hashing[counter]}']
+    lines += ['# HELP password_pool_wait_seconds_total Time operations spent queued for a bcrypt thread.',
+              '# TYPE password_pool_wait_seconds_total counter',
+              f'password_pool_wait_seconds_total {_number(hashing["wait_time_total"])}',
+              '# TYPE password_pool_run_seconds_total counter',
+              f'password_pool_run_seconds_total {_number(hashing["run_time_total"])}',
+              '# TYPE password_pool_run_seconds_max gauge',
+              f'password_pool_run_seconds_max {_number(hashing["run_time_max"])}']
+    limiter = login_limiter.stats()
+    lines += ['# HELP login_attempts_total Login attempts by rate limiter decision.', '# TYPE login_attempts_total counter']
+    for result in ('allowed', 'limited_ip', 'locked_ip', 'locked_email'):
+        lines.append(f'login_attempts_total{_labels((), result=result)} {limiter[result]}')
+    lines += ['# TYPE login_failures_total counter', f'login_failures_total {limiter["failures"]}',
+              '# TYPE login_lockouts_total counter', f'login_lockouts_total {limiter["lockouts"]}',
+              '# HELP login_rejected_ratio Share of login attempts rejected by the rate limiter.',
+              '# TYPE login_rejected_ratio gauge', f'login_rejected_ratio {_number(limiter["rejected_rate"])}']
+    tokens = token_cache.stats()
+    lines += ['# HELP auth_token_cache_entries Verified access tokens cached in this worker.',
+              '# TYPE auth_token_cache_entries gauge', f'auth_token_cache_entries {tokens["size"]}',
+              '# HELP auth_token_revoked_users Users whose earlier tokens this worker rejects.',
+              '# TYPE auth_token_revoked_users gauge', f'auth_token_revoked_users {tokens["revoked_users"]}']
+    for counter in ('hits', 'misses', 'revocations'):
+        lines += [f'# TYPE auth_token_cache_{counter}_total counter', f'auth_token_cache_{counter}_total {tokens[counter]}']
+    refresh = token_stats()
+    lines += ['# HELP refresh_tokens_total Refresh tokens issued at login, rotated, and rejected.',
+              '# TYPE refresh_tokens_total counter']
+    for result in ('issued', 'rotated', 'rejected'):
+        lines.append(f'refresh_tokens_total{_labels((), result=result)} {refresh[result]}')
+    lines += ['# HELP refresh_token_reuse_total Rotated refresh tokens presented again; each revokes its family.',
+              '# TYPE refresh_token_reuse_total counter', f'refresh_token_reuse_total {refresh["reuse_detected"]}']
+    idempotency = idempotency_store.stats()
+    for counter in ('cache_hits', 'db_hits', 'waited', 'executed', 'conflicts'):
+        lines += [f'# TYPE idempotency_{counter}_total counter', f'idempotency_{counter}_total {idempotency[counter]}']
+    payments = payment_workers.stats()
+    lines += ['# TYPE payment_workers gauge', f'payment_workers {payments["workers"]}',
+              '# TYPE payment_intents_claimed_total counter', f'payment_intents_claimed_total {payments["claimed"]}',
+              '# HELP payment_intents_total Outcomes of the payment attempts made by this process\'s workers.',
+              '# TYPE payment_intents_total counter']
+    for result in ('succeeded', 'failed', 'retried', 'expired', 'lost_leases', 'orphaned_charges'):
+        lines.append(f'payment_intents_total{_labels((), result=result)} {payments[result]}')
+    lines += ['# HELP payment_refunds_total Orphaned charges refunded, and refunds given up on.',
+              '# TYPE payment_refunds_total counter',
+              f'payment_refunds_total{_labels((), result="refunded")} {payments["refunded"]}',
+              f'payment_refunds_total{_labels((), result="failed")} {payments["refund_failures"]}',
+              '# TYPE payment_gateway_seconds_total counter',
+              f'payment_gateway_seconds_total {_number(payments["gateway_time_total"])}']
+    cleanup = maintenance.stats()
+    lines += ['# TYPE maintenance_runs_total counter', f'maintenance_runs_total {cleanup["runs"]}',
+              '# HELP maintenance_purged_total Expired rows and counters deleted by the maintenance loop.',
+              '# TYPE maintenance_purged_total counter']
+    for task, purged in cleanup['purged'].items():
+        lines.append(f'maintenance_purged_total{_labels((), task=task)} {purged}')
+    lines.append('# TYPE maintenance_errors_total counter')
+    for task, errors in cleanup['errors'].items():
+        lines.append(f'maintenance_errors_total{_labels((), task=task)} {errors}')
+    replicas = replica_stats()
+    if replicas:
+        lines += ['# HELP db_replica_lag_seconds Last measured replication lag; -1 when unknown or unreachable.',
+                  '# TYPE db_replica_lag_seconds gauge']
+        for name, replica in replicas['replicas'].items():
+            lag = -1 if replica['lag'] is None else replica['lag']
+            lines.append(f'db_replica_lag_seconds{_labels((), replica=name)} {lag}')
+        for counter in ('reads', 'fallbacks'):
+            lines += [f'# TYPE db_replica_{counter}_total counter', f'db_replica_{counter}_total {replicas[counter]}']
+    return '\n'.join(lines) + '\n'
+
+def metrics():
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+def init_app(app):
+    app.json = TimedJSONProvider(app)
+    add_query_listener(on_query)
+    app.before_request(before_request)
+    app.after_request(after_request)
+    app.teardown_request(teardown_request)
+    app.add_url_rule('/metrics', 'metrics', metrics)
@@ -1,38 +1,91 @@
 # main.py
+"""App factory and the development server.
+
+    python main.py                             development server on :5001
+    gunicorn -c gunicorn.conf.py wsgi:app      production, see gunicorn.conf.py
+
+Nothing here runs on import: create_app() builds an app, configure_logging()
+and warm_up() are called by whichever entry point starts serving.
+"""
 from flask import Flask
 from flask_cors import CORS
-from database import get_db_connection
+from database import get_db_connection, get_pool, pool_stats
+from availability import availability_index
+from payments import payment_workers
+from maintenance import maintenance
+from venue_cache import venue_catalog
 from routes.auth import auth_bp
 from routes.user import user_bp
 from routes.admin import admin_bp
+import instrumentation
+import logging
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+CORS_ORIGIN = 'http://localhost:3000'
+
+def configure_logging():
+    logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO').upper())
+
+def create_app():
+    app = Flask(__name__)
+    CORS(app, resources={r"/api/*": {"origins": CORS_ORIGIN}}, expose_headers=['Server-Timing'])
+    instrumentation.init_app(app)
 
-app = Flask(__name__)
-CORS(app, resources={r"/api/*": {"origins": "http://localhost:3000"}})
-
-# Register blueprints for routes
-app.register_blueprint(auth_bp, url_prefix='/api')
-app.register_blueprint(user_bp, url_prefix='/api')
-app.register_blueprint(admin_bp, url_prefix='/api')
-
-# Test database connection
-@app.route('/test-db')
-def test_db():
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT 1')
-        result = cursor.fetchone()
-        cursor.close()
-        conn.close()
-        return {'status': 'Database connection successful', 'result': result}
-    except Exception as e:
-        return {'status': 'Database connection failed', 'error': str(e)}
-    
-   
-@app.route('/')
-def home():
-    return {'message': 'Welcome to the Event Booking API'}
+    # Register blueprints for routes
+    app.register_blueprint(auth_bp, url_prefix='/api')
+    app.register_blueprint(user_bp, url_prefix='/api')
+    app.register_blueprint(admin_bp, url_prefix='/api')
+
+    # Test database connection
+    @app.route('/test-db')
+    def test_db():
+        try:
+            with get_db_connection() as conn, conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+                result = cursor.fetchone()
+            return {'status': 'Database connection successful', 'result': result, 'pool': pool_stats()}
+        except Exception as e:
+            return {'status': 'Database connection failed', 'error': str(e)}
+
+    @app.route('/')
+    def home():
+        return {'message': 'Welcome to the Event Booking API'}
+
+    return app
+
+def warm_up(app, pool_connections=0):
+    """Fill the per-process caches before the first request. Returns seconds spent.
+
+    Loads the availability index and the venue catalog, runs one request
+    through every layer (routing, middleware, JSON provider) and opens
+    `pool_connections` database connections. Failures are logged, not
+    raised: a cold cache only costs the first requests some latency.
+    """
+    started = time.perf_counter()
+    steps = [
+        ('availability index', availability_index.warm),
+        ('venue catalog', venue_catalog.get),
+        ('request path', lambda: app.test_client().get('/')),
+    ]
+    if pool_connections:
+        steps.append(('connection pool', lambda: get_pool().prime(pool_connections)))
+    for name, step in steps:
+        try:
+            step()
+        except Exception as e:
+            logger.warning('Could not warm %s: %s', name, e)
+    elapsed = time.perf_counter() - started
+    logger.info("Warm-up finished in %.0f ms", elapsed * 1000)
+    return elapsed
 
 if __name__ == '__main__':
+    configure_logging()
+    app = create_app()
+    warm_up(app)
+    # Set PAYMENT_WORKERS=0 when payments are drained by `python payments.py work` instead
+    payment_workers.start()
+    maintenance.start()
     app.run(debug=True, port=5001)
-
@@ -0,0 +1,124 @@
+# maintenance.py
+"""Periodic cleanup of expired rows and counters.
+
+A single thread per process runs every task in TASKS once every
+MAINTENANCE_INTERVAL seconds, whether or not this process also runs
+payment workers:
+
+    slot_holds          expired holds and past days' locks (holds.py)
+    idempotency_keys    stored responses past their ttl (idempotency.py)
+    login_rate_limits   stale counters and lockouts (ratelimit.py)
+    refresh_tokens      refresh tokens past their expiry (tokens.py)
+
+Every task deletes a bounded batch and is safe to run from several
+processes at once. A failing task is logged and does not stop the others.
+Set MAINTENANCE_INTERVAL=0 to run none in the server, e.g. when
+`python maintenance.py run` does it in a separate process.
+
+Usage (from backend/):
+    python maintenance.py run    # run the loop in the foreground
+    python maintenance.py once   # run every task once
+"""
+from dotenv import load_dotenv
+import threading
+import logging
+import time
+import sys
+import os
+
+from holds import purge_expired_holds
+from idempotency import purge_expired_keys
+from ratelimit import login_limiter
+from tokens import purge_expired_refresh_tokens
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+MAINTENANCE_INTERVAL = float(os.getenv('MAINTENANCE_INTERVAL', 30))
+
+TASKS = (
+    ('slot_holds', purge_expired_holds),
+    ('idempotency_keys', purge_expired_keys),
+    ('login_rate_limits', login_limiter.purge),
+    ('refresh_tokens', purge_expired_refresh_tokens),
+)
+
+class MaintenanceLoop:
+    """A background thread that runs the purge tasks every `interval` seconds."""
+
+    def __init__(self, interval=MAINTENANCE_INTERVAL, tasks=TASKS):
+        self.interval = interval
+        self.tasks = tasks
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._stats = {'runs': 0, 'purged': {name: 0 for name, _ in tasks}, 'errors': {name: 0 for name, _ in tasks}}
+
+    def start(self):
+        """Start the thread (no-op when already running or interval is 0)."""
+        if self._thread or self.interval <= 0:
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='maintenance', daemon=True)
+        self._thread.start()
+        logger.info("Maintenance loop started: interval=%ss", self.interval)
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def run_once(self):
+        """Run every task once. Returns {task: rows purged}, None for a task that failed."""
+        results = {}
+        for name, task in self.tasks:
+            try:
+                results[name] = task() or 0
+            except Exception as e:
+                results[name] = None
+                logger.error("Maintenance task %s failed: %s", name, str(e))
+        with self._lock:
+            self._stats['runs'] += 1
+            for name, purged in results.items():
+                if purged is None:
+                    self._stats['errors'][name] += 1
+                else:
+                    self._stats['purged'][name] += purged
+        return results
+
+    def stats(self):
+        with self._lock:
+            return {'runs': self._stats['runs'], 'purged': dict(self._stats['purged']),
+                    'errors': dict(self._stats['errors']), 'running': self._thread is not None}
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.run_once()
+            self._stop.wait(self.interval)
+
+maintenance = MaintenanceLoop()
+
+def main(argv):
+    if len(argv) != 2 or argv[1] not in ('run', 'once'):
+        print(__doc__)
+        return 2
+    logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO').upper())
+    if argv[1] == 'once':
+        for name, purged in maintenance.run_once().items():
+            print(f'{name}: {"failed" if purged is None else purged}')
+        return 0
+    if maintenance.interval <= 0:
+        maintenance.interval = 30
+    maintenance.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        maintenance.stop()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,138 @@
+# migrate.py
+"""Versioned schema migrations.
+
+Migrations live in migrations/NNNN_name.py and define up(cursor) and
+down(cursor). Applied versions are recorded in the schema_version table.
+
+Usage (from backend/):
+    python migrate.py status
+    python migrate.py up [version]     # apply pending migrations, up to version
+    python migrate.py down [version]   # revert to version (default: the previous one)
+
+MySQL commits DDL implicitly, so a migration that fails halfway is not
+rolled back; each step is written to be safe to re-run.
+"""
+import importlib
+import logging
+import os
+import re
+import sys
+
+from database import connect
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+def discover():
+    """All migrations as a sorted list of (version, name, module)."""
+    migrations = []
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        match = re.match(r'^(\d{4})_(\w+)\.py$', filename)
+        if match:
+            module = importlib.import_module(f'migrations.{filename[:-3]}')
+            migrations.append((int(match.group(1)), match.group(2), module))
+    return migrations
+
+def ensure_version_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INT PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+def applied_versions(cursor):
+    cursor.execute('SELECT version FROM schema_version ORDER BY version')
+    return [row['version'] for row in cursor.fetchall()]
+
+def index_exists(cursor, table, name):
+    cursor.execute(
+        'SELECT 1 FROM information_schema.statistics '
+        'WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s LIMIT 1',
+        (table, name)
+    )
+    return cursor.fetchone() is not None
+
+def has_index_on(cursor, table, columns):
+    """True if some index on `table` starts with exactly these columns."""
+    cursor.execute(
+        'SELECT index_name AS index_name, column_name AS column_name FROM information_schema.statistics '
+        'WHERE table_schema = DATABASE() AND table_name = %s ORDER BY index_name, seq_in_index',
+        (table,)
+    )
+    indexes = {}
+    for row in cursor.fetchall():
+        indexes.setdefault(row['index_name'], []).append(row['column_name'])
+    return any(index_columns[:len(columns)] == list(columns) for index_columns in indexes.values())
+
+def create_index(cursor, table, name, columns):
+    if not index_exists(cursor, table, name):
+        cursor.execute(f'CREATE INDEX {name} ON {table} ({", ".join(columns)})')
+
+def drop_index(cursor, table, name):
+    if index_exists(cursor, table, name):
+        cursor.execute(f'DROP INDEX {name} ON {table}')
+
+def migrate_up(conn, target=None):
+    """Apply pending migrations up to `target` (default: all). Returns the versions applied."""
+    done = []
+    with conn.cursor() as cursor:
+        ensure_version_table(cursor)
+        applied = set(applied_versions(cursor))
+        for version, name, module in discover():
+            if version in applied or (target is not None and version > target):
+                continue
+            logger.info("Applying migration %04d_%s", version, name)
+            module.up(cursor)
+            cursor.execute('INSERT INTO schema_version (version, name) VALUES (%s, %s)', (version, name))
+            conn.commit()
+            done.append(version)
+    return done
+
+def migrate_down(conn, target=None):
+    """Revert applied migrations above `target` (default: only the latest). Returns the versions reverted."""
+    done = []
+    with conn.cursor() as cursor:
+        ensure_version_table(cursor)
+        applied = applied_versions(cursor)
+        if not applied:
+            return done
+        if target is None:
+            target = applied[-2] if len(applied) > 1 else 0
+        for version, name, module in reversed(discover()):
+            if version not in applied or version <= target:
+                continue
+            logger.info("Reverting migration %04d_%s", version, name)
+            module.down(cursor)
+            cursor.execute('DELETE FROM schema_version WHERE version = %s', (version,))
+            conn.commit()
+            done.append(version)
+    return done
+
+def main(argv):
+    if len(argv) not in (2, 3) or argv[1] not in ('status', 'up', 'down') or (len(argv) == 3 and not argv[2].isdigit()):
+        print(__doc__)
+        return 2
+    target = int(argv[2]) if len(argv) == 3 else None
+
+    logging.basicConfig(level=logging.INFO)
+    conn = connect()
+    try:
+        if argv[1] == 'up':
+            print(f'Applied: {migrate_up(conn, target) or "nothing to do"}')
+        elif argv[1] == 'down':
+            print(f'Reverted: {migrate_down(conn, target) or "nothing to do"}')
+        else:
+            with conn.cursor() as cursor:
+                ensure_version_table(cursor)
+                applied = set(applied_versions(cursor))
+            for version, name, _ in discover():
+                print(f'{version:04d}_{name}: {"applied" if version in applied else "pending"}')
+        return 0
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,34 @@
+"""booking_daily_stats (see rollups.py) and cache_versions (see venue_cache.py)."""
+
+def up(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS booking_daily_stats (
+            venue_id INT NOT NULL,
+            stat_date DATE NOT NULL,
+            bookings_confirmed INT NOT NULL DEFAULT 0,
+            bookings_pending INT NOT NULL DEFAULT 0,
+            bookings_cancelled INT NOT NULL DEFAULT 0,
+            payments_success INT NOT NULL DEFAULT 0,
+            payments_failed INT NOT NULL DEFAULT 0,
+            payments_refunded INT NOT NULL DEFAULT 0,
+            payments_pending INT NOT NULL DEFAULT 0,
+            amount_success DECIMAL(14, 2) NOT NULL DEFAULT 0,
+            amount_failed DECIMAL(14, 2) NOT NULL DEFAULT 0,
+            amount_refunded DECIMAL(14, 2) NOT NULL DEFAULT 0,
+            amount_pending DECIMAL(14, 2) NOT NULL DEFAULT 0,
+            PRIMARY KEY (venue_id, stat_date),
+            INDEX idx_booking_daily_stats_date (stat_date),
+            FOREIGN KEY (venue_id) REFERENCES venues(id) ON DELETE CASCADE
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cache_versions (
+            name VARCHAR(64) PRIMARY KEY,
+            version BIGINT NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute("INSERT IGNORE INTO cache_versions (name, version) VALUES ('venues', 1)")
+
+def down(cursor):
+    cursor.execute('DROP TABLE IF EXISTS cache_versions')
+    cursor.execute('DROP TABLE IF EXISTS booking_daily_stats')
@@ -0,0 +1,36 @@
+"""Indexes behind the hot route queries.
+
+MySQL drops the implicit index it created for a foreign key once another
+index starts with the same column, so down() puts plain foreign key indexes
+back before removing the composite ones. idx_payments_booking is kept for
+the same reason.
+"""
+from migrate import create_index, drop_index, has_index_on
+
+INDEXES = [
+    # check_time_slot_overlap / availability: covers the whole overlap predicate
+    ('bookings', 'idx_bookings_overlap', ['venue_id', 'booking_date', 'status', 'start_time', 'end_time']),
+    # get_user_bookings: WHERE user_id = ? ORDER BY created_at DESC
+    ('bookings', 'idx_bookings_user_created', ['user_id', 'created_at']),
+    # /bookings/all keyset pagination and the created-date trend
+    ('bookings', 'idx_bookings_created', ['created_at']),
+    # admin.list_venues upcoming bookings aggregate
+    ('bookings', 'idx_bookings_venue_status_date', ['venue_id', 'status', 'booking_date']),
+    ('venues', 'idx_venues_name', ['name']),
+    ('venues', 'idx_venues_location', ['location']),
+    # Last-admin checks
+    ('users', 'idx_users_role', ['role']),
+]
+
+def up(cursor):
+    for table, name, columns in INDEXES:
+        create_index(cursor, table, name, columns)
+    # Every LEFT JOIN payments ON booking_id; the foreign key usually provides one already
+    if not has_index_on(cursor, 'payments', ['booking_id']):
+        create_index(cursor, 'payments', 'idx_payments_booking', ['booking_id'])
+
+def down(cursor):
+    create_index(cursor, 'bookings', 'user_id', ['user_id'])
+    create_index(cursor, 'bookings', 'venue_id', ['venue_id'])
+    for table, name, _ in reversed(INDEXES):
+        drop_index(cursor, table, name)
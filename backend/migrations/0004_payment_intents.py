@@ -0,0 +1,26 @@
+"""payment_intents: the outbox drained by the payment workers (see payments.py)."""
+
+def up(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS payment_intents (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            booking_id INT NOT NULL,
+            idempotency_key CHAR(36) NOT NULL,
+            amount DECIMAL(10, 2) NOT NULL,
+            status ENUM('queued', 'processing', 'succeeded', 'failed', 'expired') NOT NULL DEFAULT 'queued',
+            attempts INT NOT NULL DEFAULT 0,
+            next_attempt_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            expires_at DATETIME NOT NULL,
+            last_error VARCHAR(255) NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            UNIQUE KEY uq_payment_intents_booking (booking_id),
+            UNIQUE KEY uq_payment_intents_key (idempotency_key),
+            INDEX idx_payment_intents_due (status, next_attempt_at),
+            INDEX idx_payment_intents_expiry (status, expires_at),
+            FOREIGN KEY (booking_id) REFERENCES bookings(id) ON DELETE CASCADE
+        )
+    ''')
+
+def down(cursor):
+    cursor.execute('DROP TABLE IF EXISTS payment_intents')
@@ -0,0 +1,34 @@
+"""slot_holds and their per-minute slot_hold_units (see holds.py)."""
+
+def up(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS slot_holds (
+            id CHAR(36) PRIMARY KEY,
+            user_id INT NOT NULL,
+            venue_id INT NOT NULL,
+            booking_date DATE NOT NULL,
+            start_time TIME NOT NULL,
+            end_time TIME NOT NULL,
+            expires_at DATETIME NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_slot_holds_venue_day (venue_id, booking_date, expires_at),
+            INDEX idx_slot_holds_expiry (expires_at),
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+            FOREIGN KEY (venue_id) REFERENCES venues(id) ON DELETE CASCADE
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS slot_hold_units (
+            venue_id INT NOT NULL,
+            booking_date DATE NOT NULL,
+            minute SMALLINT NOT NULL,
+            hold_id CHAR(36) NULL,
+            PRIMARY KEY (venue_id, booking_date, minute),
+            INDEX idx_slot_hold_units_hold (hold_id),
+            FOREIGN KEY (hold_id) REFERENCES slot_holds(id) ON DELETE CASCADE
+        )
+    ''')
+
+def down(cursor):
+    cursor.execute('DROP TABLE IF EXISTS slot_hold_units')
+    cursor.execute('DROP TABLE IF EXISTS slot_holds')
@@ -0,0 +1,18 @@
+"""idempotency_keys: stored responses of POSTs sent with an Idempotency-Key (see idempotency.py)."""
+
+def up(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            idempotency_key CHAR(64) PRIMARY KEY,
+            fingerprint CHAR(64) NOT NULL,
+            status_code SMALLINT NULL,
+            body MEDIUMBLOB NULL,
+            headers TEXT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            expires_at DATETIME NOT NULL,
+            INDEX idx_idempotency_keys_expiry (expires_at)
+        )
+    ''')
+
+def down(cursor):
+    cursor.execute('DROP TABLE IF EXISTS idempotency_keys')
@@ -0,0 +1,25 @@
+"""rate_limit_counters and rate_limit_lockouts for RATE_LIMIT_BACKEND=sql (see ratelimit.py)."""
+
+def up(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS rate_limit_counters (
+            counter_key CHAR(64) NOT NULL,
+            window_start INT UNSIGNED NOT NULL,
+            hits INT UNSIGNED NOT NULL,
+            PRIMARY KEY (counter_key, window_start),
+            INDEX idx_rate_limit_counters_window (window_start)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS rate_limit_lockouts (
+            counter_key CHAR(64) PRIMARY KEY,
+            locked_until INT UNSIGNED NOT NULL,
+            level SMALLINT UNSIGNED NOT NULL,
+            updated_at INT UNSIGNED NOT NULL,
+            INDEX idx_rate_limit_lockouts_updated (updated_at)
+        )
+    ''')
+
+def down(cursor):
+    cursor.execute('DROP TABLE IF EXISTS rate_limit_lockouts')
+    cursor.execute('DROP TABLE IF EXISTS rate_limit_counters')
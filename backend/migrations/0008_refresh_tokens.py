@@ -0,0 +1,23 @@
+"""refresh_tokens: hashed, rotated refresh tokens grouped by login (see tokens.py)."""
+
+def up(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS refresh_tokens (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            token_hash CHAR(64) NOT NULL,
+            family_id CHAR(32) NOT NULL,
+            user_id INT NOT NULL,
+            expires_at DATETIME NOT NULL,
+            rotated_at DATETIME NULL,
+            revoked_at DATETIME NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE INDEX idx_refresh_tokens_hash (token_hash),
+            INDEX idx_refresh_tokens_family (family_id),
+            INDEX idx_refresh_tokens_user (user_id),
+            INDEX idx_refresh_tokens_expiry (expires_at),
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+    ''')
+
+def down(cursor):
+    cursor.execute('DROP TABLE IF EXISTS refresh_tokens')
@@ -0,0 +1,26 @@
+"""Unique (location, name) on venues, the key POST /admin/venues/bulk upserts on.
+
+up() refuses to run while venues share a location and name; rename or
+merge them first. The index also serves the location prefix search, which
+idx_venues_location covered until now, so that index is dropped.
+"""
+from migrate import index_exists, create_index, drop_index
+
+def up(cursor):
+    if not index_exists(cursor, 'venues', 'idx_venues_location_name'):
+        cursor.execute(
+            'SELECT location, name, COUNT(*) AS copies FROM venues '
+            'GROUP BY location, name HAVING COUNT(*) > 1 LIMIT 10'
+        )
+        duplicates = cursor.fetchall()
+        if duplicates:
+            raise RuntimeError(
+                'Venues share a location and name; rename or merge them first: '
+                + '; '.join(f"{row['location']} / {row['name']} ({row['copies']})" for row in duplicates)
+            )
+        cursor.execute('CREATE UNIQUE INDEX idx_venues_location_name ON venues (location, name)')
+    drop_index(cursor, 'venues', 'idx_venues_location')
+
+def down(cursor):
+    create_index(cursor, 'venues', 'idx_venues_location', ['location'])
+    drop_index(cursor, 'venues', 'idx_venues_location_name')
@@ -0,0 +1,23 @@
+"""payment_refunds: charges that succeeded after their booking was gone, queued for a refund (see payments.py)."""
+
+def up(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS payment_refunds (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            booking_id INT NOT NULL,
+            idempotency_key CHAR(36) NOT NULL,
+            amount DECIMAL(10, 2) NOT NULL,
+            reason VARCHAR(255) NOT NULL,
+            status ENUM('queued', 'processing', 'refunded', 'failed') NOT NULL DEFAULT 'queued',
+            attempts INT NOT NULL DEFAULT 0,
+            next_attempt_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            last_error VARCHAR(255) NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            UNIQUE KEY uq_payment_refunds_key (idempotency_key),
+            INDEX idx_payment_refunds_due (status, next_attempt_at)
+        )
+    ''')
+
+def down(cursor):
+    cursor.execute('DROP TABLE IF EXISTS payment_refunds')
@@ -0,0 +1,14 @@
+"""venue_day_locks: one row per venue and day, locked by every booking and hold written for it (see holds.py)."""
+
+def up(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS venue_day_locks (
+            venue_id INT NOT NULL,
+            booking_date DATE NOT NULL,
+            PRIMARY KEY (venue_id, booking_date),
+            INDEX idx_venue_day_locks_date (booking_date)
+        )
+    ''')
+
+def down(cursor):
+    cursor.execute('DROP TABLE IF EXISTS venue_day_locks')
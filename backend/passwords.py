@@ -0,0 +1,148 @@
+# passwords.py
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from dotenv import load_dotenv
+import threading
+import logging
+import time
+import os
+import bcrypt
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', 12))
+PASSWORD_POOL_SIZE = int(os.getenv('PASSWORD_POOL_SIZE', os.cpu_count() or 2))
+PASSWORD_QUEUE_LIMIT = int(os.getenv('PASSWORD_QUEUE_LIMIT', 64))
+# Seconds a request waits for its bcrypt call, queueing included
+PASSWORD_POOL_TIMEOUT = float(os.getenv('PASSWORD_POOL_TIMEOUT', 10))
+
+# Seconds a client is asked to wait before retrying a rejected password operation
+PASSWORD_RETRY_AFTER = 1
+
+class PasswordPoolBusy(Exception):
+    """Raised when too many password operations are already queued, or one timed out waiting."""
+
+def bcrypt_cost(hashed):
+    """Work factor of a bcrypt hash ('$2b$12$...' -> 12), or None if it cannot be parsed."""
+    try:
+        return int(hashed.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+class PasswordHasher:
+    """Runs bcrypt on a bounded thread pool.
+
+    bcrypt releases the GIL while hashing, so a few threads give real CPU
+    parallelism, and capping the pool stops a login storm from starving
+    every other request. Work beyond `queue_limit` outstanding operations is
+    rejected with PasswordPoolBusy instead of queueing without bound.
+    """
+
+    def __init__(self, workers=PASSWORD_POOL_SIZE, rounds=BCRYPT_ROUNDS,
+                 queue_limit=PASSWORD_QUEUE_LIMIT, timeout=PASSWORD_POOL_TIMEOUT):
+        self.workers = workers
+        self.rounds = rounds
+        self.queue_limit = queue_limit
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+        self._lock = threading.Lock()
+        self._outstanding = 0
+        self._running = 0
+        self._stats = {
+            'completed': 0,
+            'rejected': 0,
+            'timeouts': 0,
+            'rehashed': 0,
+            'wait_time_total': 0.0,
+            'run_time_total': 0.0,
+            'run_time_max': 0.0,
+        }
+
+    def hash(self, password):
+        return self._run(lambda: bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(self.rounds)).decode('utf-8'))
+
+    def verify(self, password, hashed):
+        return self._run(lambda: bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8')))
+
+    def needs_rehash(self, hashed):
+        return bcrypt_cost(hashed) != self.rounds
+
+    def rehash_in_background(self, password, on_done):
+        """Hash `password` at the current cost and hand the result to on_done(new_hash).
+
+        Skipped silently when the pool is saturated; the next login retries.
+        """
+        def task():
+            try:
+                on_done(bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(self.rounds)).decode('utf-8'))
+                with self._lock:
+                    self._stats['rehashed'] += 1
+            except Exception as e:
+                logger.error("Password rehash failed: %s", str(e))
+        try:
+            self._submit(task)
+        except PasswordPoolBusy:
+            pass
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                'workers': self.workers,
+                'rounds': self.rounds,
+                'in_flight': self._running,
+                'queue_depth': self._outstanding - self._running,
+            })
+        completed = stats['completed'] or 1
+        stats['wait_time_avg'] = stats['wait_time_total'] / completed
+        stats['run_time_avg'] = stats['run_time_total'] / completed
+        return stats
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+    def _run(self, fn):
+        future = self._submit(fn)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            # Still queued or running; drop it if it has not started
+            future.cancel()
+            with self._lock:
+                self._stats['timeouts'] += 1
+            raise PasswordPoolBusy('Password check timed out, please retry')
+
+    def _submit(self, fn):
+        with self._lock:
+            if self._outstanding >= self.queue_limit:
+                self._stats['rejected'] += 1
+                raise PasswordPoolBusy('Too many password operations in progress, please retry')
+            self._outstanding += 1
+        submitted = time.perf_counter()
+
+        def timed():
+            started = time.perf_counter()
+            with self._lock:
+                self._running += 1
+            try:
+                return fn()
+            finally:
+                finished = time.perf_counter()
+                with self._lock:
+                    self._running -= 1
+                    self._stats['completed'] += 1
+                    self._stats['wait_time_total'] += started - submitted
+                    self._stats['run_time_total'] += finished - started
+                    self._stats['run_time_max'] = max(self._stats['run_time_max'], finished - started)
+
+        def done(future):
+            # Also runs for a future cancelled before it started, which never calls timed()
+            with self._lock:
+                self._outstanding -= 1
+
+        future = self._executor.submit(timed)
+        future.add_done_callback(done)
+        return future
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,479 @@
+# payments.py
+"""Asynchronous payments through a durable outbox.
+
+create_booking commits a pending booking, its pending payment and a
+payment_intents row in one transaction and returns straight away. Worker
+threads then, outside any transaction that holds booking rows:
+
+    1. claim due intents (SELECT ... FOR UPDATE SKIP LOCKED, so any number of
+       workers in any number of processes can poll the same table),
+    2. charge them through the configured gateway,
+    3. settle the booking and payment and mark the intent done.
+
+A claimed intent is leased by pushing its next_attempt_at `lease` seconds
+ahead; if its worker dies, the intent becomes due again when the lease runs
+out. Each intent carries an idempotency key that is sent with every charge
+attempt, so a retried or re-claimed intent never charges twice. Gateway
+errors are retried with exponential backoff up to `max_attempts`; intents
+still unresolved `hold` seconds after booking are expired by the reaper and
+their booking is cancelled, which frees the slot. Other expired rows are
+purged by maintenance.py, not here.
+
+A charge can still succeed after its booking is gone: cancelled while the
+intent was queued for a retry, expired by the reaper once the lease ran
+out, or deleted with its user. Such a charge is recorded in
+payment_refunds and refunded through the gateway by the reaper, with the
+same backoff and max_attempts as charges; a refund that keeps failing is
+left in status 'failed' for someone to settle by hand.
+
+Usage (from backend/):
+    python payments.py work   # run a worker pool in the foreground
+    python payments.py reap   # expire overdue intents and refund orphaned charges once
+"""
+from collections import OrderedDict
+from dotenv import load_dotenv
+import importlib
+import threading
+import logging
+import random
+import uuid
+import time
+import sys
+import os
+
+from database import get_db_connection
+from bookings import settle_pending_booking
+from availability import availability_index
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+PAYMENT_GATEWAY = os.getenv('PAYMENT_GATEWAY', 'simulated')
+PAYMENT_WORKERS = int(os.getenv('PAYMENT_WORKERS', 2))
+PAYMENT_POLL_INTERVAL = float(os.getenv('PAYMENT_POLL_INTERVAL', 1))
+PAYMENT_BATCH_SIZE = int(os.getenv('PAYMENT_BATCH_SIZE', 10))
+PAYMENT_LEASE_SECONDS = int(os.getenv('PAYMENT_LEASE_SECONDS', 60))
+PAYMENT_MAX_ATTEMPTS = int(os.getenv('PAYMENT_MAX_ATTEMPTS', 5))
+PAYMENT_RETRY_BASE = float(os.getenv('PAYMENT_RETRY_BASE', 2))
+PAYMENT_RETRY_MAX = float(os.getenv('PAYMENT_RETRY_MAX', 300))
+PAYMENT_HOLD_SECONDS = int(os.getenv('PAYMENT_HOLD_SECONDS', 900))
+PAYMENT_REAP_INTERVAL = float(os.getenv('PAYMENT_REAP_INTERVAL', 30))
+PAYMENT_SIMULATED_SUCCESS_RATE = float(os.getenv('PAYMENT_SIMULATED_SUCCESS_RATE', 0.7))
+
+class GatewayUnavailable(Exception):
+    """Raised by a gateway for failures worth retrying (timeouts, 5xx, rate limits)."""
+
+class PaymentGateway:
+    """Interface of a payment provider.
+
+    charge() returns 'success' or 'failed' for a definitive outcome and
+    raises GatewayUnavailable when the attempt should be retried. The same
+    idempotency_key is passed on every attempt for one intent; providers
+    must return the original outcome for a key they have already seen.
+    """
+
+    def charge(self, amount, idempotency_key):
+        raise NotImplementedError
+
+    def refund(self, amount, idempotency_key):
+        """Refund the charge made with idempotency_key; refunding it twice must be a no-op."""
+        raise NotImplementedError
+
+class SimulatedGateway(PaymentGateway):
+    """Local stand-in for a real provider: succeeds with probability `success_rate`."""
+
+    def __init__(self, success_rate=PAYMENT_SIMULATED_SUCCESS_RATE, remember=10000):
+        self.success_rate = success_rate
+        self.remember = remember
+        self._outcomes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def charge(self, amount, idempotency_key):
+        with self._lock:
+            outcome = self._outcomes.get(idempotency_key)
+            if outcome is None:
+                outcome = 'success' if random.random() < self.success_rate else 'failed'
+                self._outcomes[idempotency_key] = outcome
+                if len(self._outcomes) > self.remember:
+                    self._outcomes.popitem(last=False)
+            return outcome
+
+    def refund(self, amount, idempotency_key):
+        with self._lock:
+            if self._outcomes.get(idempotency_key) == 'success':
+                self._outcomes[idempotency_key] = 'refunded'
+
+def load_gateway(spec=PAYMENT_GATEWAY):
+    """Build the gateway named by PAYMENT_GATEWAY: 'simulated' or 'package.module:ClassName'."""
+    if spec == 'simulated':
+        return SimulatedGateway()
+    module_name, _, class_name = spec.partition(':')
+    if not class_name:
+        raise ValueError(f"PAYMENT_GATEWAY must be 'simulated' or 'module:ClassName', got {spec!r}")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+def enqueue_payment(cursor, booking_id, amount, hold=PAYMENT_HOLD_SECONDS):
+    """Add a payment intent for a pending booking inside the caller's transaction.
+
+    Returns the intent's idempotency key.
+    """
+    idempotency_key = str(uuid.uuid4())
+    cursor.execute(
+        'INSERT INTO payment_intents (booking_id, idempotency_key, amount, expires_at) '
+        'VALUES (%s, %s, %s, NOW() + INTERVAL %s SECOND)',
+        (booking_id, idempotency_key, amount, hold)
+    )
+    return idempotency_key
+
+def cancel_payment_intent(cursor, booking_id, reason='Booking cancelled'):
+    """Stop an unresolved intent from being charged, inside the transaction that cancels its booking."""
+    cursor.execute(
+        "UPDATE payment_intents SET status = 'failed', last_error = %s "
+        "WHERE booking_id = %s AND status IN ('queued', 'processing')",
+        (reason, booking_id)
+    )
+
+def get_payment_status(cursor, booking_id, user_id):
+    """Booking, payment and intent state for the status endpoint, or None if not the user's booking."""
+    cursor.execute(
+        '''
+        SELECT b.id AS booking_id, b.status AS booking_status, p.status AS payment_status, p.amount,
+               i.status AS intent_status, i.attempts, i.last_error, i.next_attempt_at, i.expires_at, i.updated_at
+        FROM bookings b
+        LEFT JOIN payments p ON p.booking_id = b.id
+        LEFT JOIN payment_intents i ON i.booking_id = b.id
+        WHERE b.id = %s AND b.user_id = %s
+        ''',
+        (booking_id, user_id)
+    )
+    return cursor.fetchone()
+
+def retry_delay(attempts, base=PAYMENT_RETRY_BASE, cap=PAYMENT_RETRY_MAX):
+    """Seconds before attempt `attempts + 1`: capped exponential backoff with full jitter."""
+    return random.uniform(0, min(cap, base * 2 ** (attempts - 1)))
+
+class PaymentWorkerPool:
+    """Threads that drain payment_intents through a gateway.
+
+    Database connections are only held for the short claim and settle
+    transactions, never while the gateway is called.
+    """
+
+    def __init__(self, gateway=None, workers=PAYMENT_WORKERS, poll_interval=PAYMENT_POLL_INTERVAL,
+                 batch_size=PAYMENT_BATCH_SIZE, lease=PAYMENT_LEASE_SECONDS, max_attempts=PAYMENT_MAX_ATTEMPTS,
+                 reap_interval=PAYMENT_REAP_INTERVAL):
+        self.gateway = gateway or load_gateway()
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.reap_interval = reap_interval
+        self._threads = []
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._stats = {
+            'claimed': 0,
+            'succeeded': 0,
+            'failed': 0,
+            'retried': 0,
+            'expired': 0,
+            'lost_leases': 0,
+            'orphaned_charges': 0,
+            'refunded': 0,
+            'refund_failures': 0,
+            'gateway_time_total': 0.0,
+        }
+
+    def start(self):
+        """Start the worker threads (no-op when already running or workers is 0)."""
+        if self._threads or self.workers <= 0:
+            return self
+        self._stop.clear()
+        for n in range(self.workers):
+            thread = threading.Thread(target=self._run, args=(n == 0,), name=f'payment-worker-{n}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info("Payment workers started: workers=%s gateway=%s", self.workers, type(self.gateway).__name__)
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['workers'] = len(self._threads)
+        return stats
+
+    def run_once(self):
+        """Claim and process one batch of due intents. Returns how many were claimed."""
+        intents = self.claim()
+        for intent in intents:
+            self.process(intent)
+        return len(intents)
+
+    def claim(self):
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            conn.begin()
+            # Queued intents that are due, plus processing ones whose lease ran out
+            cursor.execute(
+                '''
+                SELECT id, booking_id, idempotency_key, amount, attempts FROM payment_intents
+                WHERE status IN ('queued', 'processing') AND next_attempt_at <= NOW() AND expires_at > NOW()
+                ORDER BY next_attempt_at
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+                ''',
+                (self.batch_size,)
+            )
+            intents = cursor.fetchall()
+            if intents:
+                cursor.execute(
+                    f"""
+                    UPDATE payment_intents
+                    SET status = 'processing', attempts = attempts + 1, next_attempt_at = NOW() + INTERVAL %s SECOND
+                    WHERE id IN ({', '.join(['%s'] * len(intents))})
+                    """,
+                    [self.lease] + [intent['id'] for intent in intents]
+                )
+            conn.commit()
+        for intent in intents:
+            # attempts doubles as the lease token checked when settling
+            intent['attempts'] += 1
+        with self._lock:
+            self._stats['claimed'] += len(intents)
+        return intents
+
+    def process(self, intent):
+        started = time.perf_counter()
+        try:
+            outcome = self.gateway.charge(intent['amount'], intent['idempotency_key'])
+            error = None
+        except GatewayUnavailable as e:
+            outcome, error = None, str(e) or type(e).__name__
+        except Exception as e:
+            logger.exception("Payment gateway error: intent_id=%s", intent['id'])
+            outcome, error = None, str(e) or type(e).__name__
+        with self._lock:
+            self._stats['gateway_time_total'] += time.perf_counter() - started
+
+        try:
+            if outcome is None and intent['attempts'] < self.max_attempts:
+                self._retry(intent, error)
+            else:
+                self._settle(intent, outcome or 'failed', error)
+        except Exception as e:
+            # The lease runs out and the intent is picked up again
+            logger.error("Could not record payment outcome: intent_id=%s error=%s", intent['id'], str(e))
+
+    def _retry(self, intent, error):
+        delay = retry_delay(intent['attempts'])
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute(
+                '''
+                UPDATE payment_intents
+                SET status = 'queued', next_attempt_at = NOW() + INTERVAL %s SECOND, last_error = %s
+                WHERE id = %s AND status = 'processing' AND attempts = %s
+                ''',
+                (round(delay, 3), error[:255], intent['id'], intent['attempts'])
+            )
+            conn.commit()
+            owned = cursor.rowcount == 1
+        with self._lock:
+            self._stats['retried' if owned else 'lost_leases'] += 1
+        logger.warning("Payment attempt failed, retrying in %.1fs: intent_id=%s attempt=%s error=%s",
+                       delay, intent['id'], intent['attempts'], error)
+
+    def _settle(self, intent, outcome, error=None):
+        intent_status = 'succeeded' if outcome == 'success' else 'failed'
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            conn.begin()
+            cursor.execute(
+                '''
+                SELECT b.venue_id, b.booking_date FROM payment_intents i
+                JOIN bookings b ON b.id = i.booking_id
+                WHERE i.id = %s AND i.status = 'processing' AND i.attempts = %s
+                FOR UPDATE
+                ''',
+                (intent['id'], intent['attempts'])
+            )
+            booking = cursor.fetchone()
+            if booking is None:
+                # Re-claimed after our lease expired, expired by the reaper, or the booking was cancelled or deleted
+                orphaned = outcome == 'success' and self._record_orphan(cursor, intent)
+                conn.commit()
+                with self._lock:
+                    self._stats['orphaned_charges' if orphaned else 'lost_leases'] += 1
+                if orphaned:
+                    logger.warning("Charge succeeded for a booking that is gone, refund queued: intent_id=%s booking_id=%s",
+                                   intent['id'], intent['booking_id'])
+                else:
+                    logger.warning("Payment lease lost before settling: intent_id=%s outcome=%s", intent['id'], outcome)
+                return
+            booking_status = settle_pending_booking(cursor, intent['booking_id'], outcome)
+            cursor.execute(
+                'UPDATE payment_intents SET status = %s, last_error = %s WHERE id = %s',
+                (intent_status, error[:255] if error else None, intent['id'])
+            )
+            conn.commit()
+        if booking_status == 'cancelled':
+            availability_index.remove(intent['booking_id'], booking['venue_id'], booking['booking_date'])
+        with self._lock:
+            self._stats[intent_status] += 1
+        logger.info("Payment settled: intent_id=%s booking_id=%s outcome=%s booking_status=%s",
+                    intent['id'], intent['booking_id'], outcome, booking_status)
+
+    def _record_orphan(self, cursor, intent):
+        """Queue a refund for a successful charge whose intent no longer wants it. Returns whether one was queued."""
+        cursor.execute('SELECT status FROM payment_intents WHERE id = %s', (intent['id'],))
+        current = cursor.fetchone()
+        if current is not None and current['status'] not in ('failed', 'expired'):
+            # Another worker holds the intent now; the same key gives it the same outcome to settle
+            return False
+        reason = 'Booking deleted' if current is None else f"Intent {current['status']} while charging"
+        cursor.execute(
+            'INSERT IGNORE INTO payment_refunds (booking_id, idempotency_key, amount, reason) VALUES (%s, %s, %s, %s)',
+            (intent['booking_id'], intent['idempotency_key'], intent['amount'], reason)
+        )
+        return cursor.rowcount == 1
+
+    def refund_orphans(self, limit=100):
+        """Refund queued orphaned charges through the gateway. Returns how many were refunded."""
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            conn.begin()
+            cursor.execute(
+                '''
+                SELECT id, idempotency_key, amount, attempts FROM payment_refunds
+                WHERE status IN ('queued', 'processing') AND next_attempt_at <= NOW()
+                ORDER BY next_attempt_at
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+                ''',
+                (limit,)
+            )
+            refunds = cursor.fetchall()
+            if refunds:
+                cursor.execute(
+                    f"""
+                    UPDATE payment_refunds
+                    SET status = 'processing', attempts = attempts + 1, next_attempt_at = NOW() + INTERVAL %s SECOND
+                    WHERE id IN ({', '.join(['%s'] * len(refunds))})
+                    """,
+                    [self.lease] + [refund['id'] for refund in refunds]
+                )
+            conn.commit()
+
+        refunded = 0
+        for refund in refunds:
+            attempts = refund['attempts'] + 1
+            try:
+                self.gateway.refund(refund['amount'], refund['idempotency_key'])
+                status, error, delay = 'refunded', None, 0
+            except Exception as e:
+                error = str(e) or type(e).__name__
+                status = 'queued' if attempts < self.max_attempts else 'failed'
+                delay = retry_delay(attempts)
+            with get_db_connection() as conn, conn.cursor() as cursor:
+                cursor.execute(
+                    '''
+                    UPDATE payment_refunds
+                    SET status = %s, last_error = %s, next_attempt_at = NOW() + INTERVAL %s SECOND
+                    WHERE id = %s AND status = 'processing' AND attempts = %s
+                    ''',
+                    (status, error[:255] if error else None, round(delay, 3), refund['id'], attempts)
+                )
+                conn.commit()
+            if status == 'refunded':
+                refunded += 1
+            elif status == 'failed':
+                with self._lock:
+                    self._stats['refund_failures'] += 1
+                logger.error("Refund of an orphaned charge failed for good: refund_id=%s error=%s", refund['id'], error)
+            else:
+                logger.warning("Refund attempt failed, retrying in %.1fs: refund_id=%s error=%s",
+                               delay, refund['id'], error)
+        if refunded:
+            with self._lock:
+                self._stats['refunded'] += refunded
+            logger.info("Refunded %s orphaned charges", refunded)
+        return refunded
+
+    def reap(self, limit=100):
+        """Expire unresolved intents past their hold and cancel their bookings. Returns how many."""
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            conn.begin()
+            # Skip intents whose lease is still running: their charge may be in flight
+            cursor.execute(
+                '''
+                SELECT i.id, i.booking_id, b.venue_id, b.booking_date FROM payment_intents i
+                JOIN bookings b ON b.id = i.booking_id
+                WHERE i.status IN ('queued', 'processing') AND i.expires_at <= NOW()
+                  AND (i.status = 'queued' OR i.next_attempt_at <= NOW())
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+                ''',
+                (limit,)
+            )
+            expired = cursor.fetchall()
+            for intent in expired:
+                settle_pending_booking(cursor, intent['booking_id'], 'failed')
+            if expired:
+                cursor.execute(
+                    f"""
+                    UPDATE payment_intents SET status = 'expired', last_error = 'Payment hold expired'
+                    WHERE id IN ({', '.join(['%s'] * len(expired))})
+                    """,
+                    [intent['id'] for intent in expired]
+                )
+            conn.commit()
+        for intent in expired:
+            availability_index.remove(intent['booking_id'], intent['venue_id'], intent['booking_date'])
+        if expired:
+            with self._lock:
+                self._stats['expired'] += len(expired)
+            logger.info("Expired %s payment holds", len(expired))
+        return len(expired)
+
+    def _run(self, reaper):
+        next_reap = time.monotonic()
+        while not self._stop.is_set():
+            claimed = 0
+            try:
+                if reaper and time.monotonic() >= next_reap:
+                    self.reap()
+                    self.refund_orphans()
+                    next_reap = time.monotonic() + self.reap_interval
+                claimed = self.run_once()
+            except Exception as e:
+                logger.error("Payment worker error: %s", str(e))
+            if not claimed:
+                self._stop.wait(self.poll_interval)
+
+payment_workers = PaymentWorkerPool()
+
+def main(argv):
+    if len(argv) != 2 or argv[1] not in ('work', 'reap'):
+        print(__doc__)
+        return 2
+    logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO').upper())
+    if argv[1] == 'reap':
+        print(f'Expired {payment_workers.reap()} payment holds')
+        print(f'Refunded {payment_workers.refund_orphans()} orphaned charges')
+        return 0
+    if payment_workers.workers <= 0:
+        payment_workers.workers = 1
+    payment_workers.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        payment_workers.stop()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,270 @@
+# ratelimit.py
+"""Sliding-window rate limiting and progressive lockout for login attempts.
+
+Counters are sliding-window counters: each key keeps a hit count for the
+current fixed window and the previous one, and the rate is estimated as
+
+    previous * (share of the previous window still inside the sliding window) + current
+
+which is within a few percent of an exact sliding log at two integers per
+key. LoginLimiter keeps two of them:
+
+    ip:<address>   every login attempt from the address, limited to
+                   LOGIN_IP_LIMIT per LOGIN_WINDOW seconds
+    email:<email>  failed attempts for the account, limited to
+                   LOGIN_EMAIL_LIMIT per LOGIN_WINDOW seconds
+
+A key that goes over its limit is locked out. Each lockout of the same key
+lasts twice as long as the one before (LOGIN_LOCKOUT_BASE seconds at
+first, at most LOGIN_LOCKOUT_MAX) until the key stays clean for
+LOGIN_LOCKOUT_RESET seconds; a successful login clears its email's record.
+check() runs before the users lookup and bcrypt, so rejected attempts cost
+neither.
+
+Counters live in a pluggable backend (RATE_LIMIT_BACKEND):
+
+    memory               per worker, no I/O
+    sql                  the rate_limit_counters / rate_limit_lockouts tables,
+                         shared by every worker and server
+    package.module:Class any class with the RateLimitBackend methods
+"""
+from dotenv import load_dotenv
+import importlib
+import threading
+import hashlib
+import logging
+import time
+import os
+
+from database import get_db_connection
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'memory')
+LOGIN_WINDOW = int(os.getenv('LOGIN_WINDOW', 60))
+LOGIN_IP_LIMIT = int(os.getenv('LOGIN_IP_LIMIT', 30))
+LOGIN_EMAIL_LIMIT = int(os.getenv('LOGIN_EMAIL_LIMIT', 5))
+LOGIN_LOCKOUT_BASE = int(os.getenv('LOGIN_LOCKOUT_BASE', 30))
+LOGIN_LOCKOUT_MAX = int(os.getenv('LOGIN_LOCKOUT_MAX', 3600))
+LOGIN_LOCKOUT_RESET = int(os.getenv('LOGIN_LOCKOUT_RESET', 24 * 3600))
+# Take the client address from X-Forwarded-For; only behind a proxy that sets it
+RATE_LIMIT_TRUST_FORWARDED = os.getenv('RATE_LIMIT_TRUST_FORWARDED', 'false').lower() == 'true'
+
+def sliding_count(previous, current, window, now):
+    """Estimated hits in the `window` seconds up to `now` from two fixed-window counts."""
+    elapsed = now % window
+    return previous * (window - elapsed) / window + current
+
+class RateLimitBackend:
+    """Storage for window counters and lockouts. All times are Unix seconds."""
+
+    def increment(self, key, window, now):
+        """Count a hit and return (previous_window_hits, current_window_hits) including it."""
+        raise NotImplementedError
+
+    def clear(self, key):
+        """Forget the key's counters and lockout record."""
+        raise NotImplementedError
+
+    def lockouts(self, keys):
+        """{key: (locked_until, level, updated_at)} of the last lockout of each key that has one."""
+        raise NotImplementedError
+
+    def set_lockout(self, key, locked_until, level, now):
+        raise NotImplementedError
+
+    def purge(self, now, max_window, max_age):
+        """Drop counters older than two windows and lockouts idle for max_age. Returns how many."""
+        return 0
+
+class MemoryBackend(RateLimitBackend):
+    """Counters and lockouts in this process."""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._counters = {}
+        self._lockouts = {}
+        self._lock = threading.Lock()
+
+    def increment(self, key, window, now):
+        start = int(now // window) * window
+        with self._lock:
+            counter = self._counters.get(key)
+            if counter is None or counter[0] != start:
+                previous = counter[3] if counter and counter[0] == start - window else 0
+                if len(self._counters) >= self.max_keys:
+                    self._prune(now, window)
+                counter = self._counters[key] = [start, window, previous, 0]
+            counter[3] += 1
+            return counter[2], counter[3]
+
+    def clear(self, key):
+        with self._lock:
+            self._counters.pop(key, None)
+            self._lockouts.pop(key, None)
+
+    def lockouts(self, keys):
+        with self._lock:
+            return {key: self._lockouts[key] for key in keys if key in self._lockouts}
+
+    def set_lockout(self, key, locked_until, level, now):
+        with self._lock:
+            self._lockouts[key] = (locked_until, level, now)
+
+    def purge(self, now, max_window, max_age):
+        with self._lock:
+            purged = self._prune(now, max_window)
+            for key in [k for k, (_, _, updated_at) in self._lockouts.items() if now - updated_at > max_age]:
+                del self._lockouts[key]
+                purged += 1
+        return purged
+
+    def _prune(self, now, window):
+        # Called with the lock held: counters whose windows both ended carry nothing
+        stale = [key for key, (start, key_window, _, _) in self._counters.items()
+                 if start + 2 * max(key_window, window) <= now]
+        for key in stale:
+            del self._counters[key]
+        return len(stale)
+
+class SQLBackend(RateLimitBackend):
+    """Counters and lockouts in MySQL, shared by every worker. Keys are stored hashed."""
+
+    @staticmethod
+    def _hash(key):
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    def increment(self, key, window, now):
+        start = int(now // window) * window
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO rate_limit_counters (counter_key, window_start, hits) VALUES (%s, %s, 1) '
+                'ON DUPLICATE KEY UPDATE hits = hits + 1',
+                (self._hash(key), start)
+            )
+            cursor.execute(
+                'SELECT window_start, hits FROM rate_limit_counters WHERE counter_key = %s AND window_start IN (%s, %s)',
+                (self._hash(key), start - window, start)
+            )
+            hits = {row['window_start']: row['hits'] for row in cursor.fetchall()}
+            conn.commit()
+        return hits.get(start - window, 0), hits.get(start, 0)
+
+    def clear(self, key):
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute('DELETE FROM rate_limit_counters WHERE counter_key = %s', (self._hash(key),))
+            cursor.execute('DELETE FROM rate_limit_lockouts WHERE counter_key = %s', (self._hash(key),))
+            conn.commit()
+
+    def lockouts(self, keys):
+        hashed = {self._hash(key): key for key in keys}
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute(
+                'SELECT counter_key, locked_until, level, updated_at FROM rate_limit_lockouts '
+                f'WHERE counter_key IN ({", ".join(["%s"] * len(hashed))})',
+                list(hashed)
+            )
+            return {hashed[row['counter_key']]: (row['locked_until'], row['level'], row['updated_at'])
+                    for row in cursor.fetchall()}
+
+    def set_lockout(self, key, locked_until, level, now):
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO rate_limit_lockouts (counter_key, locked_until, level, updated_at) VALUES (%s, %s, %s, %s) '
+                'ON DUPLICATE KEY UPDATE locked_until = VALUES(locked_until), level = VALUES(level), '
+                'updated_at = VALUES(updated_at)',
+                (self._hash(key), int(locked_until), level, int(now))
+            )
+            conn.commit()
+
+    def purge(self, now, max_window, max_age, limit=5000):
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute('DELETE FROM rate_limit_counters WHERE window_start < %s LIMIT %s',
+                           (int(now) - 2 * max_window, limit))
+            purged = cursor.rowcount
+            cursor.execute('DELETE FROM rate_limit_lockouts WHERE updated_at < %s LIMIT %s', (int(now) - max_age, limit))
+            purged += cursor.rowcount
+            conn.commit()
+        return purged
+
+def load_backend(spec=RATE_LIMIT_BACKEND):
+    """Build the backend named by RATE_LIMIT_BACKEND: 'memory', 'sql' or 'package.module:ClassName'."""
+    if spec == 'memory':
+        return MemoryBackend()
+    if spec == 'sql':
+        return SQLBackend()
+    module_name, _, class_name = spec.partition(':')
+    if not class_name:
+        raise ValueError(f"RATE_LIMIT_BACKEND must be 'memory', 'sql' or 'module:ClassName', got {spec!r}")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+class LoginLimiter:
+    """Per-address attempt limits and per-account failure limits with progressive lockout."""
+
+    def __init__(self, backend, window=LOGIN_WINDOW, ip_limit=LOGIN_IP_LIMIT, email_limit=LOGIN_EMAIL_LIMIT,
+                 lockout_base=LOGIN_LOCKOUT_BASE, lockout_max=LOGIN_LOCKOUT_MAX, lockout_reset=LOGIN_LOCKOUT_RESET):
+        self.backend = backend
+        self.window = window
+        self.ip_limit = ip_limit
+        self.email_limit = email_limit
+        self.lockout_base = lockout_base
+        self.lockout_max = lockout_max
+        self.lockout_reset = lockout_reset
+        self._lock = threading.Lock()
+        self._stats = {'checked': 0, 'allowed': 0, 'limited_ip': 0, 'locked_ip': 0, 'locked_email': 0,
+                       'failures': 0, 'lockouts': 0}
+
+    def check(self, ip, email):
+        """Count an attempt. Returns None if it may go ahead, else the seconds to wait."""
+        now = time.time()
+        ip_key, email_key = f'ip:{ip}', f'email:{email.strip().lower()}'
+        lockouts = self.backend.lockouts([email_key, ip_key])
+        for key, stat in ((email_key, 'locked_email'), (ip_key, 'locked_ip')):
+            if key in lockouts and lockouts[key][0] > now:
+                return self._count(stat, int(lockouts[key][0] - now) + 1)
+        if sliding_count(*self.backend.increment(ip_key, self.window, now), self.window, now) > self.ip_limit:
+            return self._count('limited_ip', self._trip(ip_key, now))
+        return self._count('allowed', None)
+
+    def failed(self, email):
+        """Record a failed password for `email`; locks the account out once it is over the limit."""
+        now = time.time()
+        key = f'email:{email.strip().lower()}'
+        self._count('failures', None)
+        if sliding_count(*self.backend.increment(key, self.window, now), self.window, now) >= self.email_limit:
+            self._trip(key, now)
+
+    def succeeded(self, email):
+        self.backend.clear(f'email:{email.strip().lower()}')
+
+    def purge(self):
+        return self.backend.purge(time.time(), self.window, self.lockout_reset)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        rejected = stats['limited_ip'] + stats['locked_ip'] + stats['locked_email']
+        stats['rejected_rate'] = rejected / stats['checked'] if stats['checked'] else 0.0
+        return stats
+
+    def _trip(self, key, now):
+        """Lock `key` out for twice as long as its previous lockout. Returns the lockout in seconds."""
+        previous = self.backend.lockouts([key]).get(key)
+        level = previous[1] + 1 if previous and now - previous[2] < self.lockout_reset else 1
+        duration = min(self.lockout_base * 2 ** (level - 1), self.lockout_max)
+        self.backend.set_lockout(key, now + duration, level, now)
+        with self._lock:
+            self._stats['lockouts'] += 1
+        logger.warning("Login lockout: key=%s level=%s seconds=%s", key.split(':', 1)[0], level, duration)
+        return duration
+
+    def _count(self, stat, result):
+        with self._lock:
+            self._stats[stat] += 1
+            if stat != 'failures':
+                self._stats['checked'] += 1
+        return result
+
+login_limiter = LoginLimiter(load_backend())
@@ -0,0 +1,125 @@
+# rollups.py
+"""Per-venue, per-day booking statistics maintained alongside the write paths.
+
+booking_daily_stats holds, for every (venue_id, day the booking was created),
+booking counts by status and payment counts/amounts by payment status.
+Write paths subtract a booking's contribution before changing it and add it
+back afterwards, inside the same transaction:
+
+    remove_booking_stats(cursor, [booking_id])
+    ... UPDATE bookings / payments ...
+    add_booking_stats(cursor, [booking_id])
+
+Usage (from backend/):
+    python rollups.py rebuild   # recompute every row from bookings/payments
+    python rollups.py check     # compare rollups with the base tables
+"""
+import sys
+
+from database import get_db_connection
+
+BOOKING_STATUSES = ('confirmed', 'pending', 'cancelled')
+PAYMENT_STATUSES = ('success', 'failed', 'refunded', 'pending')
+
+STAT_COLUMNS = (
+    [f'bookings_{status}' for status in BOOKING_STATUSES]
+    + [f'payments_{status}' for status in PAYMENT_STATUSES]
+    + [f'amount_{status}' for status in PAYMENT_STATUSES]
+)
+
+def _stat_expressions(sign):
+    expressions = [f"{sign} * (b.status = '{status}')" for status in BOOKING_STATUSES]
+    expressions += [f"{sign} * (p.status <=> '{status}')" for status in PAYMENT_STATUSES]
+    expressions += [f"{sign} * IF(p.status <=> '{status}', p.amount, 0)" for status in PAYMENT_STATUSES]
+    return expressions
+
+def _apply(cursor, where, params, sign):
+    cursor.execute(
+        f"""
+        INSERT INTO booking_daily_stats (venue_id, stat_date, {', '.join(STAT_COLUMNS)})
+        SELECT b.venue_id, DATE(b.created_at), {', '.join(_stat_expressions(sign))}
+        FROM bookings b
+        LEFT JOIN payments p ON p.booking_id = b.id
+        WHERE {where}
+        ON DUPLICATE KEY UPDATE {', '.join(f'{c} = {c} + VALUES({c})' for c in STAT_COLUMNS)}
+        """,
+        params
+    )
+
+def add_booking_stats(cursor, booking_ids):
+    """Add the current state of the given bookings to the rollups."""
+    if booking_ids:
+        _apply(cursor, f"b.id IN ({', '.join(['%s'] * len(booking_ids))})", list(booking_ids), 1)
+
+def remove_booking_stats(cursor, booking_ids):
+    """Subtract the current state of the given bookings from the rollups."""
+    if booking_ids:
+        _apply(cursor, f"b.id IN ({', '.join(['%s'] * len(booking_ids))})", list(booking_ids), -1)
+
+def remove_user_stats(cursor, user_id):
+    """Subtract every booking of a user, before the user (and their bookings) is deleted."""
+    _apply(cursor, 'b.user_id = %s', [user_id], -1)
+
+def _base_aggregate_query():
+    return f"""
+        SELECT b.venue_id, DATE(b.created_at) AS stat_date,
+               {', '.join(f'SUM({e}) AS {c}' for e, c in zip(_stat_expressions(1), STAT_COLUMNS))}
+        FROM bookings b
+        LEFT JOIN payments p ON p.booking_id = b.id
+        GROUP BY b.venue_id, DATE(b.created_at)
+    """
+
+def rebuild(cursor):
+    """Recompute all rollups from bookings/payments. Returns the number of rows written.
+
+    INSERT ... SELECT takes shared locks on the rows it reads, so bookings
+    written concurrently either land before the rebuild sees them or wait
+    for it to commit.
+    """
+    cursor.execute('DELETE FROM booking_daily_stats')
+    cursor.execute(
+        f'INSERT INTO booking_daily_stats (venue_id, stat_date, {", ".join(STAT_COLUMNS)}) '
+        + _base_aggregate_query()
+    )
+    return cursor.rowcount
+
+def check(cursor):
+    """Compare rollups with a fresh aggregate. Returns a list of mismatch descriptions."""
+    cursor.execute(_base_aggregate_query())
+    expected = {(row['venue_id'], row['stat_date']): row for row in cursor.fetchall()}
+    cursor.execute(f'SELECT venue_id, stat_date, {", ".join(STAT_COLUMNS)} FROM booking_daily_stats')
+    actual = {(row['venue_id'], row['stat_date']): row for row in cursor.fetchall()}
+
+    mismatches = []
+    for key in sorted(set(expected) | set(actual), key=lambda k: (k[0], k[1])):
+        want, have = expected.get(key), actual.get(key)
+        for column in STAT_COLUMNS:
+            want_value = want[column] if want else 0
+            have_value = have[column] if have else 0
+            if (want_value or 0) != (have_value or 0):
+                mismatches.append(
+                    f'venue_id={key[0]} date={key[1]} {column}: expected {want_value}, found {have_value}'
+                )
+    return mismatches
+
+def main(argv):
+    if len(argv) != 2 or argv[1] not in ('rebuild', 'check'):
+        print(__doc__)
+        return 2
+
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        if argv[1] == 'rebuild':
+            conn.begin()
+            rows = rebuild(cursor)
+            conn.commit()
+            print(f'Rebuilt booking_daily_stats: {rows} rows')
+            return 0
+
+        mismatches = check(cursor)
+        for mismatch in mismatches:
+            print(mismatch)
+        print(f'{len(mismatches)} mismatches')
+        return 1 if mismatches else 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -1,30 +1,29 @@
-from flask import Blueprint, request, jsonify
-from database import get_db_connection
+from flask import Blueprint, Response, request, jsonify
+from database import get_db_connection, recent_writers
+from availability import availability_index
+from rollups import add_booking_stats, remove_booking_stats, remove_user_stats
+from venue_cache import venue_catalog, bump_venue_catalog_version
+from payments import cancel_payment_intent
+from tokens import revoke_user_refresh_tokens
+from venue_import import InvalidUpload, import_venues, iter_csv_rows, iter_json_array
+from serializers import booking_columns, payment_columns, iso_date_sql, compile_row_serializer, fetch_serialized, dumps
+from collections import OrderedDict
 from functools import wraps
-import jwt
 import os
-from dotenv import load_dotenv
-from .middleware import admin_required
+from .middleware import admin_required, read_only, revoke_user_tokens
 import pymysql
 import datetime
+import threading
+import base64
+import json
+import csv
+import io
+import time
 import logging
 
-load_dotenv()
-
 admin_bp = Blueprint('admin', __name__)
-SECRET_KEY = os.getenv('SECRET_KEY', 'your-secret-key')
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-def timedelta_to_str(td):
-    """Convert timedelta to HH:MM string."""
-    if td is None:
-        return None
-    total_seconds = int(td.total_seconds())
-    hours = total_seconds // 3600
-    minutes = (total_seconds % 3600) // 60
-    return f"{hours:02d}:{minutes:02d}"
-
 # Create a new venue
 @admin_bp.route('/venues', methods=['POST'])
 @admin_required
@@ -39,54 +38,208 @@ def create_venue(user_id):
         if not all([name, location, capacity, price]):
             return jsonify({'error': 'Missing required fields'}), 400
             
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            'INSERT INTO venues (name, location, capacity, price) VALUES (%s, %s, %s, %s)',
-            (name, location, capacity, price)
-        )
-        conn.commit()
-        
-        cursor.close()
-        conn.close()
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO venues (name, location, capacity, price) VALUES (%s, %s, %s, %s)',
+                (name, location, capacity, price)
+            )
+            bump_venue_catalog_version(cursor)
+            conn.commit()
+        venue_catalog.invalidate()
+        # Its bookings went with it (ON DELETE CASCADE)
+        availability_index.invalidate_venue(id)
+
         return jsonify({'message': 'Venue created successfully'}), 201
         
+    except pymysql.IntegrityError as e:
+        if "Duplicate entry" in str(e):
+            return jsonify({'error': DUPLICATE_VENUE_ERROR}), 400
+        return jsonify({'error': str(e)}), 500
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-# Get all venues
-@admin_bp.route('/venues', methods=['GET'])
+DUPLICATE_VENUE_ERROR = 'A venue with this name already exists at this location'
+BULK_VENUE_MODES = ('all_or_nothing', 'partial')
+
+def venue_upload_rows():
+    """Row iterator for the request's upload. Returns (rows, None) or (None, (error, status))."""
+    if request.mimetype == 'multipart/form-data':
+        upload = request.files.get('file')
+        if upload is None:
+            return None, ('Missing file field in the multipart upload', 400)
+        filename = (upload.filename or '').lower()
+        mimetype = upload.mimetype
+        if filename.endswith('.csv'):
+            mimetype = 'text/csv'
+        elif filename.endswith('.json'):
+            mimetype = 'application/json'
+        stream = upload.stream
+    else:
+        mimetype, stream = request.mimetype, request.stream
+    if mimetype == 'application/json':
+        return iter_json_array(stream), None
+    if mimetype in ('text/csv', 'application/csv'):
+        return iter_csv_rows(stream), None
+    return None, ('Upload must be application/json or text/csv', 415)
+
+@admin_bp.route('/admin/venues/bulk', methods=['POST'])
 @admin_required
-def get_venues(user_id):
+def bulk_upsert_venues(user_id):
+    """
+    Create or update many venues from a JSON array or a CSV upload in one
+    transaction (see venue_import.py). mode=all_or_nothing (the default)
+    writes nothing if any row is invalid; mode=partial writes the valid rows.
+    Either way the response lists the invalid rows.
+    """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM venues')
-        venues = cursor.fetchall()
-        
-        cursor.close()
-        conn.close()
-        return jsonify({'venues': venues}), 200
-        
+        mode = request.args.get('mode', 'all_or_nothing')
+        if mode not in BULK_VENUE_MODES:
+            return jsonify({'error': 'Invalid mode. Must be all_or_nothing or partial'}), 400
+        rows, error = venue_upload_rows()
+        if error:
+            return jsonify({'error': error[0]}), error[1]
+
+        started = time.perf_counter()
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            try:
+                conn.begin()
+                report = import_venues(cursor, rows, all_or_nothing=mode == 'all_or_nothing')
+                written = report['created'] + report['updated']
+                if not written or (mode == 'all_or_nothing' and report['error_count']):
+                    conn.rollback()
+                    report['created'] = report['updated'] = 0
+                else:
+                    bump_venue_catalog_version(cursor)
+                    conn.commit()
+            except InvalidUpload as e:
+                conn.rollback()
+                return jsonify({'error': e.message}), e.status
+            except Exception:
+                conn.rollback()
+                raise
+        elapsed = time.perf_counter() - started
+
+        written = report['created'] + report['updated']
+        if written:
+            venue_catalog.invalidate()
+        logger.info("Bulk venue upsert: rows=%s, created=%s, updated=%s, errors=%s, %.0f rows/s",
+                    report['rows'], report['created'], report['updated'], report['error_count'],
+                    report['rows'] / elapsed if elapsed else 0)
+        if not report['rows']:
+            return jsonify({'error': 'The upload contains no venues'}), 400
+        return jsonify({
+            'mode': mode,
+            **report,
+            'elapsed_ms': round(elapsed * 1000, 1),
+            'rows_per_second': round(report['rows'] / elapsed) if elapsed else None
+        }), 200 if written else 400
+
     except Exception as e:
+        logger.error("Error in bulk_upsert_venues: %s", str(e))
         return jsonify({'error': str(e)}), 500
 
+VENUE_SORT_COLUMNS = ['id', 'name', 'location', 'capacity', 'price', 'created_at']
+VENUE_AGGREGATE_SORTS = ['upcoming_bookings', 'next_booking_date']
+DEFAULT_VENUE_PAGE_SIZE = 50
+MAX_VENUE_PAGE_SIZE = 500
+
+def escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+# List venues for the admin console. GET /venues belongs to the user
+# blueprint (registered first), so the admin listing lives under /admin.
+@admin_bp.route('/admin/venues', methods=['GET'])
+@admin_required
+def list_venues(user_id):
+    """
+    Venues with their upcoming (pending or confirmed, from today) booking count
+    and next booking date, computed in one grouped query.
+    Supports q (name or location prefix), sort, order=asc|desc, limit, offset.
+    """
+    try:
+        search = request.args.get('q', '').strip()
+        sort = request.args.get('sort', 'name')
+        order = request.args.get('order', 'asc').lower()
+        limit = request.args.get('limit', str(DEFAULT_VENUE_PAGE_SIZE))
+        offset = request.args.get('offset', '0')
+
+        if sort not in VENUE_SORT_COLUMNS + VENUE_AGGREGATE_SORTS:
+            return jsonify({'error': f'Invalid sort. Must be one of {", ".join(VENUE_SORT_COLUMNS + VENUE_AGGREGATE_SORTS)}'}), 400
+        if order not in ('asc', 'desc'):
+            return jsonify({'error': 'Invalid order. Must be asc or desc'}), 400
+        if not limit.isdigit() or not 1 <= int(limit) <= MAX_VENUE_PAGE_SIZE:
+            return jsonify({'error': f'Invalid limit. Must be an integer between 1 and {MAX_VENUE_PAGE_SIZE}'}), 400
+        if not offset.isdigit():
+            return jsonify({'error': 'Invalid offset. Must be a non-negative integer'}), 400
+        limit, offset = int(limit), int(offset)
+
+        where = ''
+        params = []
+        if search:
+            where = 'WHERE name LIKE %s OR location LIKE %s'
+            params += [escape_like(search) + '%'] * 2
+
+        direction = order.upper()
+        if sort in VENUE_AGGREGATE_SORTS:
+            # Sorting on an aggregate needs every matching venue grouped first
+            venue_source = f'(SELECT id, name, location, capacity, price, created_at FROM venues {where}) v'
+            order_by = f'{sort} {direction}, v.id {direction}'
+            page = 'LIMIT %s OFFSET %s'
+        else:
+            # Otherwise page over venues alone and aggregate just that page
+            venue_source = f'(SELECT id, name, location, capacity, price, created_at FROM venues {where} ORDER BY {sort} {direction}, id {direction} LIMIT %s OFFSET %s) v'
+            order_by = f'v.{sort} {direction}, v.id {direction}'
+            page = ''
+        page_params = [limit + 1, offset]
+
+        query = f"""
+            SELECT v.id, v.name, v.location, v.capacity, v.price, v.created_at,
+                   COUNT(b.id) as upcoming_bookings,
+                   MIN(b.booking_date) as next_booking_date
+            FROM {venue_source}
+            LEFT JOIN bookings b
+                ON b.venue_id = v.id
+                AND b.status IN ('confirmed', 'pending')
+                AND b.booking_date >= CURDATE()
+            GROUP BY v.id, v.name, v.location, v.capacity, v.price, v.created_at
+            ORDER BY {order_by}
+            {page}
+        """
+
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute(query, params + page_params)
+            venues = cursor.fetchall()
+
+        has_more = len(venues) > limit
+        return jsonify({
+            'venues': [
+                {
+                    **venue,
+                    'created_at': venue['created_at'].isoformat() if venue['created_at'] else None,
+                    'next_booking_date': venue['next_booking_date'].isoformat() if venue['next_booking_date'] else None
+                } for venue in venues[:limit]
+            ],
+            'limit': limit,
+            'offset': offset,
+            'next_offset': offset + limit if has_more else None
+        }), 200
+
+    except pymysql.MySQLError as e:
+        logger.error(f"Database error in list_venues: {str(e)}")
+        return jsonify({'error': f'Database error: {str(e)}'}), 500
+    except Exception as e:
+        logger.error(f"Unexpected error in list_venues: {str(e)}")
+        return jsonify({'error': f'Internal server error: {str(e)}'}), 500
+
 # Get single venue
 @admin_bp.route('/venues/<int:id>', methods=['GET'])
 @admin_required
 def get_venue(user_id, id):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM venues WHERE id = %s', (id,))
-        venue = cursor.fetchone()
-        
-        cursor.close()
-        conn.close()
-        
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute('SELECT * FROM venues WHERE id = %s', (id,))
+            venue = cursor.fetchone()
+
         if not venue:
             return jsonify({'error': 'Venue not found'}), 404
         return jsonify({'venue': venue}), 200
@@ -108,9 +261,6 @@ def update_venue(user_id, id):
         if not any([name, location, capacity, price]):
             return jsonify({'error': 'At least one field must be provided'}), 400
             
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
         update_fields = []
         values = []
         
@@ -130,18 +280,21 @@ def update_venue(user_id, id):
         if update_fields:
             values.append(id)
             query = f'UPDATE venues SET {", ".join(update_fields)} WHERE id = %s'
-            cursor.execute(query, values)
-            conn.commit()
-            
-            if cursor.rowcount == 0:
-                cursor.close()
-                conn.close()
-                return jsonify({'error': 'Venue not found'}), 404
-                
-        cursor.close()
-        conn.close()
+            with get_db_connection() as conn, conn.cursor() as cursor:
+                cursor.execute(query, values)
+                if cursor.rowcount == 0:
+                    conn.rollback()
+                    return jsonify({'error': 'Venue not found'}), 404
+                bump_venue_catalog_version(cursor)
+                conn.commit()
+            venue_catalog.invalidate()
+
         return jsonify({'message': 'Venue updated successfully'}), 200
         
+    except pymysql.IntegrityError as e:
+        if "Duplicate entry" in str(e):
+            return jsonify({'error': DUPLICATE_VENUE_ERROR}), 400
+        return jsonify({'error': str(e)}), 500
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -150,19 +303,15 @@ def update_venue(user_id, id):
 @admin_required
 def delete_venue(user_id, id):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('DELETE FROM venues WHERE id = %s', (id,))
-        conn.commit()
-        
-        if cursor.rowcount == 0:
-            cursor.close()
-            conn.close()
-            return jsonify({'error': 'Venue not found'}), 404
-            
-        cursor.close()
-        conn.close()
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute('DELETE FROM venues WHERE id = %s', (id,))
+            if cursor.rowcount == 0:
+                conn.rollback()
+                return jsonify({'error': 'Venue not found'}), 404
+            bump_venue_catalog_version(cursor)
+            conn.commit()
+        venue_catalog.invalidate()
+
         return jsonify({'message': 'Venue deleted successfully'}), 200
         
     except Exception as e:
@@ -176,35 +325,38 @@ def delete_user(user_id, id):
         if user_id == id:
             return jsonify({'error': 'Cannot delete your own account'}), 403
 
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT role FROM users WHERE id = %s', (id,))
-        user = cursor.fetchone()
-        
-        if not user:
-            cursor.close()
-            conn.close()
-            return jsonify({'error': 'User not found'}), 404
-            
-        if user['role'] == 'admin':
-            cursor.execute('SELECT COUNT(*) as admin_count FROM users WHERE role = "admin"')
-            admin_count = cursor.fetchone()['admin_count']
-            if admin_count <= 1:
-                cursor.close()
-                conn.close()
-                return jsonify({'error': 'Cannot delete the last admin'}), 403
-            
-        cursor.execute('DELETE FROM users WHERE id = %s', (id,))
-        conn.commit()
-        
-        if cursor.rowcount == 0:
-            cursor.close()
-            conn.close()
-            return jsonify({'error': 'Failed to delete user'}), 500
-            
-        cursor.close()
-        conn.close()
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute('SELECT role FROM users WHERE id = %s', (id,))
+            user = cursor.fetchone()
+
+            if not user:
+                return jsonify({'error': 'User not found'}), 404
+
+            if user['role'] == 'admin':
+                cursor.execute('SELECT COUNT(*) as admin_count FROM users WHERE role = "admin"')
+                admin_count = cursor.fetchone()['admin_count']
+                if admin_count <= 1:
+                    return jsonify({'error': 'Cannot delete the last admin'}), 403
+
+            # The user's bookings go with them; their days must be reloaded afterwards
+            cursor.execute(
+                "SELECT DISTINCT venue_id, booking_date FROM bookings WHERE user_id = %s AND status != 'cancelled'",
+                (id,)
+            )
+            booked_days = cursor.fetchall()
+
+            remove_user_stats(cursor, id)
+            # Also deletes the user's bookings and refresh tokens (ON DELETE CASCADE)
+            cursor.execute('DELETE FROM users WHERE id = %s', (id,))
+            conn.commit()
+
+            if cursor.rowcount == 0:
+                return jsonify({'error': 'Failed to delete user'}), 500
+
+        for day in booked_days:
+            availability_index.invalidate(day['venue_id'], day['booking_date'])
+        revoke_user_tokens(id)
+        recent_writers.mark(user_id)
         return jsonify({'message': 'User deleted successfully'}), 200
         
     except Exception as e:
@@ -223,37 +375,30 @@ def update_user_role(user_id, id):
         if not new_role or new_role not in ['user', 'admin']:
             return jsonify({'error': 'Invalid or missing role'}), 400
 
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # Check if user exists
-        cursor.execute('SELECT role FROM users WHERE id = %s', (id,))
-        user = cursor.fetchone()
-        if not user:
-            cursor.close()
-            conn.close()
-            return jsonify({'error': 'User not found'}), 404
-
-        # Prevent demoting the last admin
-        if user['role'] == 'admin' and new_role == 'user':
-            cursor.execute('SELECT COUNT(*) as admin_count FROM users WHERE role = "admin"')
-            admin_count = cursor.fetchone()['admin_count']
-            if admin_count <= 1:
-                cursor.close()
-                conn.close()
-                return jsonify({'error': 'Cannot demote the last admin'}), 403
-
-        # Update user role
-        cursor.execute('UPDATE users SET role = %s WHERE id = %s', (new_role, id))
-        conn.commit()
-
-        if cursor.rowcount == 0:
-            cursor.close()
-            conn.close()
-            return jsonify({'error': 'Failed to update user role'}), 500
-
-        cursor.close()
-        conn.close()
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            # Check if user exists
+            cursor.execute('SELECT role FROM users WHERE id = %s', (id,))
+            user = cursor.fetchone()
+            if not user:
+                return jsonify({'error': 'User not found'}), 404
+
+            # Prevent demoting the last admin
+            if user['role'] == 'admin' and new_role == 'user':
+                cursor.execute('SELECT COUNT(*) as admin_count FROM users WHERE role = "admin"')
+                admin_count = cursor.fetchone()['admin_count']
+                if admin_count <= 1:
+                    return jsonify({'error': 'Cannot demote the last admin'}), 403
+
+            # Update user role
+            cursor.execute('UPDATE users SET role = %s WHERE id = %s', (new_role, id))
+            if cursor.rowcount == 0:
+                return jsonify({'error': 'Failed to update user role'}), 500
+            # Tokens still carry the old role; the user logs in again
+            revoke_user_refresh_tokens(cursor, id)
+            conn.commit()
+
+        revoke_user_tokens(id)
+        recent_writers.mark(user_id)
         return jsonify({'message': f'User role updated to {new_role}'}), 200
 
     except Exception as e:
@@ -274,6 +419,7 @@ def validate_date(date_str):
 
 @admin_bp.route('/revenue', methods=['GET'])
 @admin_required
+@read_only
 def get_revenue_report(user_id):
     try:
         start_date = request.args.get('start_date')
@@ -325,132 +471,205 @@ def get_revenue_report(user_id):
     except Exception as e:
         return jsonify({'error': f'Internal server error: {str(e)}'}), 500
 
+BOOKING_STATUSES = ['confirmed', 'cancelled', 'pending']
+PAYMENT_STATUSES = ['success', 'failed', 'refunded', 'pending']
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+BOOKING_COUNT_TTL = float(os.getenv('BOOKING_COUNT_TTL', 30))
+# Filter combinations whose count is kept, least recently used dropped first
+BOOKING_COUNT_CACHE_SIZE = int(os.getenv('BOOKING_COUNT_CACHE_SIZE', 256))
+
+# Optional column groups of GET /bookings/all and the join each one needs
+BOOKING_FIELD_GROUPS = {
+    'user': {
+        'columns': ['u.name as user_name', 'u.email as user_email'],
+        'join': 'LEFT JOIN users u ON b.user_id = u.id'
+    },
+    'venue': {
+        'columns': ['v.name as venue_name', 'v.location', 'v.price'],
+        'join': 'LEFT JOIN venues v ON b.venue_id = v.id'
+    },
+    'payment': {
+        'columns': payment_columns('p'),
+        'join': 'LEFT JOIN payments p ON b.id = p.booking_id'
+    }
+}
+
+_booking_counts = OrderedDict()
+_booking_counts_lock = threading.Lock()
+
+def parse_booking_filters(args):
+    """Validate the booking filters shared by the admin listing endpoints.
+
+    Returns (filters, error_message).
+    """
+    filters = {
+        'status': args.get('status'),
+        'payment_status': args.get('payment_status'),
+        'venue_id': args.get('venue_id'),
+        'user_id': args.get('user_id'),
+        'start_date': args.get('start_date'),
+        'end_date': args.get('end_date')
+    }
+    if filters['start_date'] and not validate_date(filters['start_date']):
+        return None, 'Invalid start_date format. Use YYYY-MM-DD'
+    if filters['end_date'] and not validate_date(filters['end_date']):
+        return None, 'Invalid end_date format. Use YYYY-MM-DD'
+    if filters['venue_id'] and not filters['venue_id'].isdigit():
+        return None, 'Invalid venue_id. Must be an integer'
+    if filters['user_id'] and not filters['user_id'].isdigit():
+        return None, 'Invalid user_id. Must be an integer'
+    if filters['status'] and filters['status'] not in BOOKING_STATUSES:
+        return None, 'Invalid status. Must be confirmed, cancelled, or pending'
+    if filters['payment_status'] and filters['payment_status'] not in PAYMENT_STATUSES:
+        return None, 'Invalid payment_status. Must be success, failed, refunded, or pending'
+    return filters, None
+
+def booking_filter_clause(filters):
+    """SQL conditions (to append after WHERE 1=1) and params for parsed booking filters."""
+    clause = ''
+    params = []
+    if filters['status']:
+        clause += ' AND b.status = %s'
+        params.append(filters['status'])
+    if filters['payment_status']:
+        clause += ' AND p.status = %s'
+        params.append(filters['payment_status'])
+    if filters['venue_id']:
+        clause += ' AND b.venue_id = %s'
+        params.append(filters['venue_id'])
+    if filters['user_id']:
+        clause += ' AND b.user_id = %s'
+        params.append(filters['user_id'])
+    if filters['start_date']:
+        clause += ' AND b.booking_date >= %s'
+        params.append(filters['start_date'])
+    if filters['end_date']:
+        clause += ' AND b.booking_date <= %s'
+        params.append(filters['end_date'])
+    return clause, params
+
+def encode_booking_cursor(created_at, booking_id):
+    """Opaque next_cursor for a row's ISO created_at string and id."""
+    raw = json.dumps([created_at, booking_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_booking_cursor(cursor_str):
+    """Decode an opaque next_cursor back to (created_at, id). Raises ValueError if malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor_str + '=' * (-len(cursor_str) % 4))
+        created_at, booking_id = json.loads(raw)
+        return datetime.datetime.fromisoformat(created_at), int(booking_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+def count_bookings(cursor, filters):
+    """COUNT(*) for a filter combination, cached for BOOKING_COUNT_TTL seconds."""
+    key = tuple(sorted(filters.items()))
+    now = time.monotonic()
+    with _booking_counts_lock:
+        cached = _booking_counts.get(key)
+        if cached and cached[0] > now:
+            _booking_counts.move_to_end(key)
+            return cached[1]
+
+    clause, params = booking_filter_clause(filters)
+    join = BOOKING_FIELD_GROUPS['payment']['join'] if filters['payment_status'] else ''
+    cursor.execute(f'SELECT COUNT(*) as total FROM bookings b {join} WHERE 1=1{clause}', params)
+    total = cursor.fetchone()['total']
+
+    with _booking_counts_lock:
+        _booking_counts[key] = (now + BOOKING_COUNT_TTL, total)
+        _booking_counts.move_to_end(key)
+        while len(_booking_counts) > BOOKING_COUNT_CACHE_SIZE:
+            _booking_counts.popitem(last=False)
+    return total
+
 @admin_bp.route('/bookings/all', methods=['GET'])
 @admin_required
+@read_only
 def get_all_bookings(user_id):
     """
     Admin endpoint to view all bookings with optional filters.
     Supports filtering by status, payment_status, venue_id, user_id, date range.
+    Results are paginated newest first: pass the returned next_cursor back as
+    cursor to get the next page. fields=user,venue,payment limits the joined
+    columns; include_total=true adds a (cached) total_bookings count.
     """
     try:
-        # Get query parameters for filtering
-        status_filter = request.args.get('status')
-        payment_status_filter = request.args.get('payment_status')
-        venue_id_filter = request.args.get('venue_id')
-        user_id_filter = request.args.get('user_id')
-        start_date = request.args.get('start_date')
-        end_date = request.args.get('end_date')
-        
-        # Validate inputs
-        if start_date and not validate_date(start_date):
-            return jsonify({'error': 'Invalid start_date format. Use YYYY-MM-DD'}), 400
-        if end_date and not validate_date(end_date):
-            return jsonify({'error': 'Invalid end_date format. Use YYYY-MM-DD'}), 400
-        if venue_id_filter and not venue_id_filter.isdigit():
-            return jsonify({'error': 'Invalid venue_id. Must be an integer'}), 400
-        if user_id_filter and not user_id_filter.isdigit():
-            return jsonify({'error': 'Invalid user_id. Must be an integer'}), 400
-        if status_filter and status_filter not in ['confirmed', 'cancelled', 'pending']:
-            return jsonify({'error': 'Invalid status. Must be confirmed, cancelled, or pending'}), 400
-        if payment_status_filter and payment_status_filter not in ['success', 'failed', 'refunded', 'pending']:
-            return jsonify({'error': 'Invalid payment_status. Must be success, failed, refunded, or pending'}), 400
+        filters, error_message = parse_booking_filters(request.args)
+        if error_message:
+            return jsonify({'error': error_message}), 400
+
+        limit = request.args.get('limit', str(DEFAULT_PAGE_SIZE))
+        if not limit.isdigit() or not 1 <= int(limit) <= MAX_PAGE_SIZE:
+            return jsonify({'error': f'Invalid limit. Must be an integer between 1 and {MAX_PAGE_SIZE}'}), 400
+        limit = int(limit)
+
+        fields = request.args.get('fields')
+        groups = fields.split(',') if fields else list(BOOKING_FIELD_GROUPS)
+        unknown = [group for group in groups if group not in BOOKING_FIELD_GROUPS]
+        if unknown:
+            return jsonify({'error': f'Invalid fields: {", ".join(unknown)}. Must be any of user, venue, payment'}), 400
+
+        page_after = None
+        if request.args.get('cursor'):
+            try:
+                page_after = decode_booking_cursor(request.args['cursor'])
+            except ValueError:
+                return jsonify({'error': 'Invalid cursor'}), 400
+
+        include_total = request.args.get('include_total', '').lower() in ('1', 'true', 'yes')
+
+        # Only join what is projected, plus payments when filtering on them
+        columns = booking_columns('b')
+        joins = []
+        for group, spec in BOOKING_FIELD_GROUPS.items():
+            if group in groups:
+                columns += spec['columns']
+            if group in groups or (group == 'payment' and filters['payment_status']):
+                joins.append(spec['join'])
+
+        clause, params = booking_filter_clause(filters)
+        if page_after:
+            clause += ' AND (b.created_at < %s OR (b.created_at = %s AND b.id < %s))'
+            params += [page_after[0], page_after[0], page_after[1]]
+
+        query = f"""
+            SELECT {', '.join(columns)}
+            FROM bookings b
+            {' '.join(joins)}
+            WHERE 1=1{clause}
+            ORDER BY b.created_at DESC, b.id DESC
+            LIMIT %s
+        """
+        params.append(limit + 1)
 
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        with get_db_connection() as conn:
+            # Rows come back formatted by SQL and are shaped by one compiled pass
+            with conn.cursor(pymysql.cursors.Cursor) as cursor:
+                cursor.execute(query, params)
+                enhanced_bookings = fetch_serialized(cursor)
+            if include_total:
+                with conn.cursor() as cursor:
+                    total_bookings = count_bookings(cursor, filters)
 
-        # Build the query with joins to get comprehensive booking information
-        query = '''
-            SELECT 
-                b.id,
-                b.user_id,
-                b.venue_id,
-                b.booking_date,
-                b.start_time,
-                b.end_time,
-                b.status,
-                b.created_at,
-                u.name as user_name,
-                u.email as user_email,
-                v.name as venue_name,
-                v.location,
-                v.price,
-                p.status as payment_status,
-                p.amount as payment_amount,
-                p.created_at as payment_created_at
-            FROM bookings b
-            LEFT JOIN users u ON b.user_id = u.id
-            LEFT JOIN venues v ON b.venue_id = v.id
-            LEFT JOIN payments p ON b.id = p.booking_id
-            WHERE 1=1
-        '''
-        
-        params = []
-        
-        # Add filters to the query
-        if status_filter:
-            query += ' AND b.status = %s'
-            params.append(status_filter)
-        
-        if payment_status_filter:
-            query += ' AND p.status = %s'
-            params.append(payment_status_filter)
-        
-        if venue_id_filter:
-            query += ' AND b.venue_id = %s'
-            params.append(venue_id_filter)
-        
-        if user_id_filter:
-            query += ' AND b.user_id = %s'
-            params.append(user_id_filter)
-        
-        if start_date:
-            query += ' AND b.booking_date >= %s'
-            params.append(start_date)
-        
-        if end_date:
-            query += ' AND b.booking_date <= %s'
-            params.append(end_date)
-        
-        # Order by most recent bookings first
-        query += ' ORDER BY b.created_at DESC'
-        
-        cursor.execute(query, params)
-        bookings = cursor.fetchall()
-        
-        # Enhance response with additional computed fields
-        enhanced_bookings = []
-        for booking in bookings:
-            enhanced_booking = dict(booking)
-            enhanced_booking['is_cancelled'] = booking['status'] == 'cancelled'
-            enhanced_booking['is_refunded'] = booking['payment_status'] == 'refunded' if booking['payment_status'] else False
-            enhanced_booking['start_time'] = timedelta_to_str(booking['start_time'])
-            enhanced_booking['end_time'] = timedelta_to_str(booking['end_time'])
-            enhanced_booking['time_slot'] = f"{timedelta_to_str(booking['start_time'])}-{timedelta_to_str(booking['end_time'])}" if booking['start_time'] and booking['end_time'] else None
-            
-            # Format dates for better readability
-            if booking['created_at']:
-                enhanced_booking['created_at'] = booking['created_at'].isoformat()
-            if booking['payment_created_at']:
-                enhanced_booking['payment_created_at'] = booking['payment_created_at'].isoformat()
-            
-            enhanced_bookings.append(enhanced_booking)
-        
-        cursor.close()
-        conn.close()
-        
-        return jsonify({
+        next_cursor = None
+        if len(enhanced_bookings) > limit:
+            enhanced_bookings = enhanced_bookings[:limit]
+            next_cursor = encode_booking_cursor(enhanced_bookings[-1]['created_at'], enhanced_bookings[-1]['id'])
+
+        response = {
             'bookings': enhanced_bookings,
-            'total_bookings': len(enhanced_bookings),
-            'filters_applied': {
-                'status': status_filter,
-                'payment_status': payment_status_filter,
-                'venue_id': venue_id_filter,
-                'user_id': user_id_filter,
-                'start_date': start_date,
-                'end_date': end_date
-            }
-        }), 200
-        
+            'next_cursor': next_cursor,
+            'limit': limit,
+            'fields': groups,
+            'filters_applied': filters
+        }
+        if include_total:
+            response['total_bookings'] = total_bookings
+        return jsonify(response), 200
+
     except pymysql.MySQLError as e:
         logger.error(f"Database error in get_all_bookings: {str(e)}")
         return jsonify({'error': f'Database error: {str(e)}'}), 500
@@ -458,112 +677,207 @@ def get_all_bookings(user_id):
         logger.error(f"Unexpected error in get_all_bookings: {str(e)}")
         return jsonify({'error': f'Internal server error: {str(e)}'}), 500
 
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv'
+}
+EXPORT_COLUMNS = [
+    'id', 'user_id', 'venue_id', 'booking_date', 'start_time', 'end_time', 'time_slot', 'status',
+    'is_cancelled', 'created_at', 'user_name', 'user_email', 'venue_name', 'location', 'price',
+    'payment_status', 'payment_amount', 'payment_created_at', 'is_refunded'
+]
+EXPORT_FETCH_SIZE = 500
+
+@admin_bp.route('/admin/bookings/export', methods=['GET'])
+@admin_required
+def export_bookings(user_id):
+    """
+    Stream every booking matching the /bookings/all filters as NDJSON or CSV.
+    Rows are read through an unbuffered server-side cursor and written out
+    as they arrive, so memory use does not grow with the result size.
+    """
+    try:
+        export_format = request.args.get('format', 'ndjson')
+        if export_format not in EXPORT_FORMATS:
+            return jsonify({'error': 'Invalid format. Must be ndjson or csv'}), 400
+
+        filters, error_message = parse_booking_filters(request.args)
+        if error_message:
+            return jsonify({'error': error_message}), 400
+
+        clause, params = booking_filter_clause(filters)
+        # Exports carry ISO dates rather than the HTTP dates jsonify() produces
+        columns = booking_columns('b', date_sql=iso_date_sql)
+        joins = []
+        for spec in BOOKING_FIELD_GROUPS.values():
+            columns += spec['columns']
+            joins.append(spec['join'])
+        query = f"""
+            SELECT {', '.join(columns)}
+            FROM bookings b
+            {' '.join(joins)}
+            WHERE 1=1{clause}
+            ORDER BY b.created_at DESC, b.id DESC
+        """
+
+        # Check out and run the query before streaming so failures still get a proper error response
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor(pymysql.cursors.SSCursor)
+            cursor.execute(query, params)
+        except Exception:
+            conn.close(broken=True)
+            raise
+
+        def generate():
+            finished = False
+            try:
+                serialize = compile_row_serializer(cursor.description)
+                if export_format == 'csv':
+                    buffer = io.StringIO()
+                    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS, extrasaction='ignore')
+                    writer.writeheader()
+                    yield buffer.getvalue()
+                    while True:
+                        rows = cursor.fetchmany(EXPORT_FETCH_SIZE)
+                        if not rows:
+                            break
+                        buffer.seek(0)
+                        buffer.truncate()
+                        writer.writerows(serialize(row) for row in rows)
+                        yield buffer.getvalue()
+                else:
+                    while True:
+                        rows = cursor.fetchmany(EXPORT_FETCH_SIZE)
+                        if not rows:
+                            break
+                        # Decimal amounts are the only values left for default= to handle
+                        yield b''.join(dumps(serialize(row), default=str) + b'\n' for row in rows)
+                finished = True
+            finally:
+                if finished:
+                    cursor.close()
+                    conn.close()
+                else:
+                    # Draining an abandoned unbuffered result would read it to the end; drop the socket instead
+                    conn.close(broken=True)
+
+        response = Response(generate(), mimetype=EXPORT_FORMATS[export_format])
+        response.headers['Content-Disposition'] = f'attachment; filename=bookings.{export_format}'
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+
+    except pymysql.MySQLError as e:
+        logger.error(f"Database error in export_bookings: {str(e)}")
+        return jsonify({'error': f'Database error: {str(e)}'}), 500
+    except Exception as e:
+        logger.error(f"Unexpected error in export_bookings: {str(e)}")
+        return jsonify({'error': f'Internal server error: {str(e)}'}), 500
+
+_BOOKING_TOTAL_SQL = ' + '.join(f'r.bookings_{status}' for status in BOOKING_STATUSES)
+
+# (totals, per-venue, last 30 days) queries behind /bookings/statistics
+STATISTICS_QUERIES = (
+    # Booking and payment status counts and revenue by payment status
+    'SELECT '
+    + ', '.join(
+        [f'COALESCE(SUM(bookings_{status}), 0) as bookings_{status}' for status in BOOKING_STATUSES]
+        + [f'COALESCE(SUM(payments_{status}), 0) as payments_{status}' for status in PAYMENT_STATUSES]
+        + [f'COALESCE(SUM(amount_{status}), 0) as amount_{status}' for status in PAYMENT_STATUSES]
+    )
+    + ' FROM booking_daily_stats',
+    # Bookings by venue
+    f'''
+        SELECT 
+            v.name as venue_name,
+            COALESCE(SUM({_BOOKING_TOTAL_SQL}), 0) as booking_count,
+            COALESCE(SUM(r.amount_success), 0) as revenue
+        FROM venues v
+        LEFT JOIN booking_daily_stats r ON v.id = r.venue_id
+        GROUP BY v.id, v.name
+        ORDER BY booking_count DESC
+    ''',
+    # Recent booking trends (last 30 days by day)
+    f'''
+        SELECT 
+            r.stat_date as booking_date,
+            SUM({_BOOKING_TOTAL_SQL}) as bookings_count,
+            SUM(r.amount_success) as daily_revenue
+        FROM booking_daily_stats r
+        WHERE r.stat_date >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)
+        GROUP BY r.stat_date
+        HAVING bookings_count > 0
+        ORDER BY booking_date DESC
+        LIMIT 30
+    ''',
+)
+
+def shape_statistics(totals, venue_rows, trend_rows):
+    """Build the /bookings/statistics response from the rows of STATISTICS_QUERIES."""
+    booking_status_counts = {
+        status: int(totals[f'bookings_{status}'])
+        for status in BOOKING_STATUSES if totals[f'bookings_{status}']
+    }
+    payment_status_counts = {
+        status: int(totals[f'payments_{status}'])
+        for status in PAYMENT_STATUSES if totals[f'payments_{status}']
+    }
+    revenue_by_payment_status = {
+        status: float(totals[f'amount_{status}'])
+        for status in PAYMENT_STATUSES if totals[f'payments_{status}']
+    }
+    venue_statistics = [
+        {
+            'venue_name': row['venue_name'],
+            'booking_count': int(row['booking_count']),
+            'revenue': float(row['revenue'])
+        }
+        for row in venue_rows
+    ]
+    recent_trends = [
+        {
+            'date': row['booking_date'].isoformat() if row['booking_date'] else None,
+            'bookings_count': int(row['bookings_count']),
+            'daily_revenue': float(row['daily_revenue'])
+        }
+        for row in trend_rows
+    ]
+    return {
+        'booking_status_counts': booking_status_counts,
+        'payment_status_counts': payment_status_counts,
+        'revenue_by_payment_status': revenue_by_payment_status,
+        'venue_statistics': venue_statistics,
+        'recent_trends_30_days': recent_trends,
+        'summary': {
+            'total_bookings': sum(booking_status_counts.values()),
+            'total_revenue': revenue_by_payment_status.get('success', 0),
+            'successful_bookings': booking_status_counts.get('confirmed', 0),
+            'cancelled_bookings': booking_status_counts.get('cancelled', 0),
+            'pending_bookings': booking_status_counts.get('pending', 0)
+        }
+    }
+
 @admin_bp.route('/bookings/statistics', methods=['GET'])
-@admin_required  
+@admin_required
+@read_only
 def get_booking_statistics(user_id):
     """
     Admin endpoint to get booking statistics summary.
     Returns counts for different booking statuses, payment statuses, etc.
+    Reads the booking_daily_stats rollups (see rollups.py), so the cost
+    grows with venues x days rather than with the number of bookings.
     """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Get booking status counts
-        cursor.execute('''
-            SELECT 
-                status,
-                COUNT(*) as count
-            FROM bookings 
-            GROUP BY status
-        ''')
-        booking_status_counts = {row['status']: row['count'] for row in cursor.fetchall()}
-        
-        # Get payment status counts
-        cursor.execute('''
-            SELECT 
-                p.status,
-                COUNT(*) as count
-            FROM payments p
-            JOIN bookings b ON p.booking_id = b.id
-            GROUP BY p.status
-        ''')
-        payment_status_counts = {row['status']: row['count'] for row in cursor.fetchall()}
-        
-        # Get total revenue by status
-        cursor.execute('''
-            SELECT 
-                p.status,
-                COALESCE(SUM(p.amount), 0) as total_amount
-            FROM payments p
-            JOIN bookings b ON p.booking_id = b.id
-            GROUP BY p.status
-        ''')
-        revenue_by_payment_status = {
-            row['status']: float(row['total_amount']) 
-            for row in cursor.fetchall()
-        }
-        
-        # Get bookings by venue
-        cursor.execute('''
-            SELECT 
-                v.name as venue_name,
-                COUNT(b.id) as booking_count,
-                COALESCE(SUM(CASE WHEN p.status = 'success' THEN p.amount END), 0) as revenue
-            FROM venues v
-            LEFT JOIN bookings b ON v.id = b.venue_id
-            LEFT JOIN payments p ON b.id = p.booking_id
-            GROUP BY v.id, v.name
-            ORDER BY booking_count DESC
-        ''')
-        venue_statistics = [
-            {
-                'venue_name': row['venue_name'],
-                'booking_count': row['booking_count'],
-                'revenue': float(row['revenue'])
-            }
-            for row in cursor.fetchall()
-        ]
-        
-        # Get recent booking trends (last 30 days by day)
-        cursor.execute('''
-            SELECT 
-                DATE(b.created_at) as booking_date,
-                COUNT(*) as bookings_count,
-                COALESCE(SUM(CASE WHEN p.status = 'success' THEN p.amount END), 0) as daily_revenue
-            FROM bookings b
-            LEFT JOIN payments p ON b.id = p.booking_id
-            WHERE b.created_at >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)
-            GROUP BY DATE(b.created_at)
-            ORDER BY booking_date DESC
-            LIMIT 30
-        ''')
-        recent_trends = [
-            {
-                'date': row['booking_date'].isoformat() if row['booking_date'] else None,
-                'bookings_count': row['bookings_count'],
-                'daily_revenue': float(row['daily_revenue'])
-            }
-            for row in cursor.fetchall()
-        ]
-        
-        cursor.close()
-        conn.close()
-        
-        return jsonify({
-            'booking_status_counts': booking_status_counts,
-            'payment_status_counts': payment_status_counts,
-            'revenue_by_payment_status': revenue_by_payment_status,
-            'venue_statistics': venue_statistics,
-            'recent_trends_30_days': recent_trends,
-            'summary': {
-                'total_bookings': sum(booking_status_counts.values()),
-                'total_revenue': revenue_by_payment_status.get('success', 0),
-                'successful_bookings': booking_status_counts.get('confirmed', 0),
-                'cancelled_bookings': booking_status_counts.get('cancelled', 0),
-                'pending_bookings': booking_status_counts.get('pending', 0)
-            }
-        }), 200
+        totals_query, venues_query, trends_query = STATISTICS_QUERIES
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute(totals_query)
+            totals = cursor.fetchone()
+            cursor.execute(venues_query)
+            venue_rows = cursor.fetchall()
+            cursor.execute(trends_query)
+            trend_rows = cursor.fetchall()
+
+        return jsonify(shape_statistics(totals, venue_rows, trend_rows)), 200
         
     except pymysql.MySQLError as e:
         logger.error(f"Database error in get_booking_statistics: {str(e)}")
@@ -576,63 +890,60 @@ def get_booking_statistics(user_id):
 @admin_required
 def cancel_booking(user_id, id):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        try:
-            # Start transaction
-            conn.begin()
-
-            # Verify booking exists
-            cursor.execute('SELECT status FROM bookings WHERE id = %s', (id,))
-            booking = cursor.fetchone()
-
-            if not booking:
-                conn.rollback()
-                cursor.close()
-                conn.close()
-                return jsonify({'error': 'Booking not found'}), 404
-
-            if booking['status'] == 'cancelled':
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            try:
+                # Start transaction
+                conn.begin()
+
+                # Verify booking exists
+                cursor.execute('SELECT status, venue_id, booking_date FROM bookings WHERE id = %s FOR UPDATE', (id,))
+                booking = cursor.fetchone()
+
+                if not booking:
+                    conn.rollback()
+                    return jsonify({'error': 'Booking not found'}), 404
+
+                if booking['status'] == 'cancelled':
+                    conn.rollback()
+                    return jsonify({'error': 'Booking is already cancelled'}), 400
+
+                remove_booking_stats(cursor, [id])
+
+                # Update booking status
+                cursor.execute('UPDATE bookings SET status = %s WHERE id = %s', ('cancelled', id))
+
+                # Only a payment that went through is refunded; a pending one fails with its intent
+                cursor.execute("UPDATE payments SET status = 'refunded' WHERE booking_id = %s AND status = 'success'", (id,))
+                refunded = cursor.rowcount > 0
+                cursor.execute("UPDATE payments SET status = 'failed' WHERE booking_id = %s AND status = 'pending'", (id,))
+                cancel_payment_intent(cursor, id)
+
+                add_booking_stats(cursor, [id])
+
+                conn.commit()
+                recent_writers.mark(user_id)
+                availability_index.remove(id, booking['venue_id'], booking['booking_date'])
+                return jsonify({
+                    'message': 'Booking cancelled successfully',
+                    'is_cancelled': True,
+                    'is_refunded': refunded
+                }), 200
+
+            except Exception as e:
                 conn.rollback()
-                cursor.close()
-                conn.close()
-                return jsonify({'error': 'Booking is already cancelled'}), 400
-
-            # Update booking status
-            cursor.execute('UPDATE bookings SET status = %s WHERE id = %s', ('cancelled', id))
-
-            # Update payment status to refunded if applicable
-            cursor.execute('UPDATE payments SET status = %s WHERE booking_id = %s', ('refunded', id))
-
-            conn.commit()
-            cursor.close()
-            conn.close()
-            return jsonify({
-                'message': 'Booking cancelled successfully',
-                'is_cancelled': True,
-                'is_refunded': True
-            }), 200
-
-        except Exception as e:
-            conn.rollback()
-            cursor.close()
-            conn.close()
-            return jsonify({'error': str(e)}), 500
+                return jsonify({'error': str(e)}), 500
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     
 @admin_bp.route('/users', methods=['GET'])
 @admin_required
+@read_only
 def get_users(user_id):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT id, name, email, role, created_at FROM users')
-        users = cursor.fetchall()
-        cursor.close()
-        conn.close()
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute('SELECT id, name, email, role, created_at FROM users')
+            users = cursor.fetchall()
         return jsonify({'users': [
             {
                 **user,
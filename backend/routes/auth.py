@@ -1,20 +1,27 @@
 from flask import Blueprint, request, jsonify
 from database import get_db_connection
-import bcrypt
-import jwt
-import datetime
 import os
-from dotenv import load_dotenv
 from functools import wraps
 import pymysql
-# from middleware import admin_required
-
-load_dotenv()
+from .middleware import AuthError, authenticate
+from passwords import password_hasher, PasswordPoolBusy, PASSWORD_RETRY_AFTER
+from idempotency import idempotent
+from ratelimit import login_limiter, RATE_LIMIT_TRUST_FORWARDED
+from tokens import issue_tokens, rotate_refresh_token, revoke_refresh_token, RefreshTokenError
 
 auth_bp = Blueprint('auth', __name__)
-SECRET_KEY = os.getenv('SECRET_KEY', 'your-secret-key')
+
+def replace_password_hash(user_id, old_hash, new_hash):
+    """Store a password rehashed at the current cost, unless it changed in the meantime."""
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(
+            'UPDATE users SET password = %s WHERE id = %s AND password = %s',
+            (new_hash, user_id, old_hash)
+        )
+        conn.commit()
 
 @auth_bp.route('/signup', methods=['POST'])
+@idempotent
 def signup():
     try:
         data = request.get_json()
@@ -31,40 +38,35 @@ def signup():
 
         # If role is 'admin', require admin token
         if role == 'admin':
-            token = request.headers.get('Authorization')
-            if not token:
+            if not request.headers.get('Authorization'):
                 return jsonify({'error': 'Admin token required to create admin user'}), 401
             try:
-                token = token.split(" ")[1] if token.startswith("Bearer ") else token
-                jwt_data = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
-                if jwt_data['role'] != 'admin':
-                    return jsonify({'error': 'Admin access required to create admin user'}), 403
-            except jwt.ExpiredSignatureError:
-                return jsonify({'error': 'Token has expired'}), 401
-            except jwt.InvalidTokenError:
-                return jsonify({'error': 'Invalid token'}), 401
+                requester = authenticate()
+            except AuthError as e:
+                return jsonify({'error': e.message}), e.status
+            if requester.role != 'admin':
+                return jsonify({'error': 'Admin access required to create admin user'}), 403
 
         # Hash password
-        hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
-        
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        try:
-            cursor.execute(
-                'INSERT INTO users (name, email, password, role) VALUES (%s, %s, %s, %s)',
-                (name, email, hashed_password.decode('utf-8'), role)
-            )
-            conn.commit()
-            return jsonify({'message': 'User created successfully'}), 201
-        except pymysql.IntegrityError as e:
-            if "Duplicate entry" in str(e):
-                return jsonify({'error': 'Email already exists'}), 400
-            return jsonify({'error': 'Database error occurred'}), 500
-        finally:
-            cursor.close()
-            conn.close()
-            
+        hashed_password = password_hasher.hash(password)
+
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            try:
+                cursor.execute(
+                    'INSERT INTO users (name, email, password, role) VALUES (%s, %s, %s, %s)',
+                    (name, email, hashed_password, role)
+                )
+                conn.commit()
+                return jsonify({'message': 'User created successfully'}), 201
+            except pymysql.IntegrityError as e:
+                if "Duplicate entry" in str(e):
+                    return jsonify({'error': 'Email already exists'}), 400
+                return jsonify({'error': 'Database error occurred'}), 500
+
+    except PasswordPoolBusy as e:
+        response = jsonify({'error': str(e)})
+        response.headers['Retry-After'] = str(PASSWORD_RETRY_AFTER)
+        return response, 503
     except Exception as e:
         return jsonify({'error': f'Internal server error: {str(e)}'}), 500
 @auth_bp.route('/login', methods=['POST'])
@@ -76,28 +78,33 @@ def login():
         
         if not all([email, password]):
             return jsonify({'error': 'Missing required fields'}), 400
-            
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM users WHERE email = %s', (email,))
-        user = cursor.fetchone()
-        
-        cursor.close()
-        conn.close()
-        
-        if user and bcrypt.checkpw(password.encode('utf-8'), user['password'].encode('utf-8')):
-            # Generate JWT token
-            token = jwt.encode({
-                'user_id': user['id'],
-                'email': user['email'],
-                'role': user['role'],
-                'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=24)
-            }, SECRET_KEY, algorithm='HS256')
-            
+
+        # Before any users lookup or bcrypt work
+        client_ip = request.access_route[0] if RATE_LIMIT_TRUST_FORWARDED else request.remote_addr
+        retry_after = login_limiter.check(client_ip, email)
+        if retry_after:
+            response = jsonify({'error': 'Too many login attempts. Please try again later.'})
+            response.headers['Retry-After'] = str(retry_after)
+            return response, 429
+
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute('SELECT * FROM users WHERE email = %s', (email,))
+            user = cursor.fetchone()
+
+        if user and password_hasher.verify(password, user['password']):
+            login_limiter.succeeded(email)
+            if password_hasher.needs_rehash(user['password']):
+                password_hasher.rehash_in_background(
+                    password,
+                    lambda new_hash: replace_password_hash(user['id'], user['password'], new_hash)
+                )
+
+            # Short-lived access token plus a refresh token for /token/refresh
+            tokens = issue_tokens(user['id'], user['role'])
+
             return jsonify({
                 'message': 'Login successful',
-                'token': token,
+                **tokens,
                 'user': {
                     'id': user['id'],
                     'name': user['name'],
@@ -106,7 +113,42 @@ def login():
                 }
             }), 200
         else:
+            login_limiter.failed(email)
             return jsonify({'error': 'Invalid credentials'}), 401
-            
+
+    except PasswordPoolBusy as e:
+        response = jsonify({'error': str(e)})
+        response.headers['Retry-After'] = str(PASSWORD_RETRY_AFTER)
+        return response, 503
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@auth_bp.route('/token/refresh', methods=['POST'])
+def refresh_token():
+    try:
+        data = request.get_json(silent=True) or {}
+        token = data.get('refresh_token')
+        if not token:
+            return jsonify({'error': 'Missing required field: refresh_token'}), 400
+
+        return jsonify(rotate_refresh_token(token)), 200
+
+    except RefreshTokenError as e:
+        return jsonify({'error': e.message}), 401
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@auth_bp.route('/logout', methods=['POST'])
+def logout():
+    try:
+        data = request.get_json(silent=True) or {}
+        token = data.get('refresh_token')
+        if not token:
+            return jsonify({'error': 'Missing required field: refresh_token'}), 400
+
+        # Unknown tokens are fine too: the session is over either way
+        revoke_refresh_token(token)
+        return jsonify({'message': 'Logged out'}), 200
+
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
@@ -1,46 +1,181 @@
 # middleware.py
-from flask import request, jsonify
+from flask import request, jsonify, g
+from werkzeug.local import LocalProxy
 from functools import wraps
+from collections import OrderedDict, namedtuple
+import threading
+import time
 import jwt
 import os
-from dotenv import load_dotenv
+from database import Config, read_only_connections, recent_writers
+from tokens import ACCESS_TOKEN_SECONDS
 
-load_dotenv()
-
-SECRET_KEY = os.getenv('SECRET_KEY')
+SECRET_KEY = Config.SECRET_KEY
 if not SECRET_KEY:
     raise ValueError("SECRET_KEY environment variable is not set")
 
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10000))
+# Longest lifetime of any token we accept; revocations older than this can be forgotten
+TOKEN_MAX_LIFETIME = ACCESS_TOKEN_SECONDS
+
+CurrentUser = namedtuple('CurrentUser', ['id', 'role'])
+
+class AuthError(Exception):
+    def __init__(self, message, status=401):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+class TokenCache:
+    """LRU cache of verified JWT claims keyed by the raw token.
+
+    Entries expire at the token's own `exp`. revoke_user() evicts a user's
+    cached tokens and rejects every token issued to them before the call.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.revocations = 0
+        self._entries = OrderedDict()
+        self._tokens_by_user = {}
+        self._revoked_at = {}
+        self._lock = threading.Lock()
+
+    def get(self, token):
+        with self._lock:
+            claims = self._entries.get(token)
+            if claims is None or claims['exp'] <= time.time():
+                if claims is not None:
+                    self._evict(token)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return claims
+
+    def put(self, token, claims):
+        with self._lock:
+            self._entries[token] = claims
+            self._entries.move_to_end(token)
+            self._tokens_by_user.setdefault(claims['user_id'], set()).add(token)
+            while len(self._entries) > self.max_size:
+                self._evict(next(iter(self._entries)))
+
+    def revoke_user(self, user_id):
+        now = time.time()
+        with self._lock:
+            for token in list(self._tokens_by_user.get(user_id, ())):
+                self._evict(token)
+            self._revoked_at[user_id] = now
+            self.revocations += 1
+            for uid in [u for u, at in self._revoked_at.items() if now - at > TOKEN_MAX_LIFETIME]:
+                del self._revoked_at[uid]
+
+    def is_revoked(self, claims):
+        revoked_at = self._revoked_at.get(claims['user_id'])
+        # iat has whole-second resolution, so compare against the truncated time
+        return revoked_at is not None and claims.get('iat', 0) < int(revoked_at)
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._entries), 'hits': self.hits, 'misses': self.misses,
+                    'revocations': self.revocations, 'revoked_users': len(self._revoked_at)}
+
+    def _evict(self, token):
+        claims = self._entries.pop(token, None)
+        if claims is not None:
+            tokens = self._tokens_by_user.get(claims['user_id'])
+            if tokens:
+                tokens.discard(token)
+                if not tokens:
+                    del self._tokens_by_user[claims['user_id']]
+
+token_cache = TokenCache(TOKEN_CACHE_SIZE)
+
+def revoke_user_tokens(user_id):
+    """Reject a user's access tokens in this worker after their role changes or the account is deleted.
+
+    Other workers accept them until they expire, at most TOKEN_MAX_LIFETIME
+    seconds; revoke the user's refresh tokens too (tokens.py) so no new ones
+    are issued.
+    """
+    token_cache.revoke_user(user_id)
+
+def authenticate():
+    """Verify the request's bearer token and set g.current_user.
+
+    Raises AuthError with the message and status code to return.
+    """
+    g.current_user = verify_token(request.headers.get('Authorization'))
+    return g.current_user
+
+def verify_token(token):
+    """Return the CurrentUser for an Authorization header value, outside any Flask request.
+
+    Raises AuthError with the message and status code to return.
+    """
+    if not token:
+        raise AuthError('Token is missing')
+    token = token.split(" ")[1] if token.startswith("Bearer ") else token
+
+    claims = token_cache.get(token)
+    if claims is None:
+        try:
+            claims = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
+        except jwt.ExpiredSignatureError:
+            raise AuthError('Token has expired')
+        except jwt.InvalidTokenError:
+            raise AuthError('Invalid token')
+        if 'exp' not in claims or 'user_id' not in claims:
+            raise AuthError('Invalid token')
+        # Refuse long-lived tokens (the old 24-hour logins) so revocation takes effect in time
+        if claims['exp'] - claims.get('iat', 0) > TOKEN_MAX_LIFETIME:
+            raise AuthError('Token has expired')
+        token_cache.put(token, claims)
+
+    if token_cache.is_revoked(claims):
+        raise AuthError('Token has been revoked')
+
+    return CurrentUser(claims['user_id'], claims.get('role'))
+
+current_user = LocalProxy(lambda: g.get('current_user'))
+
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = request.headers.get('Authorization')
-        if not token:
-            return jsonify({'error': 'Token is missing'}), 401
         try:
-            token = token.split(" ")[1] if token.startswith("Bearer ") else token
-            data = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
-            return f(user_id=data['user_id'], *args, **kwargs)  # Pass user_id to route
-        except jwt.ExpiredSignatureError:
-            return jsonify({'error': 'Token has expired'}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({'error': 'Invalid token'}), 401
+            user = authenticate()
+        except AuthError as e:
+            return jsonify({'error': e.message}), e.status
+        return f(user_id=user.id, *args, **kwargs)  # Pass user_id to route
     return decorated
 
 def admin_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = request.headers.get('Authorization')
-        if not token:
-            return jsonify({'error': 'Token is missing'}), 401
         try:
-            token = token.split(" ")[1] if token.startswith("Bearer ") else token
-            data = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
-            if data['role'] != 'admin':
-                return jsonify({'error': 'Admin access required'}), 403
-            return f(user_id=data['user_id'], *args, **kwargs)  # Pass user_id to route
-        except jwt.ExpiredSignatureError:
-            return jsonify({'error': 'Token has expired'}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({'error': 'Invalid token'}), 401
-    return decorated
\ No newline at end of file
+            user = authenticate()
+        except AuthError as e:
+            return jsonify({'error': e.message}), e.status
+        if user.role != 'admin':
+            return jsonify({'error': 'Admin access required'}), 403
+        return f(user_id=user.id, *args, **kwargs)  # Pass user_id to route
+    return decorated
+
+def read_only(f):
+    """Serve the route's queries from a read replica (see database.ReplicaSet).
+
+    Apply below token_required / admin_required. Users who booked or
+    cancelled within REPLICA_STICKY_SECONDS keep reading from the primary,
+    so they see their own changes.
+    """
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        user = g.get('current_user')
+        if user is not None and recent_writers.wrote_recently(user.id):
+            return f(*args, **kwargs)
+        with read_only_connections():
+            return f(*args, **kwargs)
+    return decorated
@@ -1,22 +1,25 @@
-from flask import Blueprint, request, jsonify
-from database import get_db_connection
+from flask import Blueprint, Response, request, jsonify, url_for
+from database import get_db_connection, recent_writers
+from availability import availability_index, seconds_to_str, to_seconds, free_intervals
+from bookings import record_booking, settle_pending_booking
+from payments import enqueue_payment, cancel_payment_intent, get_payment_status
+from holds import (hold_index, HoldError, HOLD_SECONDS, HOLD_MAX_SECONDS, lock_venue_days, find_live_hold,
+                   find_live_holds, create_hold, consume_hold, delete_hold)
+from rollups import add_booking_stats, remove_booking_stats
+from venue_cache import venue_catalog
+from serializers import timedelta_to_str, booking_columns, iso_datetime_sql, fetch_serialized
 import pymysql
 from datetime import datetime, date, timedelta
-import random
+import uuid
 from .middleware import token_required, admin_required
-import bcrypt
+from passwords import password_hasher, PasswordPoolBusy, PASSWORD_RETRY_AFTER
+from idempotency import idempotent
 import logging
 
 user_bp = Blueprint('user', __name__)
 
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-def simulate_payment(amount):
-    success = random.random() < 0.7
-    status = 'success' if success else 'failed'
-    return success, status
-
 def validate_time_format(time_str):
     """Validate time string format (HH:MM)."""
     try:
@@ -25,6 +28,19 @@ def validate_time_format(time_str):
     except ValueError:
         return False
 
+def validate_booking_slot(booking_date, start_time, end_time):
+    """Validate a requested booking slot. Returns an error message or None."""
+    try:
+        if datetime.strptime(booking_date, '%Y-%m-%d').date() <= date.today():
+            return 'Booking date must be in the future'
+    except (TypeError, ValueError):
+        return 'Invalid date format. Use YYYY-MM-DD'
+    if not validate_time_format(start_time) or not validate_time_format(end_time):
+        return 'Invalid time format. Use HH:MM for start_time and end_time'
+    if datetime.strptime(start_time, '%H:%M') >= datetime.strptime(end_time, '%H:%M'):
+        return 'start_time must be before end_time'
+    return None
+
 def check_time_slot_overlap(cursor, venue_id, booking_date, start_time, end_time):
     """Check if the requested time slot overlaps with existing bookings."""
     try:
@@ -45,42 +61,189 @@ def check_time_slot_overlap(cursor, venue_id, booking_date, start_time, end_time
     except Exception as e:
         return False, str(e)
 
-def timedelta_to_str(td):
-    """Convert timedelta to HH:MM string."""
-    if td is None:
-        return None
-    total_seconds = int(td.total_seconds())
-    hours = total_seconds // 3600
-    minutes = (total_seconds % 3600) // 60
-    return f"{hours:02d}:{minutes:02d}"
+def check_known_overlap(venue_id, booking_date, start_time, end_time):
+    """Check the requested time slot against the in-process availability index."""
+    overlap = availability_index.find_overlap(venue_id, booking_date, start_time, end_time)
+    if overlap:
+        existing_start, existing_end, _ = overlap
+        return False, f"Time slot {start_time}-{end_time} overlaps with existing booking {seconds_to_str(existing_start)}-{seconds_to_str(existing_end)}"
+    return True, None
 
 @user_bp.route('/venues', methods=['GET'])
 @token_required
 def get_venues(user_id):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT id, name, location, capacity, price, created_at FROM venues')
-        venues = cursor.fetchall()
-        
-        cursor.close()
-        conn.close()
+        body, etag = venue_catalog.get()
+
         logger.info("Venues fetched successfully for user_id=%s", user_id)
-        return jsonify({'venues': [
-            {
-                **venue,
-                'created_at': venue['created_at'].isoformat() if venue['created_at'] else None
-            } for venue in venues
-        ]}), 200
+        response = Response(body, mimetype='application/json')
+        response.set_etag(etag)
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
         
     except Exception as e:
         logger.error("Error fetching venues: %s", str(e))
         return jsonify({'error': str(e)}), 500
 
+MAX_AVAILABILITY_DAYS = 62
+
+@user_bp.route('/venues/<int:venue_id>/availability', methods=['GET'])
+@token_required
+def get_venue_availability(user_id, venue_id):
+    """Free time ranges of a venue per day, as [start, end] HH:MM pairs."""
+    try:
+        from_str = request.args.get('from')
+        to_str = request.args.get('to')
+        slot_minutes = request.args.get('slot_minutes', '30')
+
+        try:
+            from_date = datetime.strptime(from_str, '%Y-%m-%d').date() if from_str else date.today()
+            to_date = datetime.strptime(to_str, '%Y-%m-%d').date() if to_str else from_date + timedelta(days=6)
+        except ValueError:
+            return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD for from and to'}), 400
+        if to_date < from_date:
+            return jsonify({'error': 'from must not be after to'}), 400
+        if (to_date - from_date).days >= MAX_AVAILABILITY_DAYS:
+            return jsonify({'error': f'Date range cannot exceed {MAX_AVAILABILITY_DAYS} days'}), 400
+        if not slot_minutes.isdigit() or not 1 <= int(slot_minutes) <= 1440:
+            return jsonify({'error': 'slot_minutes must be an integer between 1 and 1440'}), 400
+        slot_minutes = int(slot_minutes)
+
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute('SELECT id FROM venues WHERE id = %s', (venue_id,))
+            if not cursor.fetchone():
+                return jsonify({'error': 'Venue not found'}), 404
+
+            cursor.execute(
+                '''
+                SELECT booking_date, start_time, end_time FROM bookings
+                WHERE venue_id = %s AND booking_date BETWEEN %s AND %s AND status != 'cancelled'
+                ''',
+                (venue_id, from_date, to_date)
+            )
+            bookings = cursor.fetchall()
+
+        booked_by_day = {}
+        for booking in bookings:
+            booked_by_day.setdefault(booking['booking_date'], []).append(
+                (to_seconds(booking['start_time']), to_seconds(booking['end_time']))
+            )
+
+        days = []
+        day = from_date
+        while day <= to_date:
+            free = free_intervals(booked_by_day.get(day, ()), min_length=slot_minutes * 60)
+            days.append({
+                'date': day.isoformat(),
+                'free': [[seconds_to_str(start), seconds_to_str(end)] for start, end in free]
+            })
+            day += timedelta(days=1)
+
+        response = jsonify({
+            'venue_id': venue_id,
+            'from': from_date.isoformat(),
+            'to': to_date.isoformat(),
+            'slot_minutes': slot_minutes,
+            'days': days
+        })
+        # Clients poll this; let them revalidate with If-None-Match and get a bodiless 304
+        response.add_etag()
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+
+    except Exception as e:
+        logger.error("Error fetching venue availability: %s", str(e))
+        return jsonify({'error': str(e)}), 500
+
+@user_bp.route('/holds', methods=['POST'])
+@token_required
+def create_slot_hold(user_id):
+    """Hold a venue time slot for `ttl` seconds (default HOLD_SECONDS) so it can be booked with its hold_id."""
+    try:
+        data = request.get_json() or {}
+        venue_id = data.get('venue_id')
+        booking_date = data.get('booking_date')
+        start_time = data.get('start_time')
+        end_time = data.get('end_time')
+        ttl = data.get('ttl', HOLD_SECONDS)
+
+        if not all([venue_id, booking_date, start_time, end_time]):
+            return jsonify({'error': 'Missing required fields: venue_id, booking_date, start_time, and end_time are required'}), 400
+        slot_error = validate_booking_slot(booking_date, start_time, end_time)
+        if slot_error:
+            return jsonify({'error': slot_error}), 400
+        if not isinstance(ttl, int) or isinstance(ttl, bool) or not 0 < ttl <= HOLD_MAX_SECONDS:
+            return jsonify({'error': f'ttl must be an integer between 1 and {HOLD_MAX_SECONDS} seconds'}), 400
+
+        # Losers of a race for a popular slot are turned away here, from memory
+        is_valid, error_message = check_known_overlap(venue_id, booking_date, start_time, end_time)
+        if not is_valid:
+            return jsonify({'error': error_message}), 409
+        hold_id = str(uuid.uuid4())
+        if hold_index.claim(hold_id, venue_id, booking_date, start_time, end_time, ttl):
+            return jsonify({'error': f"Time slot {start_time}-{end_time} is currently held by another user"}), 409
+
+        try:
+            with get_db_connection() as conn, conn.cursor() as cursor:
+                try:
+                    conn.begin()
+                    lock_venue_days(cursor, [(venue_id, booking_date)])
+                    create_hold(cursor, hold_id, user_id, venue_id, booking_date, start_time, end_time, ttl)
+                    # Only now look at bookings, so every booking committed before our units is visible
+                    is_valid, error_message = check_time_slot_overlap(cursor, venue_id, booking_date, start_time, end_time)
+                    if not is_valid:
+                        conn.rollback()
+                        availability_index.invalidate(venue_id, booking_date)
+                        hold_index.release(hold_id, venue_id, booking_date)
+                        return jsonify({'error': error_message}), 409
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+        except HoldError as e:
+            hold_index.release(hold_id, venue_id, booking_date)
+            logger.warning("Hold rejected: venue_id=%s, booking_date=%s, error=%s", venue_id, booking_date, e.message)
+            return jsonify({'error': e.message}), e.status
+        except Exception:
+            hold_index.release(hold_id, venue_id, booking_date)
+            raise
+
+        logger.info("Slot held: hold_id=%s, venue_id=%s, booking_date=%s, %s-%s", hold_id, venue_id, booking_date, start_time, end_time)
+        return jsonify({
+            'hold': {
+                'id': hold_id,
+                'venue_id': venue_id,
+                'booking_date': booking_date,
+                'start_time': start_time,
+                'end_time': end_time,
+                'expires_in': ttl
+            }
+        }), 201
+
+    except Exception as e:
+        logger.error("Error creating hold: %s", str(e))
+        return jsonify({'error': str(e)}), 500
+
+@user_bp.route('/holds/<hold_id>', methods=['DELETE'])
+@token_required
+def release_slot_hold(user_id, hold_id):
+    try:
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            released = delete_hold(cursor, hold_id, user_id)
+            conn.commit()
+
+        if not released:
+            return jsonify({'error': 'Hold not found'}), 404
+        hold_index.release(hold_id, *released)
+        return jsonify({'message': 'Hold released'}), 200
+
+    except Exception as e:
+        logger.error("Error releasing hold: %s", str(e))
+        return jsonify({'error': str(e)}), 500
+
 @user_bp.route('/bookings', methods=['POST'])
+@idempotent
 def create_booking():
-    logger.debug("Received booking request: %s", request.get_json())
     try:
         data = request.get_json()
         user_id = data.get('user_id')
@@ -88,6 +251,7 @@ def create_booking():
         booking_date = data.get('booking_date')
         start_time = data.get('start_time')
         end_time = data.get('end_time')
+        hold_id = data.get('hold_id')
 
         logger.debug("Parsed data: user_id=%s, venue_id=%s, booking_date=%s, start_time=%s, end_time=%s", 
                      user_id, venue_id, booking_date, start_time, end_time)
@@ -97,155 +261,416 @@ def create_booking():
                           user_id, venue_id, booking_date, start_time, end_time)
             return jsonify({'error': 'Missing required fields: user_id, venue_id, booking_date, start_time, and end_time are required'}), 400
 
-        try:
-            booking_date_dt = datetime.strptime(booking_date, '%Y-%m-%d').date()
-            if booking_date_dt <= date.today():
-                logger.warning("Booking date must be in the future: booking_date=%s", booking_date)
-                return jsonify({'error': 'Booking date must be in the future'}), 400
-        except ValueError:
-            logger.warning("Invalid date format: %s", booking_date)
-            return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
-
-        if not validate_time_format(start_time) or not validate_time_format(end_time):
-            logger.warning("Invalid time format: start_time=%s, end_time=%s", start_time, end_time)
-            return jsonify({'error': 'Invalid time format. Use HH:MM for start_time and end_time'}), 400
-
-        # Validate that start_time is before end_time
-        start_dt = datetime.strptime(start_time, '%H:%M')
-        end_dt = datetime.strptime(end_time, '%H:%M')
-        if start_dt >= end_dt:
-            logger.warning("Invalid time range: start_time=%s is not before end_time=%s", start_time, end_time)
-            return jsonify({'error': 'start_time must be before end_time'}), 400
+        slot_error = validate_booking_slot(booking_date, start_time, end_time)
+        if slot_error:
+            logger.warning("Invalid booking slot: booking_date=%s, start_time=%s, end_time=%s, error=%s",
+                          booking_date, start_time, end_time, slot_error)
+            return jsonify({'error': slot_error}), 400
+
+        # Reject overlaps with bookings we already know about without touching the database
+        is_valid, error_message = check_known_overlap(venue_id, booking_date, start_time, end_time)
+        if not is_valid:
+            logger.warning("Time slot overlap (index): venue_id=%s, booking_date=%s, start_time=%s, end_time=%s",
+                          venue_id, booking_date, start_time, end_time)
+            return jsonify({'error': error_message}), 409
+        hold_conflict = hold_index.find_conflict(venue_id, booking_date, start_time, end_time, hold_id)
+        if hold_conflict:
+            logger.warning("Time slot held (index): venue_id=%s, booking_date=%s, start_time=%s, end_time=%s",
+                          venue_id, booking_date, start_time, end_time)
+            return jsonify({'error': f"Time slot {start_time}-{end_time} is currently held by another user"}), 409
+
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            try:
+                conn.begin()
+
+                # Lock the venue's day first: holds and concurrent bookings of it
+                # wait here, before any overlap check or payment work
+                lock_venue_days(cursor, [(venue_id, booking_date)])
+                if hold_id:
+                    consume_hold(cursor, hold_id, user_id, venue_id, booking_date, start_time, end_time)
+                elif find_live_hold(cursor, venue_id, booking_date, start_time, end_time):
+                    conn.rollback()
+                    logger.warning("Time slot held: venue_id=%s, booking_date=%s, start_time=%s, end_time=%s",
+                                  venue_id, booking_date, start_time, end_time)
+                    return jsonify({'error': f"Time slot {start_time}-{end_time} is currently held by another user"}), 409
+
+                # Check for time slot overlap against the database
+                if availability_index.is_fresh(venue_id, booking_date):
+                    is_valid, error_message = check_time_slot_overlap(cursor, venue_id, booking_date, start_time, end_time)
+                    if not is_valid:
+                        # Another worker booked this day since we loaded it
+                        availability_index.invalidate(venue_id, booking_date)
+                else:
+                    availability_index.load_day(cursor, venue_id, booking_date)
+                    is_valid, error_message = check_known_overlap(venue_id, booking_date, start_time, end_time)
+                if not is_valid:
+                    conn.rollback()
+                    logger.warning("Time slot overlap: venue_id=%s, booking_date=%s, start_time=%s, end_time=%s, error=%s", 
+                                  venue_id, booking_date, start_time, end_time, error_message)
+                    return jsonify({'error': error_message}), 409
+
+                # Venue price and user existence in one round-trip
+                cursor.execute(
+                    'SELECT (SELECT price FROM venues WHERE id = %s) AS price, '
+                    'EXISTS(SELECT 1 FROM users WHERE id = %s) AS user_exists',
+                    (venue_id, user_id)
+                )
+                lookup = cursor.fetchone()
+                if lookup['price'] is None:
+                    conn.rollback()
+                    logger.warning("Venue not found: venue_id=%s", venue_id)
+                    return jsonify({'error': 'Venue not found'}), 404
+                if not lookup['user_exists']:
+                    conn.rollback()
+                    logger.warning("User not found: user_id=%s", user_id)
+                    return jsonify({'error': 'User not found'}), 404
+
+                # The booking holds its slot as pending; a payment worker charges it after we commit
+                booking_id, booking_status = record_booking(
+                    cursor, user_id, venue_id, booking_date, start_time, end_time, lookup['price'], 'pending'
+                )
+                enqueue_payment(cursor, booking_id, lookup['price'])
 
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        try:
-            conn.begin()
+                conn.commit()
+                recent_writers.mark(user_id)
+                availability_index.add(booking_id, venue_id, booking_date, start_time, end_time)
+                if hold_id:
+                    hold_index.release(hold_id, venue_id, booking_date)
+                logger.info("Booking created: booking_id=%s, status=%s", booking_id, booking_status)
+
+                status_url = url_for('user.get_booking_payment', booking_id=booking_id)
+                response = jsonify({
+                    'message': 'Booking reserved, payment is being processed',
+                    'booking': {
+                        'id': booking_id,
+                        'user_id': user_id,
+                        'venue_id': venue_id,
+                        'booking_date': booking_date,
+                        'start_time': start_time,
+                        'end_time': end_time,
+                        'status': booking_status,
+                        'is_cancelled': False,
+                        'is_refunded': False
+                    },
+                    'payment_status_url': status_url
+                })
+                response.headers['Location'] = status_url
+                return response, 202
 
-            # Check for time slot overlap
-            is_valid, error_message = check_time_slot_overlap(cursor, venue_id, booking_date, start_time, end_time)
-            if not is_valid:
+            except HoldError as e:
                 conn.rollback()
-                logger.warning("Time slot overlap: venue_id=%s, booking_date=%s, start_time=%s, end_time=%s, error=%s", 
-                              venue_id, booking_date, start_time, end_time, error_message)
-                return jsonify({'error': error_message}), 409
+                logger.warning("Hold not usable: hold_id=%s, error=%s", hold_id, e.message)
+                return jsonify({'error': e.message}), e.status
 
-            cursor.execute('SELECT id, price FROM venues WHERE id = %s', (venue_id,))
-            venue = cursor.fetchone()
-            if not venue:
+            except pymysql.IntegrityError as e:
                 conn.rollback()
-                logger.warning("Venue not found: venue_id=%s", venue_id)
-                return jsonify({'error': 'Venue not found'}), 404
+                logger.error("Database IntegrityError: %s", str(e))
+                return jsonify({'error': 'A booking for this venue, date, and exact time slot already exists'}), 409
 
-            cursor.execute('SELECT id FROM users WHERE id = %s', (user_id,))
-            user = cursor.fetchone()
-            if not user:
+            except Exception as e:
                 conn.rollback()
-                logger.warning("User not found: user_id=%s", user_id)
-                return jsonify({'error': 'User not found'}), 404
+                logger.error("Database error: %s", str(e))
+                return jsonify({'error': str(e)}), 500
 
-            cursor.execute(
-                'INSERT INTO bookings (user_id, venue_id, booking_date, start_time, end_time, status) VALUES (%s, %s, %s, %s, %s, %s)',
-                (user_id, venue_id, booking_date, start_time, end_time, 'pending')
-            )
+    except Exception as e:
+        logger.error("Unexpected error in create_booking: %s", str(e))
+        return jsonify({'error': str(e)}), 500
 
-            booking_id = cursor.lastrowid
+@user_bp.route('/bookings/<int:booking_id>/payment', methods=['GET'])
+@token_required
+def get_booking_payment(user_id, booking_id):
+    """Poll the payment of a booking created with a 202 response."""
+    try:
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            status = get_payment_status(cursor, booking_id, user_id)
 
-            cursor.execute(
-                'INSERT INTO payments (booking_id, amount, status) VALUES (%s, %s, %s)',
-                (booking_id, venue['price'], 'pending')
-            )
+        if not status:
+            return jsonify({'error': 'Booking not found or you do not have permission to view it'}), 404
 
-            payment_success, payment_status = simulate_payment(venue['price'])
-            logger.debug("Payment simulation: success=%s, status=%s", payment_success, payment_status)
+        for column in ('next_attempt_at', 'expires_at', 'updated_at'):
+            if status[column]:
+                status[column] = status[column].isoformat()
+        status['is_final'] = status['booking_status'] != 'pending'
+        response = jsonify(status)
+        if not status['is_final']:
+            response.headers['Retry-After'] = '1'
+        return response, 200
 
-            cursor.execute(
-                'UPDATE payments SET status = %s WHERE booking_id = %s',
-                (payment_status, booking_id)
-            )
+    except Exception as e:
+        logger.error("Error fetching payment status: %s", str(e))
+        return jsonify({'error': str(e)}), 500
+
+MAX_BATCH_SIZE = 100
+BATCH_MODES = ('all_or_nothing', 'partial')
+
+def find_batch_overlaps(slots):
+    """Return {position: error} for slots overlapping an earlier-starting slot of the same batch."""
+    overlaps = {}
+    by_day = {}
+    for position, slot in enumerate(slots):
+        by_day.setdefault((str(slot['venue_id']), slot['booking_date']), []).append(position)
+    for positions in by_day.values():
+        positions.sort(key=lambda p: (to_seconds(slots[p]['start_time']), p))
+        last = None
+        for position in positions:
+            slot = slots[position]
+            if last is not None and to_seconds(slot['start_time']) < to_seconds(slots[last]['end_time']):
+                overlaps[position] = (
+                    f"Time slot {slot['start_time']}-{slot['end_time']} overlaps with "
+                    f"{slots[last]['start_time']}-{slots[last]['end_time']} in the same batch"
+                )
+            else:
+                last = position
+    return overlaps
+
+def find_overlapping_bookings(cursor, slots):
+    """Fetch existing bookings overlapping any of the given slots in a single query."""
+    condition = '(venue_id = %s AND booking_date = %s AND start_time < %s AND end_time > %s)'
+    params = []
+    for slot in slots:
+        params += [slot['venue_id'], slot['booking_date'], slot['end_time'], slot['start_time']]
+    cursor.execute(
+        f"""
+        SELECT venue_id, booking_date, start_time, end_time FROM bookings
+        WHERE status != 'cancelled' AND ({' OR '.join([condition] * len(slots))})
+        """,
+        params
+    )
+    return cursor.fetchall()
+
+@user_bp.route('/bookings/batch', methods=['POST'])
+def create_bookings_batch():
+    """
+    Book many (venue, date, time slot) combinations in one transaction.
+    mode=all_or_nothing books every slot or none of them; mode=partial books
+    what it can. Like create_booking, bookings are written as pending and
+    each one's payment is queued for the payment workers.
+    """
+    try:
+        data = request.get_json()
+        user_id = data.get('user_id')
+        mode = data.get('mode', 'all_or_nothing')
+        items = data.get('bookings')
+
+        if not user_id or not isinstance(items, list) or not items:
+            return jsonify({'error': 'Missing required fields: user_id and a non-empty bookings list are required'}), 400
+        if mode not in BATCH_MODES:
+            return jsonify({'error': 'Invalid mode. Must be all_or_nothing or partial'}), 400
+        if len(items) > MAX_BATCH_SIZE:
+            return jsonify({'error': f'A batch can contain at most {MAX_BATCH_SIZE} bookings'}), 400
+
+        results = [None] * len(items)
+        slots = []
+
+        def fail(position, http_status, error):
+            results[position] = {'index': position, 'status': 'failed', 'http_status': http_status, 'error': error}
+
+        def respond(created):
+            failures = [r for r in results if r and r['status'] != 'pending']
+            if mode == 'all_or_nothing' and failures:
+                for position, result in enumerate(results):
+                    if result is None or result['status'] == 'pending':
+                        results[position] = {'index': position, 'status': 'aborted', 'http_status': 424,
+                                             'error': 'Not booked because another booking in the batch failed'}
+            status_code = 202 if created else next(r['http_status'] for r in failures)
+            return jsonify({
+                'mode': mode,
+                'created': created,
+                'failed': len(items) - created,
+                'results': results
+            }), status_code
+
+        # Validate every slot on its own, then against the in-memory index and each other
+        for position, item in enumerate(items):
+            item = item if isinstance(item, dict) else {}
+            slot = {
+                'venue_id': item.get('venue_id', data.get('venue_id')),
+                'booking_date': item.get('booking_date'),
+                'start_time': item.get('start_time'),
+                'end_time': item.get('end_time')
+            }
+            slots.append(slot)
+            if not all(slot.values()):
+                fail(position, 400, 'Missing required fields: venue_id, booking_date, start_time, and end_time are required')
+                continue
+            slot_error = validate_booking_slot(slot['booking_date'], slot['start_time'], slot['end_time'])
+            if slot_error:
+                fail(position, 400, slot_error)
+                continue
+            slot['booking_date'] = datetime.strptime(slot['booking_date'], '%Y-%m-%d').date().isoformat()
+            is_valid, error_message = check_known_overlap(**slot)
+            if not is_valid:
+                fail(position, 409, error_message)
+            elif hold_index.find_conflict(**slot):
+                fail(position, 409, f"Time slot {slot['start_time']}-{slot['end_time']} is currently held by another user")
+
+        valid = [p for p in range(len(items)) if results[p] is None]
+        for offset, error_message in find_batch_overlaps([slots[p] for p in valid]).items():
+            fail(valid[offset], 409, error_message)
+
+        pending = [p for p in range(len(items)) if results[p] is None]
+        if not pending or (mode == 'all_or_nothing' and len(pending) < len(items)):
+            logger.warning("Batch booking rejected before touching the database: user_id=%s", user_id)
+            return respond(0)
+
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            try:
+                conn.begin()
+
+                # Lock every day of the batch before reading anything, as create_booking does
+                lock_venue_days(cursor, [(slots[p]['venue_id'], slots[p]['booking_date']) for p in pending])
+
+                cursor.execute('SELECT id FROM users WHERE id = %s', (user_id,))
+                if not cursor.fetchone():
+                    conn.rollback()
+                    logger.warning("User not found: user_id=%s", user_id)
+                    return jsonify({'error': 'User not found'}), 404
+
+                venue_ids = sorted({str(slots[p]['venue_id']) for p in pending})
+                cursor.execute(
+                    f"SELECT id, price FROM venues WHERE id IN ({', '.join(['%s'] * len(venue_ids))})",
+                    venue_ids
+                )
+                prices = {str(row['id']): row['price'] for row in cursor.fetchall()}
+                for p in pending:
+                    if str(slots[p]['venue_id']) not in prices:
+                        fail(p, 404, 'Venue not found')
+
+                # Live holds of the batch's days, in one query
+                pending = [p for p in pending if results[p] is None]
+                days = {(str(slots[p]['venue_id']), slots[p]['booking_date']) for p in pending}
+                holds = find_live_holds(cursor, days) if days else []
+                for p in pending:
+                    slot = slots[p]
+                    start, end = to_seconds(slot['start_time']), to_seconds(slot['end_time'])
+                    if any(str(hold['venue_id']) == str(slot['venue_id'])
+                           and hold['booking_date'].isoformat() == slot['booking_date']
+                           and to_seconds(hold['start_time']) < end and to_seconds(hold['end_time']) > start
+                           for hold in holds):
+                        fail(p, 409, f"Time slot {slot['start_time']}-{slot['end_time']} is currently held by another user")
+
+                # One set-based overlap check for the whole batch
+                pending = [p for p in pending if results[p] is None]
+                existing = find_overlapping_bookings(cursor, [slots[p] for p in pending]) if pending else []
+                for p in pending:
+                    slot = slots[p]
+                    start, end = to_seconds(slot['start_time']), to_seconds(slot['end_time'])
+                    for booking in existing:
+                        if (str(booking['venue_id']) == str(slot['venue_id'])
+                                and booking['booking_date'].isoformat() == slot['booking_date']
+                                and to_seconds(booking['start_time']) < end
+                                and to_seconds(booking['end_time']) > start):
+                            fail(p, 409, f"Time slot {slot['start_time']}-{slot['end_time']} overlaps with existing booking "
+                                         f"{timedelta_to_str(booking['start_time'])}-{timedelta_to_str(booking['end_time'])}")
+                            break
+
+                pending = [p for p in pending if results[p] is None]
+                if not pending or (mode == 'all_or_nothing' and len(pending) < len(items)):
+                    conn.rollback()
+                    return respond(0)
+
+                cursor.execute(
+                    'INSERT INTO bookings (user_id, venue_id, booking_date, start_time, end_time, status) VALUES '
+                    + ', '.join(['(%s, %s, %s, %s, %s, %s)'] * len(pending)),
+                    [value for p in pending for value in (
+                        user_id, slots[p]['venue_id'], slots[p]['booking_date'],
+                        slots[p]['start_time'], slots[p]['end_time'], 'pending'
+                    )]
+                )
+                # Auto-increment ids of a multi-row INSERT are not guaranteed to be
+                # consecutive, so read them back by their (venue, date, start) key
+                cursor.execute(
+                    'SELECT id, venue_id, booking_date, start_time FROM bookings WHERE user_id = %s AND id >= %s',
+                    (user_id, cursor.lastrowid)
+                )
+                booking_ids = {
+                    (str(row['venue_id']), row['booking_date'].isoformat(), to_seconds(row['start_time'])): row['id']
+                    for row in cursor.fetchall()
+                }
+                for p in pending:
+                    slots[p]['id'] = booking_ids[(str(slots[p]['venue_id']), slots[p]['booking_date'], to_seconds(slots[p]['start_time']))]
+
+                cursor.execute(
+                    'INSERT INTO payments (booking_id, amount, status) VALUES '
+                    + ', '.join(['(%s, %s, %s)'] * len(pending)),
+                    [value for p in pending for value in (slots[p]['id'], prices[str(slots[p]['venue_id'])], 'pending')]
+                )
+                add_booking_stats(cursor, [slots[p]['id'] for p in pending])
+                # The bookings hold their slots as pending; payment workers charge them after we commit
+                for p in pending:
+                    enqueue_payment(cursor, slots[p]['id'], prices[str(slots[p]['venue_id'])])
 
-            if not payment_success:
-                # Delete booking instead of marking as cancelled
-                cursor.execute('DELETE FROM bookings WHERE id = %s', (booking_id,))
                 conn.commit()
-                logger.info("Booking deleted due to payment failure: booking_id=%s", booking_id)
-                return jsonify({
-                    'error': 'Payment failed, booking deleted. Please try again.',
-                    'booking': {
-                        'id': booking_id,
-                        'user_id': user_id,
-                        'venue_id': venue_id,
-                        'booking_date': booking_date,
-                        'start_time': start_time,
-                        'end_time': end_time,
-                        'status': 'deleted',
-                        'is_cancelled': True,
-                        'is_refunded': False
-                    }
-                }), 400
 
-            cursor.execute('UPDATE bookings SET status = %s WHERE id = %s', ('confirmed', booking_id))
+            except HoldError as e:
+                conn.rollback()
+                return jsonify({'error': e.message}), e.status
 
-            conn.commit()
-            logger.info("Booking created successfully: booking_id=%s", booking_id)
+            except pymysql.IntegrityError as e:
+                conn.rollback()
+                logger.error("Database IntegrityError: %s", str(e))
+                return jsonify({'error': 'A booking for this venue, date, and exact time slot already exists'}), 409
 
-            return jsonify({
-                'message': 'Booking and payment processed successfully',
+            except Exception as e:
+                conn.rollback()
+                logger.error("Database error: %s", str(e))
+                return jsonify({'error': str(e)}), 500
+
+        if pending:
+            recent_writers.mark(user_id)
+        for p in pending:
+            slot = slots[p]
+            availability_index.add(slot['id'], slot['venue_id'], slot['booking_date'], slot['start_time'], slot['end_time'])
+            results[p] = {
+                'index': p,
+                'status': 'pending',
+                'http_status': 202,
+                'payment_status_url': url_for('user.get_booking_payment', booking_id=slot['id']),
                 'booking': {
-                    'id': booking_id,
+                    'id': slot['id'],
                     'user_id': user_id,
-                    'venue_id': venue_id,
-                    'booking_date': booking_date,
-                    'start_time': start_time,
-                    'end_time': end_time,
-                    'status': 'confirmed',
+                    'venue_id': slot['venue_id'],
+                    'booking_date': slot['booking_date'],
+                    'start_time': slot['start_time'],
+                    'end_time': slot['end_time'],
+                    'status': 'pending',
                     'is_cancelled': False,
                     'is_refunded': False
                 }
-            }), 201
-
-        except pymysql.IntegrityError as e:
-            conn.rollback()
-            logger.error("Database IntegrityError: %s", str(e))
-            return jsonify({'error': 'A booking for this venue, date, and exact time slot already exists'}), 409
-
-        except Exception as e:
-            conn.rollback()
-            logger.error("Database error: %s", str(e))
-            return jsonify({'error': str(e)}), 500
-        finally:
-            cursor.close()
-            conn.close()
+            }
+        logger.info("Batch booking created: user_id=%s, created=%s, requested=%s", user_id, len(pending), len(items))
+        return respond(len(pending))
 
     except Exception as e:
-        logger.error("Unexpected error in create_booking: %s", str(e))
+        logger.error("Unexpected error in create_bookings_batch: %s", str(e))
         return jsonify({'error': str(e)}), 500
 
+PROFILE_QUERY = 'SELECT id, name, email, role, created_at FROM users WHERE id = %s'
+
+def shape_profile(user):
+    return {
+        'profile': {
+            'id': user['id'],
+            'name': user['name'],
+            'email': user['email'],
+            'role': user['role'],
+            'created_at': user['created_at'].isoformat() if user['created_at'] else None
+        }
+    }
+
 @user_bp.route('/profile', methods=['GET'])
 @token_required
 def get_profile(user_id):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT id, name, email, role, created_at FROM users WHERE id = %s', (user_id,))
-        user = cursor.fetchone()
-        cursor.close()
-        conn.close()
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute(PROFILE_QUERY, (user_id,))
+            user = cursor.fetchone()
 
         if not user:
             logger.warning("User not found: user_id=%s", user_id)
             return jsonify({'error': 'User not found'}), 404
 
-        return jsonify({
-            'profile': {
-                'id': user['id'],
-                'name': user['name'],
-                'email': user['email'],
-                'role': user['role'],
-                'created_at': user['created_at'].isoformat() if user['created_at'] else None
-            }
-        }), 200
+        return jsonify(shape_profile(user)), 200
 
     except Exception as e:
         logger.error("Error fetching profile: %s", str(e))
@@ -263,86 +688,71 @@ def update_profile(user_id):
             logger.warning("No fields to update for user_id=%s", user_id)
             return jsonify({'error': 'At least one field (name or password) must be provided'}), 400
 
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        # Hash before checking out a connection so it is not held during bcrypt
+        hashed_password = password_hasher.hash(password) if password else None
 
-        if name:
-            cursor.execute('UPDATE users SET name = %s WHERE id = %s', (name, user_id))
-        
-        if password:
-            hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
-            cursor.execute('UPDATE users SET password = %s WHERE id = %s', (hashed_password.decode('utf-8'), user_id))
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            if name:
+                cursor.execute('UPDATE users SET name = %s WHERE id = %s', (name, user_id))
+
+            if hashed_password:
+                cursor.execute('UPDATE users SET password = %s WHERE id = %s', (hashed_password, user_id))
+
+            conn.commit()
 
-        conn.commit()
-        cursor.close()
-        conn.close()
         logger.info("Profile updated successfully for user_id=%s", user_id)
         return jsonify({'message': 'Profile updated successfully'}), 200
 
+    except PasswordPoolBusy as e:
+        logger.warning("Password pool busy while updating profile: user_id=%s", user_id)
+        response = jsonify({'error': str(e)})
+        response.headers['Retry-After'] = str(PASSWORD_RETRY_AFTER)
+        return response, 503
     except Exception as e:
         logger.error("Error updating profile: %s", str(e))
         return jsonify({'error': str(e)}), 500
 
+def user_bookings_query(user_id, args):
+    """SELECT for a user's bookings filtered by the request args. Returns (query, params)."""
+    # Rows come back formatted by SQL and are shaped by one compiled pass
+    columns = booking_columns('b') + [
+        'v.name as venue_name', 'v.location', 'v.price',
+        'p.status as payment_status', f'{iso_datetime_sql("p.created_at")} as payment_created_at',
+        "COALESCE(p.status = 'refunded', 0) as is_refunded"
+    ]
+    query = f'''
+        SELECT {', '.join(columns)}
+        FROM bookings b
+        JOIN venues v ON b.venue_id = v.id
+        LEFT JOIN payments p ON b.id = p.booking_id
+        WHERE b.user_id = %s
+    '''
+    params = [user_id]
+
+    for arg, condition in (
+        ('status', 'b.status = %s'),
+        ('payment_status', 'p.status = %s'),
+        ('venue_id', 'b.venue_id = %s'),
+        ('start_date', 'b.booking_date >= %s'),
+        ('end_date', 'b.booking_date <= %s'),
+    ):
+        if args.get(arg):
+            query += f' AND {condition}'
+            params.append(args.get(arg))
+
+    query += ' ORDER BY b.created_at DESC'
+    return query, params
+
 @user_bp.route('/bookings', methods=['GET'])
 @token_required
 def get_user_bookings(user_id):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        status_filter = request.args.get('status')
-        payment_status_filter = request.args.get('payment_status')
-        venue_id_filter = request.args.get('venue_id')
-        start_date = request.args.get('start_date')
-        end_date = request.args.get('end_date')
-
-        query = '''
-            SELECT b.*, v.name as venue_name, v.location, v.price, p.status as payment_status,
-                   p.created_at as payment_created_at
-            FROM bookings b
-            JOIN venues v ON b.venue_id = v.id
-            LEFT JOIN payments p ON b.id = p.booking_id
-            WHERE b.user_id = %s
-        '''
-        params = [user_id]
-
-        if status_filter:
-            query += ' AND b.status = %s'
-            params.append(status_filter)
-        if payment_status_filter:
-            query += ' AND p.status = %s'
-            params.append(payment_status_filter)
-        if venue_id_filter:
-            query += ' AND b.venue_id = %s'
-            params.append(venue_id_filter)
-        if start_date:
-            query += ' AND b.booking_date >= %s'
-            params.append(start_date)
-        if end_date:
-            query += ' AND b.booking_date <= %s'
-            params.append(end_date)
-
-        query += ' ORDER BY b.created_at DESC'
-
-        cursor.execute(query, params)
-        bookings = cursor.fetchall()
-
-        enhanced_bookings = [
-            {
-                **booking,
-                'is_cancelled': booking['status'] == 'cancelled',
-                'is_refunded': booking['payment_status'] == 'refunded' if booking['payment_status'] else False,
-                'created_at': booking['created_at'].isoformat() if booking['created_at'] else None,
-                'payment_created_at': booking['payment_created_at'].isoformat() if booking['payment_created_at'] else None,
-                'start_time': timedelta_to_str(booking['start_time']),
-                'end_time': timedelta_to_str(booking['end_time']),
-                'time_slot': f"{timedelta_to_str(booking['start_time'])}-{timedelta_to_str(booking['end_time'])}" if booking['start_time'] and booking['end_time'] else None
-            }
-            for booking in bookings
-        ]
+        query, params = user_bookings_query(user_id, request.args)
+
+        with get_db_connection() as conn, conn.cursor(pymysql.cursors.Cursor) as cursor:
+            cursor.execute(query, params)
+            enhanced_bookings = fetch_serialized(cursor)
 
-        cursor.close()
-        conn.close()
         logger.info("Bookings fetched successfully for user_id=%s", user_id)
         return jsonify({
             'bookings': enhanced_bookings,
@@ -357,30 +767,40 @@ def get_user_bookings(user_id):
 @token_required
 def cancel_booking(user_id, booking_id):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        cursor.execute('SELECT * FROM bookings WHERE id = %s AND user_id = %s', (booking_id, user_id))
-        booking = cursor.fetchone()
-
-        if not booking:
-            cursor.close()
-            conn.close()
-            logger.warning("Booking not found or not owned by user: booking_id=%s, user_id=%s", booking_id, user_id)
-            return jsonify({'error': 'Booking not found or you do not have permission to cancel it'}), 404
-
-        if booking['status'] == 'cancelled':
-            cursor.close()
-            conn.close()
-            logger.warning("Booking already cancelled: booking_id=%s", booking_id)
-            return jsonify({'error': 'Booking is already cancelled'}), 400
-
-        cursor.execute('DELETE FROM bookings WHERE id = %s', (booking_id,))
-        conn.commit()
-        cursor.close()
-        conn.close()
-        logger.info("Booking deleted successfully: booking_id=%s", booking_id)
-        return jsonify({'message': 'Booking deleted successfully'}), 200
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute('SELECT * FROM bookings WHERE id = %s AND user_id = %s FOR UPDATE', (booking_id, user_id))
+            booking = cursor.fetchone()
+
+            if not booking:
+                logger.warning("Booking not found or not owned by user: booking_id=%s, user_id=%s", booking_id, user_id)
+                return jsonify({'error': 'Booking not found or you do not have permission to cancel it'}), 404
+
+            if booking['status'] == 'cancelled':
+                logger.warning("Booking already cancelled: booking_id=%s", booking_id)
+                return jsonify({'error': 'Booking is already cancelled'}), 400
+
+            if booking['status'] == 'pending':
+                # Deleting would cascade to the intent; cancel it instead, unless a charge is in flight
+                cursor.execute('SELECT status FROM payment_intents WHERE booking_id = %s FOR UPDATE', (booking_id,))
+                intent = cursor.fetchone()
+                if intent and intent['status'] == 'processing':
+                    conn.rollback()
+                    response = jsonify({'error': 'Payment is being processed, please retry shortly'})
+                    response.headers['Retry-After'] = '5'
+                    return response, 409
+                cancel_payment_intent(cursor, booking_id)
+                settle_pending_booking(cursor, booking_id, 'failed')
+                message = 'Booking cancelled successfully'
+            else:
+                remove_booking_stats(cursor, [booking_id])
+                cursor.execute('DELETE FROM bookings WHERE id = %s', (booking_id,))
+                message = 'Booking deleted successfully'
+            conn.commit()
+            recent_writers.mark(user_id)
+            availability_index.remove(booking_id, booking['venue_id'], booking['booking_date'])
+
+        logger.info("%s: booking_id=%s", message, booking_id)
+        return jsonify({'message': message}), 200
 
     except Exception as e:
         logger.error("Error cancelling booking: %s", str(e))
@@ -0,0 +1,142 @@
+# serializers.py
+"""Response shaping shared by the routes.
+
+Row formatting happens in SQL where it can (TIME_FORMAT / DATE_FORMAT), rows
+are read as tuples, and compile_row_serializer() turns a column list into a
+single dict-building function instead of per-row copies and helper calls.
+JSON is encoded with orjson when it is installed and the standard library
+otherwise; FastJSONProvider keeps jsonify()'s output (HTTP dates, Decimal as
+string, sorted keys) either way.
+"""
+from flask.json.provider import DefaultJSONProvider
+from functools import lru_cache
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def timedelta_to_str(td):
+    """Convert timedelta to HH:MM string."""
+    if td is None:
+        return None
+    total_seconds = int(td.total_seconds())
+    hours = total_seconds // 3600
+    minutes = (total_seconds % 3600) // 60
+    return f"{hours:02d}:{minutes:02d}"
+
+# SQL-side formatting. '%' is doubled because queries go through pymysql's
+# parameter interpolation. DATE_FORMAT's day/month names follow
+# lc_time_names, which defaults to en_US.
+def time_sql(column):
+    """TIME -> 'HH:MM', like timedelta_to_str()."""
+    return f"TIME_FORMAT({column}, '%%H:%%i')"
+
+def iso_datetime_sql(column):
+    """DATETIME/TIMESTAMP -> datetime.isoformat() without fractions."""
+    return f"DATE_FORMAT({column}, '%%Y-%%m-%%dT%%H:%%i:%%s')"
+
+def iso_date_sql(column):
+    return f"DATE_FORMAT({column}, '%%Y-%%m-%%d')"
+
+def http_date_sql(column):
+    """DATE -> the HTTP date jsonify() produces for a date object."""
+    return f"DATE_FORMAT({column}, '%%a, %%d %%b %%Y 00:00:00 GMT')"
+
+def booking_columns(alias='b', date_sql=http_date_sql):
+    """Formatted SELECT expressions for a booking row, including the derived fields."""
+    return [
+        f'{alias}.id',
+        f'{alias}.user_id',
+        f'{alias}.venue_id',
+        f'{date_sql(f"{alias}.booking_date")} as booking_date',
+        f'{time_sql(f"{alias}.start_time")} as start_time',
+        f'{time_sql(f"{alias}.end_time")} as end_time',
+        f"CONCAT({time_sql(f'{alias}.start_time')}, '-', {time_sql(f'{alias}.end_time')}) as time_slot",
+        f'{alias}.status',
+        f"{alias}.status = 'cancelled' as is_cancelled",
+        f'{iso_datetime_sql(f"{alias}.created_at")} as created_at',
+    ]
+
+def payment_columns(alias='p'):
+    """Formatted SELECT expressions for the payment joined to a booking."""
+    return [
+        f'{alias}.status as payment_status',
+        f'{alias}.amount as payment_amount',
+        f'{iso_datetime_sql(f"{alias}.created_at")} as payment_created_at',
+        f"COALESCE({alias}.status = 'refunded', 0) as is_refunded",
+    ]
+
+# Columns computed as 0/1 in SQL that the API exposes as booleans
+BOOLEAN_COLUMNS = ('is_cancelled', 'is_refunded')
+
+@lru_cache(maxsize=256)
+def _compile(names, converters):
+    env = {}
+    fields = []
+    for i, name in enumerate(names):
+        converter = dict(converters).get(name)
+        if converter is None:
+            fields.append(f'{name!r}: row[{i}]')
+        else:
+            env[f'_convert_{i}'] = converter
+            fields.append(f'{name!r}: _convert_{i}(row[{i}])')
+    return eval(f'lambda row: {{{", ".join(fields)}}}', env)
+
+def compile_row_serializer(description, converters=None):
+    """Build row_tuple -> dict for a cursor.description, applying converters by column name.
+
+    Columns listed in BOOLEAN_COLUMNS are converted with bool() unless
+    overridden. The function is generated once per column layout and cached.
+    """
+    names = tuple(column[0] for column in description)
+    merged = {name: bool for name in BOOLEAN_COLUMNS if name in names}
+    merged.update(converters or {})
+    return _compile(names, tuple(sorted(merged.items())))
+
+def fetch_serialized(cursor, converters=None):
+    """fetchall() from a tuple cursor as a list of dicts."""
+    serialize = compile_row_serializer(cursor.description, converters)
+    return [serialize(row) for row in cursor.fetchall()]
+
+def dumps(obj, default, sort_keys=False):
+    """Compact JSON as bytes, via orjson when available.
+
+    Dates and datetimes go to `default` in both paths, so the caller decides
+    their format.
+    """
+    if orjson is not None:
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        try:
+            return orjson.dumps(obj, default=default, option=option)
+        except TypeError:
+            # e.g. integers beyond 64 bits; the standard library copes
+            pass
+    return json.dumps(obj, default=default, sort_keys=sort_keys, separators=(',', ':')).encode('utf-8')
+
+class FastJSONProvider(DefaultJSONProvider):
+    """jsonify() backed by orjson when available, with identical output conventions."""
+
+    def dumps_bytes(self, obj, **kwargs):
+        # Only compact separators can be honoured by dumps(); anything else
+        # (indent, ensure_ascii, ...) takes the standard library path
+        if kwargs.get('separators', (',', ':')) == (',', ':') and kwargs.keys() <= {'separators'}:
+            # Flask's default() keeps dates as HTTP dates
+            return dumps(obj, self.default, sort_keys=self.sort_keys)
+        kwargs.setdefault('default', self.default)
+        kwargs.setdefault('ensure_ascii', self.ensure_ascii)
+        kwargs.setdefault('sort_keys', self.sort_keys)
+        return json.dumps(obj, **kwargs).encode('utf-8')
+
+    def dumps(self, obj, **kwargs):
+        return self.dumps_bytes(obj, **kwargs).decode('utf-8')
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if self.compact is False or (self.compact is None and self._app.debug):
+            # Pretty output for debugging goes through the standard path
+            return super().response(obj)
+        return self._app.response_class(self.dumps_bytes(obj, separators=(',', ':')) + b'\n', mimetype=self.mimetype)
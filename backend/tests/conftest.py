@@ -0,0 +1,29 @@
+"""Unit tests for the pure-logic modules; none of them needs a database.
+
+test_query_plans.py is the exception and is skipped without a MySQL server.
+
+Run from backend/:
+    python -m pytest -q
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Modules read their settings at import time
+os.environ.setdefault('SECRET_KEY', 'unit-test-secret-key-of-32-bytes!')
+os.environ.setdefault('PAYMENT_WORKERS', '0')
+os.environ.setdefault('MAINTENANCE_INTERVAL', '0')
+
+class RowsCursor:
+    """Cursor stand-in that answers every query with the given rows."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    def execute(self, query, params=None):
+        self.queries.append((query, params))
+
+    def fetchall(self):
+        return list(self.rows)
@@ -0,0 +1,94 @@
+from datetime import date, time as dt_time, timedelta
+
+from availability import AvailabilityIndex, free_intervals, to_seconds, seconds_to_str, to_date_key
+from conftest import RowsCursor
+
+def hours(*pairs):
+    return [(start * 3600, end * 3600) for start, end in pairs]
+
+def test_to_seconds_accepts_every_time_representation():
+    assert to_seconds(3600) == 3600
+    assert to_seconds(timedelta(hours=9, minutes=30)) == 34200
+    assert to_seconds(dt_time(9, 30, 15)) == 34215
+    assert to_seconds('09:30') == 34200
+    assert to_seconds('09:30:15') == 34215
+    assert seconds_to_str(34200) == '09:30'
+
+def test_to_date_key():
+    assert to_date_key(date(2026, 5, 1)) == '2026-05-01'
+    assert to_date_key('2026-05-01') == '2026-05-01'
+
+def test_free_intervals_empty_day():
+    assert free_intervals([]) == [(0, 86400)]
+
+def test_free_intervals_merges_overlapping_and_touching_bookings():
+    booked = hours((9, 11), (10, 12), (12, 13), (15, 16))
+    assert free_intervals(booked) == hours((0, 9), (13, 15), (16, 24))
+
+def test_free_intervals_respects_day_bounds_and_min_length():
+    booked = hours((9, 10), (10, 10.5), (11, 12))
+    assert free_intervals(booked, day_start=8 * 3600, day_end=18 * 3600, min_length=3600) == hours((8, 9), (12, 18))
+
+def test_free_intervals_fully_booked():
+    assert free_intervals(hours((0, 24))) == []
+
+def loaded_index(rows, venue_id=1, day='2026-05-01', ttl=30):
+    index = AvailabilityIndex(ttl=ttl)
+    index.load_day(RowsCursor(rows), venue_id, day)
+    return index
+
+def test_find_overlap_on_loaded_day():
+    index = loaded_index([{'id': 7, 'start_time': timedelta(hours=10), 'end_time': timedelta(hours=12)}])
+    assert index.find_overlap(1, '2026-05-01', '11:00', '13:00') == (36000, 43200, 7)
+    assert index.find_overlap(1, '2026-05-01', '09:00', '10:30') == (36000, 43200, 7)
+    # Touching intervals do not overlap
+    assert index.find_overlap(1, '2026-05-01', '12:00', '13:00') is None
+    assert index.find_overlap(1, '2026-05-01', '09:00', '10:00') is None
+
+def test_venue_id_may_be_a_string():
+    index = loaded_index([{'id': 7, 'start_time': timedelta(hours=10), 'end_time': timedelta(hours=12)}])
+    assert index.find_overlap('1', date(2026, 5, 1), '10:00', '11:00') == (36000, 43200, 7)
+
+def test_unloaded_and_stale_days_never_report_overlaps():
+    index = AvailabilityIndex()
+    index.add(1, 1, '2026-05-01', '10:00', '12:00')
+    assert not index.is_fresh(1, '2026-05-01')
+    assert index.find_overlap(1, '2026-05-01', '10:00', '11:00') is None
+
+    stale = loaded_index([{'id': 7, 'start_time': timedelta(hours=10), 'end_time': timedelta(hours=12)}], ttl=-1)
+    assert not stale.is_fresh(1, '2026-05-01')
+    assert stale.find_overlap(1, '2026-05-01', '10:00', '11:00') is None
+
+def test_add_remove_and_invalidate():
+    index = loaded_index([])
+    assert index.is_fresh(1, '2026-05-01')
+    index.add(3, 1, '2026-05-01', '14:00', '15:00')
+    index.add(3, 1, '2026-05-01', '14:00', '15:00')
+    assert index.find_overlap(1, '2026-05-01', '14:30', '16:00') == (50400, 54000, 3)
+    index.remove(3, 1, '2026-05-01')
+    assert index.find_overlap(1, '2026-05-01', '14:30', '16:00') is None
+    index.invalidate(1, '2026-05-01')
+    assert not index.is_fresh(1, '2026-05-01')
+
+def test_invalidate_venue_drops_only_that_venue():
+    index = loaded_index([], venue_id=1, day='2026-05-01')
+    index.load_day(RowsCursor([]), '1', '2026-05-02')
+    index.load_day(RowsCursor([]), 2, '2026-05-01')
+    index.invalidate_venue(1)
+    assert not index.is_fresh(1, '2026-05-01')
+    assert not index.is_fresh(1, '2026-05-02')
+    assert index.is_fresh(2, '2026-05-01')
+
+def test_overlap_found_among_many_bookings():
+    rows = [{'id': i, 'start_time': timedelta(hours=i), 'end_time': timedelta(hours=i, minutes=30)} for i in range(24)]
+    index = loaded_index(rows)
+    assert index.find_overlap(1, '2026-05-01', '05:15', '05:20')[2] == 5
+    assert index.find_overlap(1, '2026-05-01', '05:30', '06:00') is None
+    assert index.find_overlap(1, '2026-05-01', '05:45', '07:10')[2] == 6
+
+def test_prune_drops_past_days():
+    index = loaded_index([], day='2026-05-01')
+    index.load_day(RowsCursor([]), 1, '2026-06-01')
+    index.prune(before=date(2026, 5, 15))
+    assert not index.is_fresh(1, '2026-05-01')
+    assert index.is_fresh(1, '2026-06-01')
@@ -0,0 +1,41 @@
+import pytest
+
+from routes import admin
+
+class CountCursor:
+    def __init__(self):
+        self.queries = 0
+
+    def execute(self, query, params=None):
+        self.queries += 1
+
+    def fetchone(self):
+        return {'total': self.queries}
+
+def filters(**values):
+    return dict({'status': None, 'payment_status': None, 'venue_id': None, 'user_id': None,
+                 'start_date': None, 'end_date': None}, **values)
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+    monkeypatch.setattr(admin, '_booking_counts', admin.OrderedDict())
+    monkeypatch.setattr(admin, 'BOOKING_COUNT_CACHE_SIZE', 2)
+
+def test_counts_are_cached_per_filter_combination():
+    cursor = CountCursor()
+    assert admin.count_bookings(cursor, filters(venue_id='1')) == 1
+    assert admin.count_bookings(cursor, filters(venue_id='1')) == 1
+    assert admin.count_bookings(cursor, filters(venue_id='2')) == 2
+
+def test_cache_is_bounded_and_keeps_recently_used_counts():
+    cursor = CountCursor()
+    for venue_id in ('1', '2'):
+        admin.count_bookings(cursor, filters(venue_id=venue_id))
+    admin.count_bookings(cursor, filters(venue_id='1'))
+    admin.count_bookings(cursor, filters(venue_id='3'))
+    assert len(admin._booking_counts) == 2
+    assert cursor.queries == 3
+    admin.count_bookings(cursor, filters(venue_id='1'))
+    assert cursor.queries == 3
+    admin.count_bookings(cursor, filters(venue_id='2'))
+    assert cursor.queries == 4
@@ -0,0 +1,83 @@
+from datetime import date, timedelta
+import time
+
+import pymysql
+import pytest
+
+from conftest import RowsCursor
+from holds import HoldError, SlotHoldIndex, claim_units, find_live_hold, lock_venue_days, unit_minutes
+
+class FailingCursor:
+    def __init__(self, error):
+        self.error = error
+
+    def execute(self, query, params=None):
+        raise self.error
+
+def test_unit_minutes_cover_partial_minutes():
+    assert unit_minutes('10:00', '11:00') == range(600, 660)
+    assert unit_minutes('10:00:30', '10:01:30') == range(600, 602)
+
+def test_claim_rejects_overlaps_only():
+    index = SlotHoldIndex()
+    assert index.claim('a', 1, '2030-01-01', '10:00', '11:00', 60) is None
+    assert index.claim('b', 1, '2030-01-01', '10:30', '11:30', 60) == (36000, 39600)
+    assert index.claim('c', 1, '2030-01-01', '11:00', '12:00', 60) is None
+    assert index.claim('d', 2, '2030-01-01', '10:00', '11:00', 60) is None
+    assert index.claim('e', 1, '2030-01-02', '10:00', '11:00', 60) is None
+    assert index.rejections == 1
+
+def test_venue_and_date_keys_are_normalized():
+    index = SlotHoldIndex()
+    index.claim('a', 1, date(2030, 1, 1), '10:00', '11:00', 60)
+    assert index.find_conflict('1', '2030-01-01', '10:30', '10:45') == (36000, 39600)
+
+def test_find_conflict_ignores_own_hold():
+    index = SlotHoldIndex()
+    index.claim('a', 1, '2030-01-01', '10:00', '11:00', 60)
+    assert index.find_conflict(1, '2030-01-01', '10:00', '11:00', hold_id='a') is None
+    assert index.find_conflict(1, '2030-01-01', '09:00', '10:00') is None
+    assert index.find_conflict(1, '2030-01-01', '09:00', '10:01') == (36000, 39600)
+
+def test_expired_holds_are_dropped(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    index = SlotHoldIndex()
+    index.claim('a', 1, '2030-01-01', '10:00', '11:00', 30)
+    now[0] += 31
+    assert index.find_conflict(1, '2030-01-01', '10:00', '11:00') is None
+    assert index._days == {}
+
+def test_release():
+    index = SlotHoldIndex()
+    index.claim('a', 1, '2030-01-01', '10:00', '11:00', 60)
+    index.claim('b', 1, '2030-01-01', '12:00', '13:00', 60)
+    index.release('a', 1, '2030-01-01')
+    assert index.find_conflict(1, '2030-01-01', '10:00', '11:00') is None
+    assert index.find_conflict(1, '2030-01-01', '12:00', '13:00') == (43200, 46800)
+    index.release('b', '1', date(2030, 1, 1))
+    assert index._days == {}
+
+def test_lock_venue_days_locks_each_day_once_in_order():
+    cursor = RowsCursor([])
+    lock_venue_days(cursor, [(2, '2030-01-01'), ('1', date(2030, 1, 2)), (2, date(2030, 1, 1))])
+    query, params = cursor.queries[0]
+    assert query.count('(%s, %s)') == 2
+    assert params == ['1', '2030-01-02', '2', '2030-01-01']
+
+@pytest.mark.parametrize('code', [1213, 1205])
+def test_lock_conflicts_become_409(code):
+    with pytest.raises(HoldError) as e:
+        lock_venue_days(FailingCursor(pymysql.OperationalError(code, 'lock')), [(1, '2030-01-01')])
+    assert e.value.status == 409
+    assert not claim_units(FailingCursor(pymysql.OperationalError(code, 'lock')), 1, '2030-01-01', '10:00', '11:00', 'h')
+
+def test_other_database_errors_propagate():
+    with pytest.raises(pymysql.OperationalError):
+        lock_venue_days(FailingCursor(pymysql.OperationalError(2013, 'lost')), [(1, '2030-01-01')])
+
+def test_find_live_hold_matches_overlaps_only():
+    cursor = RowsCursor([{'id': 'h', 'venue_id': 1, 'booking_date': date(2030, 1, 1),
+                          'start_time': timedelta(hours=10), 'end_time': timedelta(hours=11)}])
+    assert find_live_hold(cursor, 1, '2030-01-01', '11:00', '12:00') is None
+    assert find_live_hold(cursor, 1, '2030-01-01', '10:59', '12:00')['id'] == 'h'
@@ -0,0 +1,19 @@
+from maintenance import MaintenanceLoop
+
+def failing():
+    raise RuntimeError('database is down')
+
+def test_run_once_keeps_going_after_a_failing_task():
+    loop = MaintenanceLoop(interval=0, tasks=(('first', failing), ('second', lambda: 3), ('third', lambda: None)))
+    assert loop.run_once() == {'first': None, 'second': 3, 'third': 0}
+    loop.run_once()
+    stats = loop.stats()
+    assert stats['runs'] == 2
+    assert stats['purged'] == {'first': 0, 'second': 6, 'third': 0}
+    assert stats['errors'] == {'first': 2, 'second': 0, 'third': 0}
+
+def test_zero_interval_does_not_start_a_thread():
+    loop = MaintenanceLoop(interval=0, tasks=())
+    loop.start()
+    assert loop.stats()['running'] is False
+    loop.stop()
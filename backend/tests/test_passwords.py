@@ -0,0 +1,41 @@
+import threading
+
+import pytest
+
+from passwords import PasswordHasher, PasswordPoolBusy, bcrypt_cost
+
+def test_bcrypt_cost():
+    assert bcrypt_cost('$2b$12$abcdefghijklmnopqrstuv') == 12
+    assert bcrypt_cost('not a hash') is None
+    assert bcrypt_cost(None) is None
+
+def test_hash_and_verify():
+    hasher = PasswordHasher(workers=1, rounds=4)
+    hashed = hasher.hash('secret')
+    assert hasher.verify('secret', hashed) and not hasher.verify('wrong', hashed)
+    assert not hasher.needs_rehash(hashed)
+    hasher.shutdown()
+
+def test_queue_limit_rejects():
+    release = threading.Event()
+    hasher = PasswordHasher(workers=1, rounds=4, queue_limit=1, timeout=5)
+    hasher._submit(release.wait)
+    with pytest.raises(PasswordPoolBusy):
+        hasher.verify('secret', 'unused')
+    release.set()
+    hasher.shutdown()
+    assert hasher.stats()['rejected'] == 1
+
+def test_timed_out_calls_give_their_queue_slot_back():
+    release = threading.Event()
+    hasher = PasswordHasher(workers=1, rounds=4, queue_limit=3, timeout=0.05)
+    hasher._submit(release.wait)
+    for _ in range(2):
+        with pytest.raises(PasswordPoolBusy):
+            hasher.hash('secret')
+    release.set()
+    hasher.shutdown()
+    stats = hasher.stats()
+    assert stats['timeouts'] == 2
+    assert stats['queue_depth'] == 0 and stats['in_flight'] == 0
+    assert hasher._outstanding == 0
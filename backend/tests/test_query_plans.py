@@ -0,0 +1,33 @@
+"""benchmarks/check_query_plans.py as a test: no route query may fall back to a full scan.
+
+Needs a MySQL server the MYSQL_* settings can create databases on; skipped
+without one.
+"""
+import json
+import os
+import subprocess
+import sys
+
+import pymysql
+import pytest
+
+from database import Config
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def mysql_available():
+    try:
+        pymysql.connect(host=Config.MYSQL_HOST, user=Config.MYSQL_USER,
+                        password=Config.MYSQL_PASSWORD, connect_timeout=2).close()
+    except pymysql.MySQLError:
+        return False
+    return True
+
+@pytest.mark.skipif(not mysql_available(), reason='needs a MySQL server')
+def test_route_queries_use_indexes():
+    result = subprocess.run([sys.executable, os.path.join('benchmarks', 'check_query_plans.py')],
+                            cwd=BACKEND, capture_output=True, text=True, timeout=900)
+    assert result.stdout, result.stderr
+    report = json.loads(result.stdout)
+    assert report['statements_checked'] > 0
+    assert report['full_scans'] == []
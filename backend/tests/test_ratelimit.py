@@ -0,0 +1,70 @@
+import pytest
+
+from ratelimit import LoginLimiter, MemoryBackend, sliding_count
+
+def test_sliding_count_weights_previous_window():
+    assert sliding_count(10, 2, 60, 120) == 12
+    assert sliding_count(10, 2, 60, 150) == 7
+    assert sliding_count(10, 2, 60, 179) == pytest.approx(10 / 60 + 2)
+
+def test_memory_backend_counts_within_a_window():
+    backend = MemoryBackend()
+    assert backend.increment('k', 60, 120) == (0, 1)
+    assert backend.increment('k', 60, 179) == (0, 2)
+
+def test_memory_backend_carries_the_ended_window_over():
+    backend = MemoryBackend()
+    for second in range(120, 140):
+        backend.increment('k', 60, second)
+    assert backend.increment('k', 60, 181) == (20, 1)
+
+def test_memory_backend_drops_windows_older_than_the_previous_one():
+    backend = MemoryBackend()
+    backend.increment('k', 60, 120)
+    assert backend.increment('k', 60, 240) == (0, 1)
+
+def test_memory_backend_keys_are_independent_and_clearable():
+    backend = MemoryBackend()
+    backend.increment('a', 60, 120)
+    backend.set_lockout('a', 200, 1, 120)
+    assert backend.increment('b', 60, 120) == (0, 1)
+    backend.clear('a')
+    assert backend.lockouts(['a']) == {}
+    assert backend.increment('a', 60, 121) == (0, 1)
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_020.0]
+    monkeypatch.setattr('ratelimit.time.time', lambda: now[0])
+    return now
+
+def test_ip_limit_holds_across_a_window_boundary(clock):
+    limiter = LoginLimiter(MemoryBackend(), window=60, ip_limit=30, lockout_base=30)
+    allowed = 0
+    for _ in range(60):
+        if limiter.check('10.0.0.1', 'a@example.com') is None:
+            allowed += 1
+        clock[0] += 1
+    assert allowed <= 31
+
+def test_lockout_doubles_and_resets(clock):
+    limiter = LoginLimiter(MemoryBackend(), window=60, email_limit=3, lockout_base=30,
+                           lockout_max=100, lockout_reset=1000)
+    for level, seconds in ((1, 30), (2, 60), (3, 100)):
+        for _ in range(3):
+            limiter.failed('User@Example.com')
+        until, recorded_level, _ = limiter.backend.lockouts(['email:user@example.com'])['email:user@example.com']
+        assert (recorded_level, until - clock[0]) == (level, seconds)
+        assert limiter.check('10.0.0.1', 'user@example.com') == seconds + 1
+        clock[0] += 120
+    clock[0] += 1000
+    for _ in range(3):
+        limiter.failed('user@example.com')
+    assert limiter.backend.lockouts(['email:user@example.com'])['email:user@example.com'][1] == 1
+
+def test_success_clears_the_account_record(clock):
+    limiter = LoginLimiter(MemoryBackend(), window=60, email_limit=2)
+    limiter.failed('a@example.com')
+    limiter.succeeded('a@example.com')
+    limiter.failed('a@example.com')
+    assert limiter.check('10.0.0.1', 'a@example.com') is None
@@ -0,0 +1,61 @@
+from datetime import date, timedelta
+from decimal import Decimal
+import json
+
+from flask import Flask, jsonify
+import pytest
+
+import serializers
+from serializers import compile_row_serializer, dumps, timedelta_to_str, FastJSONProvider
+
+def description(*names):
+    return [(name, None, None, None, None, None, None) for name in names]
+
+def test_timedelta_to_str():
+    assert timedelta_to_str(timedelta(hours=9, minutes=5)) == '09:05'
+    assert timedelta_to_str(timedelta(hours=23, minutes=59, seconds=59)) == '23:59'
+    assert timedelta_to_str(None) is None
+
+def test_row_serializer_maps_columns_in_order():
+    serialize = compile_row_serializer(description('id', 'name', 'price'))
+    assert serialize((1, 'Hall', Decimal('10.00'))) == {'id': 1, 'name': 'Hall', 'price': Decimal('10.00')}
+
+def test_row_serializer_converts_boolean_columns():
+    serialize = compile_row_serializer(description('id', 'is_cancelled', 'is_refunded'))
+    row = serialize((1, 1, 0))
+    assert row['is_cancelled'] is True and row['is_refunded'] is False
+
+def test_row_serializer_applies_converters_by_name():
+    serialize = compile_row_serializer(description('start_time', 'is_cancelled'),
+                                       {'start_time': timedelta_to_str, 'is_cancelled': int})
+    assert serialize((timedelta(hours=10), 1)) == {'start_time': '10:00', 'is_cancelled': 1}
+
+def test_row_serializer_is_cached_per_layout():
+    first = compile_row_serializer(description('id', 'status'))
+    assert compile_row_serializer(description('id', 'status')) is first
+    assert compile_row_serializer(description('status', 'id')) is not first
+
+def test_row_serializer_quotes_column_names():
+    serialize = compile_row_serializer(description("it's", 'a"b'))
+    assert serialize((1, 2)) == {"it's": 1, 'a"b': 2}
+
+@pytest.mark.parametrize('use_orjson', [True, False])
+def test_dumps_matches_standard_library(monkeypatch, use_orjson):
+    if not use_orjson:
+        monkeypatch.setattr(serializers, 'orjson', None)
+    obj = {'b': [1, 2.5, None, True], 'a': 'é', 'big': 2 ** 70, 'day': date(2024, 1, 2)}
+    encoded = dumps(obj, default=str, sort_keys=True)
+    assert json.loads(encoded) == json.loads(json.dumps(obj, default=str))
+    assert list(json.loads(encoded)) == ['a', 'b', 'big', 'day']
+
+def test_fast_json_provider_matches_jsonify_conventions():
+    app = Flask(__name__)
+    body = {'when': date(2024, 1, 2), 'price': Decimal('9.50'), 'z': 1, 'a': 2}
+    with app.app_context():
+        expected = jsonify(body).get_json()
+    app.json = FastJSONProvider(app)
+    with app.app_context():
+        response = jsonify(body)
+    assert response.get_json() == expected
+    assert response.get_json()['when'] == 'Tue, 02 Jan 2024 00:00:00 GMT'
+    assert response.get_data(as_text=True).startswith('{"a":2')
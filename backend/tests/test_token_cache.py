@@ -0,0 +1,79 @@
+import time
+
+import jwt
+import pytest
+
+from routes import middleware
+from routes.middleware import AuthError, TokenCache, verify_token
+
+def claims(user_id, lifetime=300, issued=None):
+    issued = int(time.time()) if issued is None else issued
+    return {'user_id': user_id, 'role': 'user', 'iat': issued, 'exp': issued + lifetime}
+
+def test_get_put_counts_hits_and_misses():
+    cache = TokenCache(10)
+    assert cache.get('a') is None
+    cache.put('a', claims(1))
+    assert cache.get('a')['user_id'] == 1
+    assert cache.stats() == {'size': 1, 'hits': 1, 'misses': 1, 'revocations': 0, 'revoked_users': 0}
+
+def test_expired_entries_are_evicted():
+    cache = TokenCache(10)
+    cache.put('a', claims(1, lifetime=-1))
+    assert cache.get('a') is None
+    assert cache.stats()['size'] == 0
+
+def test_lru_eviction():
+    cache = TokenCache(2)
+    cache.put('a', claims(1))
+    cache.put('b', claims(2))
+    cache.get('a')
+    cache.put('c', claims(3))
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None
+
+def test_revoke_user_evicts_and_rejects_earlier_tokens():
+    cache = TokenCache(10)
+    old = claims(1, issued=int(time.time()) - 10)
+    cache.put('a', old)
+    cache.put('b', claims(2))
+    cache.revoke_user(1)
+    assert cache.get('a') is None
+    assert cache.is_revoked(old)
+    assert not cache.is_revoked(claims(2))
+    # Issued after the revocation (iat has whole-second resolution)
+    assert not cache.is_revoked(claims(1, issued=int(time.time()) + 1))
+    assert cache.stats()['revocations'] == 1
+    assert cache.stats()['revoked_users'] == 1
+
+def encode(payload):
+    return jwt.encode(payload, middleware.SECRET_KEY, algorithm='HS256')
+
+def test_verify_token_uses_the_cache(monkeypatch):
+    monkeypatch.setattr(middleware, 'token_cache', TokenCache(10))
+    token = encode(claims(5))
+    assert verify_token(f'Bearer {token}') == (5, 'user')
+    assert verify_token(token) == (5, 'user')
+    assert middleware.token_cache.stats()['hits'] == 1
+
+@pytest.mark.parametrize('token, message', [
+    (None, 'Token is missing'),
+    ('Bearer not-a-jwt', 'Invalid token'),
+    (f"Bearer {jwt.encode({'user_id': 1, 'exp': int(time.time()) + 60}, 'other-secret-key-of-32-bytes-long', algorithm='HS256')}",
+     'Invalid token'),
+])
+def test_verify_token_rejects_bad_tokens(monkeypatch, token, message):
+    monkeypatch.setattr(middleware, 'token_cache', TokenCache(10))
+    with pytest.raises(AuthError) as e:
+        verify_token(token)
+    assert e.value.message == message
+
+def test_verify_token_rejects_expired_and_revoked(monkeypatch):
+    monkeypatch.setattr(middleware, 'token_cache', TokenCache(10))
+    with pytest.raises(AuthError, match='expired'):
+        verify_token(encode(claims(1, lifetime=-10, issued=int(time.time()) - 20)))
+    token = encode(claims(2, issued=int(time.time()) - 5))
+    verify_token(token)
+    middleware.token_cache.revoke_user(2)
+    with pytest.raises(AuthError, match='revoked'):
+        verify_token(token)
@@ -0,0 +1,118 @@
+from decimal import Decimal
+import io
+import json
+
+import pytest
+
+import venue_import
+from venue_import import InvalidUpload, import_venues, iter_csv_rows, iter_json_array, parse_venue
+
+@pytest.fixture
+def small_reads(monkeypatch):
+    # Rows and multi-byte characters then straddle read boundaries
+    monkeypatch.setattr(venue_import, 'READ_CHUNK_SIZE', 7)
+
+def venue(i):
+    return {'name': f'Room {i}', 'location': 'Campus Ü', 'capacity': i + 1, 'price': '10.50'}
+
+def test_json_array_items(small_reads):
+    rows = [venue(i) for i in range(50)]
+    body = json.dumps(rows, ensure_ascii=False, indent=1).encode('utf-8')
+    assert list(iter_json_array(io.BytesIO(body))) == rows
+
+@pytest.mark.parametrize('body', [b'[]', b' [ ] \n', b'\xef\xbb\xbf[]'])
+def test_json_empty_array(body):
+    assert list(iter_json_array(io.BytesIO(body))) == []
+
+@pytest.mark.parametrize('body, message', [
+    (b'', 'must be a JSON array'),
+    (b'{"name": "x"}', 'must be a JSON array'),
+    (b'[{"name": "x"}', 'unexpected end'),
+    (b'[{"name": "x"} {"name": "y"}]', "expected ','"),
+    (b'[{"name": "x"}] []', 'after the closing bracket'),
+    (b'[{"name": }]', 'Invalid JSON'),
+    (b'["\xff"]', 'UTF-8'),
+])
+def test_json_errors(body, message):
+    with pytest.raises(InvalidUpload) as e:
+        list(iter_json_array(io.BytesIO(body)))
+    assert message in e.value.message
+
+def test_json_row_longer_than_the_read_ahead(monkeypatch):
+    monkeypatch.setattr(venue_import, 'READ_CHUNK_SIZE', 4)
+    monkeypatch.setattr(venue_import, 'MAX_JSON_ROW_BYTES', 16)
+    body = json.dumps([{'name': 'x' * 40}]).encode('utf-8')
+    with pytest.raises(InvalidUpload) as e:
+        list(iter_json_array(io.BytesIO(body)))
+    assert 'longer than 16' in e.value.message
+
+def test_csv_rows(small_reads):
+    body = 'Name, Location ,CAPACITY,price\r\nRoom 1,Campus Ü,10,9.99\nRoom 2,"Hall, East",20,5\n'.encode('utf-8')
+    assert list(iter_csv_rows(io.BytesIO(body))) == [
+        {'name': 'Room 1', 'location': 'Campus Ü', 'capacity': '10', 'price': '9.99'},
+        {'name': 'Room 2', 'location': 'Hall, East', 'capacity': '20', 'price': '5'},
+    ]
+
+def test_csv_quoted_newline_and_no_trailing_newline(small_reads):
+    body = b'name,location,capacity,price\n"Room\n1",Campus,10,9.99'
+    assert list(iter_csv_rows(io.BytesIO(body)))[0]['name'] == 'Room\n1'
+
+def test_csv_missing_columns():
+    with pytest.raises(InvalidUpload) as e:
+        list(iter_csv_rows(io.BytesIO(b'name,capacity\nRoom,1\n')))
+    assert e.value.message == 'CSV header is missing: location, price'
+
+def test_parse_venue_normalizes():
+    assert parse_venue({'name': ' Room ', 'location': 'Campus', 'capacity': '12', 'price': 7}) == \
+        (('Room', 'Campus', 12, Decimal('7.00')), None)
+
+@pytest.mark.parametrize('raw, message', [
+    ([], 'must be an object'),
+    ({'name': 'Room', 'location': ' ', 'capacity': 1}, 'Missing required fields: location, price'),
+    ({'name': 'x' * 256, 'location': 'L', 'capacity': 1, 'price': 1}, 'at most 255'),
+    ({'name': 'R', 'location': 'L', 'capacity': 1.5, 'price': 1}, 'whole number'),
+    ({'name': 'R', 'location': 'L', 'capacity': True, 'price': 1}, 'whole number'),
+    ({'name': 'R', 'location': 'L', 'capacity': 0, 'price': 1}, 'between 1 and'),
+    ({'name': 'R', 'location': 'L', 'capacity': 1, 'price': 'free'}, 'must be a number'),
+    ({'name': 'R', 'location': 'L', 'capacity': 1, 'price': 'NaN'}, 'between 0 and'),
+    ({'name': 'R', 'location': 'L', 'capacity': 1, 'price': -1}, 'between 0 and'),
+    ({'name': 'R', 'location': 'L', 'capacity': 1, 'price': '1.005'}, '2 decimal places'),
+])
+def test_parse_venue_errors(raw, message):
+    parsed, error = parse_venue(raw)
+    assert parsed is None and message in error
+
+class UpsertCursor:
+    """Answers the existing-venues count of upsert_venues() and records the INSERTs."""
+
+    def __init__(self, existing=0):
+        self.existing = existing
+        self.inserts = []
+
+    def execute(self, query, params=None):
+        if query.startswith('INSERT'):
+            self.inserts.append(params)
+
+    def fetchone(self):
+        return {'existing': self.existing}
+
+def test_import_writes_valid_rows_in_chunks():
+    cursor = UpsertCursor()
+    rows = [venue(i) for i in range(5)] + [{'name': 'Room 1', 'location': 'campus ü', 'capacity': 1, 'price': 1}]
+    report = import_venues(cursor, rows, all_or_nothing=False, chunk_size=2)
+    assert [len(params) // 4 for params in cursor.inserts] == [2, 2, 1]
+    assert report == {'rows': 6, 'created': 5, 'updated': 0, 'error_count': 1,
+                      'errors': [{'row': 6, 'error': 'Same name and location as row 2'}]}
+
+def test_import_all_or_nothing_stops_writing_but_reports_every_error():
+    cursor = UpsertCursor()
+    rows = [venue(0), {'name': 'Bad'}, venue(1), venue(2), {'name': 'Worse'}]
+    report = import_venues(cursor, rows, all_or_nothing=True, chunk_size=10)
+    assert cursor.inserts == []
+    assert [error['row'] for error in report['errors']] == [2, 5]
+
+def test_import_row_limit(monkeypatch):
+    monkeypatch.setattr(venue_import, 'VENUE_IMPORT_MAX_ROWS', 2)
+    with pytest.raises(InvalidUpload) as e:
+        import_venues(UpsertCursor(), [venue(i) for i in range(3)], all_or_nothing=False)
+    assert e.value.status == 413
@@ -0,0 +1,157 @@
+# tokens.py
+"""Short-lived access tokens and rotated refresh tokens.
+
+Login hands out a pair:
+
+    access token   an HS256 JWT carrying only user_id, role, iat and exp,
+                   valid for ACCESS_TOKEN_SECONDS. The middleware authorizes
+                   requests from its signature and claims alone, without any
+                   DB access.
+    refresh token  an opaque random string valid for REFRESH_TOKEN_SECONDS.
+                   Only its SHA-256 is stored, in refresh_tokens under a
+                   unique index.
+
+POST /api/token/refresh trades a refresh token for a new pair and marks the
+old one rotated; the new access token carries the user's current role.
+Every refresh token descended from one login shares a family_id. A rotated
+token presented again has been copied, so the whole family is revoked and
+both holders have to log in again. Rotation less than REFRESH_REUSE_GRACE
+seconds earlier is let through, for two tabs refreshing at the same moment.
+
+Revoking a user's refresh tokens therefore ends their sessions within
+ACCESS_TOKEN_SECONDS without the middleware ever asking the database.
+"""
+from dotenv import load_dotenv
+import threading
+import hashlib
+import logging
+import secrets
+import time
+import uuid
+import os
+
+import jwt
+
+from database import Config, get_db_connection
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+ACCESS_TOKEN_SECONDS = int(os.getenv('ACCESS_TOKEN_SECONDS', 300))
+REFRESH_TOKEN_SECONDS = int(os.getenv('REFRESH_TOKEN_SECONDS', 14 * 24 * 3600))
+REFRESH_REUSE_GRACE = int(os.getenv('REFRESH_REUSE_GRACE', 10))
+
+class RefreshTokenError(Exception):
+    """A refresh token that cannot be exchanged; the client has to log in again."""
+
+    def __init__(self, message):
+        super().__init__(message)
+        self.message = message
+
+_stats = {'issued': 0, 'rotated': 0, 'rejected': 0, 'reuse_detected': 0}
+_stats_lock = threading.Lock()
+
+def _count(stat):
+    with _stats_lock:
+        _stats[stat] += 1
+
+def token_stats():
+    with _stats_lock:
+        return dict(_stats)
+
+def issue_access_token(user_id, role):
+    now = int(time.time())
+    return jwt.encode({'user_id': user_id, 'role': role, 'iat': now, 'exp': now + ACCESS_TOKEN_SECONDS},
+                      Config.SECRET_KEY, algorithm='HS256')
+
+def hash_refresh_token(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+def _insert_refresh_token(cursor, user_id, family_id):
+    token = secrets.token_urlsafe(32)
+    cursor.execute(
+        'INSERT INTO refresh_tokens (token_hash, family_id, user_id, expires_at) '
+        'VALUES (%s, %s, %s, NOW() + INTERVAL %s SECOND)',
+        (hash_refresh_token(token), family_id, user_id, REFRESH_TOKEN_SECONDS)
+    )
+    return token
+
+def _token_pair(user_id, role, refresh_token):
+    return {'token': issue_access_token(user_id, role), 'refresh_token': refresh_token,
+            'expires_in': ACCESS_TOKEN_SECONDS}
+
+def issue_tokens(user_id, role):
+    """Start a new refresh token family at login. Returns token, refresh_token and expires_in."""
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        refresh_token = _insert_refresh_token(cursor, user_id, uuid.uuid4().hex)
+        conn.commit()
+    _count('issued')
+    return _token_pair(user_id, role, refresh_token)
+
+def rotate_refresh_token(refresh_token):
+    """Exchange a refresh token for a new pair (see the module docstring).
+
+    Raises RefreshTokenError if the token is unknown, expired, revoked or reused.
+    """
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(
+            'SELECT id, family_id, user_id, revoked_at, rotated_at, expires_at <= NOW() AS expired, '
+            'rotated_at <= NOW() - INTERVAL %s SECOND AS reused '
+            'FROM refresh_tokens WHERE token_hash = %s FOR UPDATE',
+            (REFRESH_REUSE_GRACE, hash_refresh_token(refresh_token))
+        )
+        row = cursor.fetchone()
+        if row is None:
+            raise _rejected('Invalid refresh token')
+        if row['revoked_at'] is not None:
+            raise _rejected('Refresh token has been revoked')
+        if row['reused']:
+            cursor.execute('UPDATE refresh_tokens SET revoked_at = NOW() WHERE family_id = %s AND revoked_at IS NULL',
+                           (row['family_id'],))
+            conn.commit()
+            _count('reuse_detected')
+            logger.warning("Refresh token reused; revoked its family for user %s", row['user_id'])
+            raise _rejected('Refresh token has been reused')
+        if row['expired']:
+            raise _rejected('Refresh token has expired')
+
+        cursor.execute('SELECT role FROM users WHERE id = %s', (row['user_id'],))
+        user = cursor.fetchone()
+        if user is None:
+            raise _rejected('Invalid refresh token')
+        if row['rotated_at'] is None:
+            cursor.execute('UPDATE refresh_tokens SET rotated_at = NOW() WHERE id = %s', (row['id'],))
+        new_token = _insert_refresh_token(cursor, row['user_id'], row['family_id'])
+        conn.commit()
+    _count('rotated')
+    return _token_pair(row['user_id'], user['role'], new_token)
+
+def _rejected(message):
+    _count('rejected')
+    return RefreshTokenError(message)
+
+def revoke_refresh_token(refresh_token):
+    """Revoke the family of `refresh_token`, ending that login. Returns whether it was known."""
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute('SELECT family_id FROM refresh_tokens WHERE token_hash = %s',
+                       (hash_refresh_token(refresh_token),))
+        row = cursor.fetchone()
+        if row is None:
+            return False
+        cursor.execute('UPDATE refresh_tokens SET revoked_at = NOW() WHERE family_id = %s AND revoked_at IS NULL',
+                       (row['family_id'],))
+        conn.commit()
+    return True
+
+def revoke_user_refresh_tokens(cursor, user_id):
+    """Revoke every refresh token of a user, in the caller's transaction."""
+    cursor.execute('UPDATE refresh_tokens SET revoked_at = NOW() WHERE user_id = %s AND revoked_at IS NULL',
+                   (user_id,))
+
+def purge_expired_refresh_tokens(limit=1000):
+    """Delete refresh tokens past their expiry, rotated and revoked ones included. Returns how many."""
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute('DELETE FROM refresh_tokens WHERE expires_at <= NOW() LIMIT %s', (limit,))
+        conn.commit()
+        return cursor.rowcount
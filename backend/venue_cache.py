@@ -0,0 +1,108 @@
+# venue_cache.py
+from dotenv import load_dotenv
+import threading
+import hashlib
+import json
+import time
+import os
+import logging
+
+from database import get_db_connection
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+VENUE_CACHE_POLL_INTERVAL = float(os.getenv('VENUE_CACHE_POLL_INTERVAL', 1))
+
+VENUE_CATALOG_KEY = 'venues'
+
+def bump_venue_catalog_version(cursor):
+    """Bump the shared venue catalog version.
+
+    Call inside the transaction that changes venues, so other workers see the
+    new version exactly when they can see the new rows.
+    """
+    cursor.execute(
+        'INSERT INTO cache_versions (name, version) VALUES (%s, 1) '
+        'ON DUPLICATE KEY UPDATE version = version + 1',
+        (VENUE_CATALOG_KEY,)
+    )
+
+class VenueCatalogCache:
+    """Pre-serialized venue catalog shared by all requests of a worker.
+
+    The catalog is tagged with the version stored in cache_versions. Each
+    worker polls that single row at most every `poll_interval` seconds and
+    reloads the catalog when the version moved, so an admin change made
+    through any worker reaches every worker within one poll interval. The
+    worker that made the change calls invalidate() and sees it immediately.
+    """
+
+    def __init__(self, poll_interval=VENUE_CACHE_POLL_INTERVAL):
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._version = None
+        self._body = None
+        self._etag = None
+        self._checked_at = 0.0
+        self.hits = 0
+        self.reloads = 0
+
+    def get(self):
+        """Return (body_bytes, etag) for the current catalog."""
+        with self._lock:
+            now = time.monotonic()
+            if self._body is not None and now - self._checked_at < self.poll_interval:
+                self.hits += 1
+                return self._body, self._etag
+
+            with get_db_connection() as conn, conn.cursor() as cursor:
+                # Read the version before the rows: a concurrent bump then at
+                # worst makes the next poll reload once more.
+                cursor.execute('SELECT version FROM cache_versions WHERE name = %s', (VENUE_CATALOG_KEY,))
+                row = cursor.fetchone()
+                version = row['version'] if row else 0
+                if self._body is None or version != self._version:
+                    cursor.execute('SELECT id, name, location, capacity, price, created_at FROM venues ORDER BY id')
+                    self._load(version, cursor.fetchall())
+                else:
+                    self.hits += 1
+            self._checked_at = now
+            return self._body, self._etag
+
+    def peek(self):
+        """(body_bytes, etag) if the catalog was checked within the poll interval, else None.
+
+        Never touches the database, so it is safe to call from an event loop.
+        """
+        # A reload in progress holds the lock across its queries; do not wait for it
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            if self._body is not None and time.monotonic() - self._checked_at < self.poll_interval:
+                self.hits += 1
+                return self._body, self._etag
+            return None
+        finally:
+            self._lock.release()
+
+    def invalidate(self):
+        with self._lock:
+            self._body = None
+
+    def _load(self, version, venues):
+        # default=str renders DECIMAL prices the way jsonify does
+        body = json.dumps({'venues': [
+            {
+                **venue,
+                'created_at': venue['created_at'].isoformat() if venue['created_at'] else None
+            } for venue in venues
+        ]}, sort_keys=True, separators=(',', ':'), default=str).encode('utf-8')
+        self._version = version
+        self._body = body
+        self._etag = f'v{version}-{hashlib.sha256(body).hexdigest()[:16]}'
+        self.reloads += 1
+        logger.info("Venue catalog loaded: version=%s venues=%d", version, len(venues))
+
+venue_catalog = VenueCatalogCache()
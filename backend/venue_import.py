@@ -0,0 +1,232 @@
+# venue_import.py
+"""Bulk venue upserts for POST /admin/venues/bulk.
+
+Rows come from a JSON array of objects or a CSV file with a header line
+(name, location, capacity, price), either as the request body or as the
+`file` field of a multipart upload. The body is read in chunks and
+parsed row by row, so an upload is never held in memory whole.
+
+Every row is validated on its own and against the rows before it. Valid
+rows are written in chunks of VENUE_IMPORT_CHUNK_SIZE, one multi-row
+INSERT ... ON DUPLICATE KEY UPDATE per chunk, all in the caller's
+transaction. Venues are keyed on their unique (location, name); a venue
+that already exists takes the row's capacity and price.
+"""
+from decimal import Decimal, InvalidOperation
+from dotenv import load_dotenv
+import codecs
+import json
+import csv
+import os
+
+load_dotenv()
+
+VENUE_IMPORT_CHUNK_SIZE = int(os.getenv('VENUE_IMPORT_CHUNK_SIZE', 500))
+VENUE_IMPORT_MAX_ROWS = int(os.getenv('VENUE_IMPORT_MAX_ROWS', 50000))
+# Errors listed in the response; error_count has them all
+VENUE_IMPORT_MAX_ERRORS = 1000
+READ_CHUNK_SIZE = 64 * 1024
+# Longest JSON row (in characters) read ahead for before decoding it
+MAX_JSON_ROW_BYTES = 64 * 1024
+
+VENUE_FIELDS = ('name', 'location', 'capacity', 'price')
+MAX_TEXT_LENGTH = 255
+MAX_CAPACITY = 2 ** 31 - 1
+MAX_PRICE = Decimal('99999999.99')
+CENT = Decimal('0.01')
+
+class InvalidUpload(ValueError):
+    """The upload as a whole cannot be read (malformed JSON or CSV, too many rows)."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+def _read_chunks(stream):
+    while True:
+        chunk = stream.read(READ_CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+def _decoded_chunks(stream):
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    try:
+        for chunk in _read_chunks(stream):
+            yield decoder.decode(chunk)
+        yield decoder.decode(b'', final=True)
+    except UnicodeDecodeError:
+        raise InvalidUpload('Upload must be UTF-8 encoded')
+
+def iter_json_array(stream):
+    """Yield the items of a top-level JSON array one at a time."""
+    decoder = json.JSONDecoder()
+    chunks = _decoded_chunks(stream)
+    buffer, pos, eof = '', 0, False
+    # What was read last: nothing, '[', an item or ','
+    last = None
+
+    while True:
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n':
+            pos += 1
+        # Read on at the end of the buffer, and when an item may run past it
+        if pos == len(buffer) or (last in ('[', ',') and buffer[pos] != ']' and not eof
+                                  and len(buffer) - pos < MAX_JSON_ROW_BYTES):
+            chunk = next(chunks, None)
+            if chunk is None:
+                if eof or pos == len(buffer):
+                    if last is None:
+                        raise InvalidUpload('Upload must be a JSON array of venues')
+                    raise InvalidUpload('Invalid JSON: unexpected end of upload')
+                eof = True
+            else:
+                buffer, pos = buffer[pos:] + chunk, 0
+                continue
+
+        char = buffer[pos]
+        if last is None:
+            if char != '[':
+                raise InvalidUpload('Upload must be a JSON array of venues')
+            last, pos = '[', pos + 1
+        elif last == 'item':
+            if char == ']':
+                if buffer[pos + 1:].strip() or any(chunk.strip() for chunk in chunks):
+                    raise InvalidUpload('Invalid JSON: data after the closing bracket')
+                return
+            if char != ',':
+                raise InvalidUpload("Invalid JSON: expected ',' or ']' between venues")
+            last, pos = ',', pos + 1
+        elif char == ']' and last == '[':
+            return
+        else:
+            try:
+                item, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError as e:
+                if not eof:
+                    # Might also be cut off at the end of the buffer
+                    raise InvalidUpload(f'Invalid JSON, or a venue longer than {MAX_JSON_ROW_BYTES} characters')
+                raise InvalidUpload(f'Invalid JSON: {e.msg}')
+            last = 'item'
+            yield item
+
+def iter_csv_rows(stream):
+    """Yield the rows of a CSV file with a header line as dicts."""
+    def lines():
+        pending = ''
+        for text in _decoded_chunks(stream):
+            *complete, pending = (pending + text).split('\n')
+            for line in complete:
+                yield line + '\n'
+        if pending:
+            yield pending
+
+    reader = csv.DictReader(lines())
+    try:
+        fields = [field.strip().lower() for field in reader.fieldnames or []]
+        missing = [field for field in VENUE_FIELDS if field not in fields]
+        if missing:
+            raise InvalidUpload(f"CSV header is missing: {', '.join(missing)}")
+        reader.fieldnames = fields
+        for row in reader:
+            yield row
+    except csv.Error as e:
+        raise InvalidUpload(f'Invalid CSV on line {reader.line_num}: {e}')
+
+def parse_venue(raw):
+    """Validate one row. Returns ((name, location, capacity, price), None) or (None, error)."""
+    if not isinstance(raw, dict):
+        return None, 'Row must be an object with name, location, capacity and price'
+    missing = [field for field in VENUE_FIELDS if raw.get(field) is None or str(raw.get(field)).strip() == '']
+    if missing:
+        return None, f"Missing required fields: {', '.join(missing)}"
+
+    name, location = str(raw['name']).strip(), str(raw['location']).strip()
+    if len(name) > MAX_TEXT_LENGTH or len(location) > MAX_TEXT_LENGTH:
+        return None, f'name and location must be at most {MAX_TEXT_LENGTH} characters'
+
+    capacity = raw['capacity']
+    try:
+        if isinstance(capacity, (bool, float)):
+            raise ValueError
+        capacity = int(str(capacity).strip())
+    except ValueError:
+        return None, 'capacity must be a whole number'
+    if not 1 <= capacity <= MAX_CAPACITY:
+        return None, f'capacity must be between 1 and {MAX_CAPACITY}'
+
+    try:
+        if isinstance(raw['price'], bool):
+            raise InvalidOperation
+        price = Decimal(str(raw['price']).strip())
+    except InvalidOperation:
+        return None, 'price must be a number'
+    if not price.is_finite() or not 0 <= price <= MAX_PRICE:
+        return None, f'price must be between 0 and {MAX_PRICE}'
+    if price != price.quantize(CENT):
+        return None, 'price must have at most 2 decimal places'
+
+    return (name, location, capacity, price.quantize(CENT)), None
+
+def upsert_venues(cursor, venues):
+    """Insert or update `venues` with one statement. Returns (created, updated)."""
+    cursor.execute(
+        f"SELECT COUNT(*) AS existing FROM venues WHERE (location, name) IN ({', '.join(['(%s, %s)'] * len(venues))})",
+        [value for name, location, _, _ in venues for value in (location, name)]
+    )
+    existing = cursor.fetchone()['existing']
+    cursor.execute(
+        'INSERT INTO venues (name, location, capacity, price) VALUES '
+        + ', '.join(['(%s, %s, %s, %s)'] * len(venues))
+        + ' ON DUPLICATE KEY UPDATE capacity = VALUES(capacity), price = VALUES(price)',
+        [value for venue in venues for value in venue]
+    )
+    return len(venues) - existing, existing
+
+def import_venues(cursor, rows, all_or_nothing, chunk_size=None):
+    """Validate `rows` and upsert the valid ones in chunks, in the caller's transaction.
+
+    With all_or_nothing, writing stops at the first invalid row (the rows
+    are still validated, to report every error) and the caller rolls back.
+    Returns {'rows', 'created', 'updated', 'error_count', 'errors'}; rows
+    are numbered from 1, not counting a CSV header.
+    """
+    chunk_size = chunk_size or VENUE_IMPORT_CHUNK_SIZE
+    report = {'rows': 0, 'created': 0, 'updated': 0, 'error_count': 0, 'errors': []}
+    seen = {}
+    chunk = []
+    writing = True
+
+    def flush():
+        created, updated = upsert_venues(cursor, chunk)
+        report['created'] += created
+        report['updated'] += updated
+        chunk.clear()
+
+    for number, raw in enumerate(rows, start=1):
+        if number > VENUE_IMPORT_MAX_ROWS:
+            raise InvalidUpload(f'An upload can contain at most {VENUE_IMPORT_MAX_ROWS} venues', 413)
+        report['rows'] = number
+        venue, error = parse_venue(raw)
+        if venue is not None:
+            # MySQL compares the key case-insensitively
+            key = (venue[1].casefold(), venue[0].casefold())
+            if key in seen:
+                venue, error = None, f'Same name and location as row {seen[key]}'
+            else:
+                seen[key] = number
+        if error:
+            report['error_count'] += 1
+            if len(report['errors']) < VENUE_IMPORT_MAX_ERRORS:
+                report['errors'].append({'row': number, 'error': error})
+            if all_or_nothing:
+                writing = False
+                chunk.clear()
+            continue
+        if writing:
+            chunk.append(venue)
+            if len(chunk) >= chunk_size:
+                flush()
+    if writing and chunk:
+        flush()
+    return report
@@ -0,0 +1,9 @@
+# wsgi.py
+"""WSGI entry point for production servers.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+from main import create_app, configure_logging
+
+configure_logging()
+app = create_app()
@@ -4,18 +4,22 @@ import { toast } from 'react-toastify';
 
 function BookingsOverview() {
   const [bookings, setBookings] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+
+  const fetchBookings = async (cursor = null) => {
+    try {
+      const res = await axios.get('http://localhost:5001/api/bookings/all', {
+        headers: { Authorization: `Bearer ${localStorage.getItem('token')}` },
+        params: { fields: 'venue,payment', ...(cursor && { cursor }) },
+      });
+      setBookings((prev) => (cursor ? [...prev, ...res.data.bookings] : res.data.bookings));
+      setNextCursor(res.data.next_cursor);
+    } catch (err) {
+      toast.error('Failed to load bookings');
+    }
+  };
 
   useEffect(() => {
-    const fetchBookings = async () => {
-      try {
-        const res = await axios.get('http://localhost:5001/api/bookings/all', {
-          headers: { Authorization: `Bearer ${localStorage.getItem('token')}` },
-        });
-        setBookings(res.data.bookings);
-      } catch (err) {
-        toast.error('Failed to load bookings');
-      }
-    };
     fetchBookings();
   }, []);
 
@@ -72,6 +76,9 @@ function BookingsOverview() {
           ))}
         </tbody>
       </table>
+      {nextCursor && (
+        <button className="btn btn-primary" onClick={() => fetchBookings(nextCursor)}>Load more</button>
+      )}
     </div>
   );
 }
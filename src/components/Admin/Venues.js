@@ -6,15 +6,17 @@ function Venues() {
   const [venues, setVenues] = useState([]);
   const [formData, setFormData] = useState({ name: '', location: '', capacity: '', price: '' });
   const [editId, setEditId] = useState(null);
+  const [search, setSearch] = useState('');
 
   useEffect(() => {
     fetchVenues();
   }, []);
 
-  const fetchVenues = async () => {
+  const fetchVenues = async (q = search) => {
     try {
-      const res = await axios.get('http://localhost:5001/api/venues', {
+      const res = await axios.get('http://localhost:5001/api/admin/venues', {
         headers: { Authorization: `Bearer ${localStorage.getItem('token')}` },
+        params: { limit: 500, ...(q && { q }) },
       });
       setVenues(res.data.venues);
     } catch (err) {
@@ -48,8 +50,35 @@ function Venues() {
     }
   };
 
+  const handleImport = async (e) => {
+    const file = e.target.files[0];
+    e.target.value = '';
+    if (!file) return;
+    const upload = new FormData();
+    upload.append('file', file);
+    try {
+      const res = await axios.post('http://localhost:5001/api/admin/venues/bulk', upload, {
+        headers: { Authorization: `Bearer ${localStorage.getItem('token')}` },
+      });
+      toast.success(`Imported ${res.data.rows} venues: ${res.data.created} created, ${res.data.updated} updated`);
+      fetchVenues();
+    } catch (err) {
+      const { error, errors, error_count } = err.response?.data || {};
+      if (errors?.length) {
+        toast.error(`${error_count} invalid rows, nothing imported. Row ${errors[0].row}: ${errors[0].error}`);
+      } else {
+        toast.error(error || 'Import failed');
+      }
+    }
+  };
+
+  const handleSearch = (e) => {
+    setSearch(e.target.value);
+    fetchVenues(e.target.value);
+  };
+
   const handleEdit = (venue) => {
-    setFormData(venue);
+    setFormData({ name: venue.name, location: venue.location, capacity: venue.capacity, price: venue.price });
     setEditId(venue.id);
   };
 
@@ -89,6 +118,11 @@ function Venues() {
           </div>
         </div>
       </form>
+      <div className="mt-3">
+        <label className="form-label">Import venues from a CSV or JSON file (name, location, capacity, price)</label>
+        <input type="file" accept=".csv,.json" className="form-control" onChange={handleImport} />
+      </div>
+      <input placeholder="Search by name or location" className="form-control mt-4" value={search} onChange={handleSearch} />
       <table className="table mt-4">
         <thead>
           <tr>
@@ -97,6 +131,8 @@ function Venues() {
             <th>Location</th>
             <th>Capacity</th>
             <th>Price</th>
+            <th>Upcoming Bookings</th>
+            <th>Next Booking</th>
             <th>Actions</th>
           </tr>
         </thead>
@@ -108,6 +144,8 @@ function Venues() {
               <td>{venue.location}</td>
               <td>{venue.capacity}</td>
               <td>{venue.price}</td>
+              <td>{venue.upcoming_bookings}</td>
+              <td>{venue.next_booking_date || '-'}</td>
               <td>
                 <button className="btn btn-warning me-2" onClick={() => handleEdit(venue)}>Edit</button>
                 <button className="btn btn-danger" onClick={() => handleDelete(venue.id)}>Delete</button>
@@ -14,7 +14,7 @@ function Login() {
     e.preventDefault();
     try {
       const res = await axios.post('http://localhost:5001/api/login', { email, password });
-      login(res.data.token, res.data.user);
+      login(res.data.token, res.data.refresh_token);
       toast.success('Login successful');
       navigate('/profile');
     } catch (err) {
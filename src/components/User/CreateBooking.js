@@ -1,10 +1,30 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
 import axios from 'axios';
 import { toast } from 'react-toastify';
 import { useContext } from 'react';
 import { AuthContext } from '../../contexts/AuthContext';
 
+const IN_PROGRESS_ERROR = 'A request with this Idempotency-Key is still in progress';
+// The status endpoint asks for a poll every second; give up waiting after this many
+const PAYMENT_POLL_ATTEMPTS = 30;
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+// Poll GET /api/bookings/<id>/payment until the payment is settled; null if it is still pending
+const waitForPayment = async (statusUrl) => {
+  for (let attempt = 0; attempt < PAYMENT_POLL_ATTEMPTS; attempt++) {
+    const res = await axios.get(`http://localhost:5001${statusUrl}`, {
+      headers: { Authorization: `Bearer ${localStorage.getItem('token')}` },
+    });
+    if (res.data.is_final) {
+      return res.data;
+    }
+    await sleep(1000);
+  }
+  return null;
+};
+
 function CreateBooking() {
   const { user } = useContext(AuthContext);
   const [venues, setVenues] = useState([]);
@@ -13,6 +33,8 @@ function CreateBooking() {
   const [startTime, setStartTime] = useState('');
   const [endTime, setEndTime] = useState('');
   const navigate = useNavigate();
+  // Reused when the same booking is resubmitted before the server has answered it, so it can replay its answer
+  const pendingAttempt = useRef(null);
 
   useEffect(() => {
     const fetchVenues = async () => {
@@ -55,18 +77,53 @@ function CreateBooking() {
       start_time: startTime,
       end_time: endTime,
     };
+    const body = JSON.stringify(payload);
+    if (pendingAttempt.current?.body !== body) {
+      pendingAttempt.current = { body, key: crypto.randomUUID() };
+    }
     try {
-      await axios.post('http://localhost:5001/api/bookings', payload, {
-        headers: { Authorization: `Bearer ${localStorage.getItem('token')}` },
+      const res = await axios.post('http://localhost:5001/api/bookings', payload, {
+        headers: {
+          Authorization: `Bearer ${localStorage.getItem('token')}`,
+          'Idempotency-Key': pendingAttempt.current.key,
+        },
       });
-      toast.success('Booking created');
+      pendingAttempt.current = null;
+      if (res.status !== 202) {
+        toast.success('Booking created');
+        navigate('/bookings');
+        return;
+      }
+      toast.info('Booking reserved, payment is being processed');
+      await showPaymentResult(res.data.payment_status_url);
       navigate('/bookings');
     } catch (err) {
-      if (err.response?.data?.error === 'Payment failed, booking deleted. Please try again.') {
-        toast.error('Payment failed. Please try booking again.');
-      } else {
-        toast.error(err.response?.data?.error || 'Booking failed');
+      // Keep the key while the outcome is unknown: no answer, a 5xx (not stored by the server)
+      // or the first request with this key still running. Any other answer is final.
+      const status = err.response?.status;
+      const inProgress = status === 409 && err.response.data?.error === IN_PROGRESS_ERROR;
+      if (status && status < 500 && !inProgress) {
+        pendingAttempt.current = null;
       }
+      toast.error(err.response?.data?.error || 'Booking failed');
+    }
+  };
+
+  const showPaymentResult = async (statusUrl) => {
+    let payment;
+    try {
+      payment = await waitForPayment(statusUrl);
+    } catch (err) {
+      toast.error(err.response?.data?.error || 'Could not check the payment status');
+      return;
+    }
+    if (!payment) {
+      toast.info('Payment is still being processed, check My Bookings for its status');
+    } else if (payment.booking_status === 'confirmed') {
+      toast.success('Payment received, booking confirmed');
+    } else {
+      const status = payment.intent_status || payment.payment_status;
+      toast.error(`Payment ${status}${payment.last_error ? `: ${payment.last_error}` : ''}. Please try booking again.`);
     }
   };
 
@@ -1,8 +1,31 @@
 import React, { createContext, useState, useEffect } from 'react';
+import axios from 'axios';
 import { jwtDecode } from 'jwt-decode';
 
 export const AuthContext = createContext();
 
+const API_URL = 'http://localhost:5001/api';
+
+let refreshing = null;
+
+// Trade the stored refresh token for a new pair. Requests that fail together share one refresh,
+// because the server treats a refresh token presented twice as stolen.
+const refreshTokens = () => {
+  if (!refreshing) {
+    refreshing = axios
+      .post(`${API_URL}/token/refresh`, { refresh_token: localStorage.getItem('refreshToken') })
+      .then((res) => {
+        localStorage.setItem('token', res.data.token);
+        localStorage.setItem('refreshToken', res.data.refresh_token);
+        return res.data.token;
+      })
+      .finally(() => {
+        refreshing = null;
+      });
+  }
+  return refreshing;
+};
+
 export const AuthProvider = ({ children }) => {
   const [user, setUser] = useState(null);
 
@@ -14,15 +37,53 @@ export const AuthProvider = ({ children }) => {
     }
   }, []);
 
-  const login = (token) => {
+  useEffect(() => {
+    // Access tokens live a few minutes: on a 401, refresh once and retry the request
+    const interceptor = axios.interceptors.response.use(undefined, async (error) => {
+      const { config, response } = error;
+      if (
+        response?.status !== 401 ||
+        !config ||
+        config._retried ||
+        config.url.endsWith('/token/refresh') ||
+        !config.headers?.Authorization ||
+        !localStorage.getItem('refreshToken')
+      ) {
+        return Promise.reject(error);
+      }
+      try {
+        const token = await refreshTokens();
+        setUser(jwtDecode(token));
+        config._retried = true;
+        config.headers.Authorization = `Bearer ${token}`;
+        return axios(config);
+      } catch (refreshError) {
+        clearSession();
+        return Promise.reject(error);
+      }
+    });
+    return () => axios.interceptors.response.eject(interceptor);
+  }, []);
+
+  const clearSession = () => {
+    localStorage.removeItem('token');
+    localStorage.removeItem('refreshToken');
+    setUser(null);
+  };
+
+  const login = (token, refreshToken) => {
     localStorage.setItem('token', token);
+    localStorage.setItem('refreshToken', refreshToken);
     const decoded = jwtDecode(token);
     setUser(decoded);
   };
 
   const logout = () => {
-    localStorage.removeItem('token');
-    setUser(null);
+    const refreshToken = localStorage.getItem('refreshToken');
+    if (refreshToken) {
+      axios.post(`${API_URL}/logout`, { refresh_token: refreshToken }).catch(() => {});
+    }
+    clearSession();
   };
 
   return (
@@ -30,4 +91,4 @@ export const AuthProvider = ({ children }) => {
       {children}
     </AuthContext.Provider>
   );
-};
\ No newline at end of file
+};